@@ -4,6 +4,7 @@ from opto.trace.nodes import ParameterNode, Node
 from opto.trace.propagators import GraphPropagator
 from opto.trace.propagators.propagators import Propagator
 from opto.trace.utils import sum_feedback
+from opto.utils.llm_scheduler import HIGH_PRIORITY, llm_priority
 
 
 class AbstractOptimizer:
@@ -57,8 +58,13 @@ class Optimizer(AbstractOptimizer):
         self.update(update_dict)
 
     def propose(self, *args, **kwargs):
-        """Propose the new data of the parameters based on the feedback."""
-        return self._step(*args, **kwargs)
+        """Propose the new data of the parameters based on the feedback.
+
+        The LLM calls made here have a high priority (see opto.utils.llm_scheduler), so that they go
+        ahead of the queued calls of rollouts or evaluation when the LLM is shared.
+        """
+        with llm_priority(HIGH_PRIORITY):
+            return self._step(*args, **kwargs)
 
     def update(self, update_dict: Dict[ParameterNode, Any]):
         """Update the trainable parameters given a dictionary of new data."""
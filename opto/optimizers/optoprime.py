@@ -11,8 +11,10 @@ from opto.trace.propagators.propagators import Propagator
 from opto.optimizers.optimizer import Optimizer
 from opto.optimizers.buffers import FIFOBuffer
 from opto.utils.llm import AbstractModel, LLM
+from opto.utils.llm_retry import is_retryable
+from opto.utils.lazy_import import LazyModule
 
-from black import format_str, FileMode
+black = LazyModule("black")  # imported when formatting code for the first time
 
 def get_fun_name(node: MessageNode):
     if isinstance(node.info, dict) and "fun_name" in node.info:
@@ -141,6 +143,15 @@ class ProblemInstance:
         )
 
 
+def rejects_json_mode(error: Exception) -> bool:
+    """Whether error is the rejection of the JSON mode (`response_format`) by an LLM (e.g., a bad request or
+    unsupported parameters error mentioning it), rather than another error of the request."""
+    if is_retryable(error):
+        return False
+    message = str(error).lower()
+    return any(word in message for word in ("response_format", "json_object", "json mode"))
+
+
 class OptoPrime(Optimizer):
     # This is generic representation prompt, which just explains how to read the problem.
     representation_prompt = dedent(
@@ -482,7 +493,7 @@ class OptoPrime(Optimizer):
                     formatted_suggestion = suggestion[node.py_name]
                     # use black formatter for code reformatting
                     if type(formatted_suggestion) == str and 'def' in formatted_suggestion:
-                        formatted_suggestion = format_str(formatted_suggestion, mode=FileMode())
+                        formatted_suggestion = black.format_str(formatted_suggestion, mode=black.FileMode())
                     update_dict[node] = type(node.data)(formatted_suggestion)
                 except (ValueError, KeyError) as e:
                     # catch error due to suggestion missing the key or wrong data type
@@ -562,16 +573,31 @@ class OptoPrime(Optimizer):
             {"role": "user", "content": user_prompt},
         ]
 
-        try:  # Try tp force it to be a json object
-            response = self.llm(
-                messages=messages,
-                response_format={"type": "json_object"},
-                max_tokens=max_tokens,
-            )
-        except Exception:
-            response = self.llm(messages=messages, max_tokens=max_tokens)
+        response = self._call_llm_json(messages, max_tokens=max_tokens)
         response = response.choices[0].message.content
 
         if verbose:
             print("LLM response:\n", response)
         return response
+
+    def _call_llm_json(self, messages: List[Dict], **kwargs):
+        """Call the LLM in the JSON mode, unless the model is known not to support it (see AbstractModel.supports).
+        If the model rejects the JSON mode, the call is made without it, and the next calls do not try it.
+        Other errors are raised. LLMs which are not AbstractModels are always tried in the JSON mode first."""
+        supports = getattr(self.llm, "supports", None)
+        set_supports = getattr(self.llm, "set_supports", None)
+        json_mode = supports("json_mode") if supports is not None else None
+        if json_mode is False:
+            return self.llm(messages=messages, **kwargs)
+        try:  # Try to force it to be a json object
+            response = self.llm(messages=messages, response_format={"type": "json_object"}, **kwargs)
+        except Exception as e:
+            if not rejects_json_mode(e):
+                raise  # e.g., an invalid prompt or key, or a transient error (see opto.utils.llm_retry)
+            response = self.llm(messages=messages, **kwargs)
+            if set_supports is not None:
+                set_supports("json_mode", False)
+            return response
+        if json_mode is None and set_supports is not None:
+            set_supports("json_mode", True)
+        return response
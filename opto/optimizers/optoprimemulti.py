@@ -41,21 +41,30 @@ class OptoPrimeMulti(OptoPrime):
             {"role": "user", "content": user_prompt},
         ]
 
+        supports = getattr(self.llm, "supports", None)  # the LLM may not be an AbstractModel
         try:
-            response = self.llm.create(
-                messages=messages,
-                response_format={"type": "json_object"},
-                max_tokens=max_tokens,
-                n=num_responses,
-                temperature=temperature,
-            )
+            if num_responses > 1 and supports is not None and supports("n") is False:  # sample the responses one by one
+                choices = [
+                    choice
+                    for _ in range(num_responses)
+                    for choice in self._call_llm_json(
+                        messages, max_tokens=max_tokens, temperature=temperature
+                    ).choices
+                ]
+            else:
+                choices = self._call_llm_json(
+                    messages,
+                    max_tokens=max_tokens,
+                    n=num_responses,
+                    temperature=temperature,
+                ).choices
         except Exception as e:
             if verbose:
                 print(f"ERROR {e}")
             # Default to returning an empty response list if an error occurs # Error handling improvement
             return []
 
-        responses = [choice.message.content for choice in response.choices]
+        responses = [choice.message.content for choice in choices]
 
         if verbose:
             print("LLM responses:\n", responses)
@@ -508,13 +508,9 @@ class TextGrad(Optimizer):
             {"role": "user", "content": user_prompt},
         ]
 
-        try:
-            response = self.llm.create(
-                messages=messages,
-                max_tokens=self.max_tokens,
-            )
-        except Exception:
-            response = self.llm.create(messages=messages, max_tokens=self.max_tokens)
+        # Calling the model works with every backend (LiteLLM, the default one, has no `create`),
+        # and the request goes through the cache, scheduler and retry policy of the model.
+        response = self.llm(messages=messages, max_tokens=self.max_tokens)
         response = response.choices[0].message.content
 
         if verbose:
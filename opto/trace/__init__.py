@@ -2,10 +2,11 @@ from opto.trace.bundle import bundle, ExecutionError
 from opto.trace.modules import Module, model
 from opto.trace.containers import NodeContainer
 from opto.trace.broadcast import apply_op
+from opto.trace.capture import capture
 import opto.trace.propagators as propagators
 import opto.trace.operators as operators
 
-from opto.trace.nodes import Node, GRAPH
+from opto.trace.nodes import Node, GRAPH, TRACING, INFERENCE_MODE, graph_session
 from opto.trace.nodes import node
 
 
@@ -13,15 +14,35 @@ class stop_tracing:
     """A contextmanager to disable tracing."""
 
     def __enter__(self):
-        GRAPH.TRACE = False
+        self._token = TRACING.set(False)
 
     def __exit__(self, type, value, traceback):
-        GRAPH.TRACE = True
+        TRACING.reset(self._token)
+
+
+class inference_mode:
+    """A contextmanager to run bundled functions without creating any graph.
+
+    Within the context, bundled functions call the underlying Python functions
+    directly on the data of their inputs and return the raw outputs, `node`
+    returns non-trainable data as it is instead of creating a Node, and
+    exceptions are raised as they are instead of as ExecutionError. Operators
+    of existing nodes (e.g., `x + 1`) therefore return raw values too. Use it
+    when only the outputs are needed, e.g., when serving a trained model.
+    """
+
+    def __enter__(self):
+        self._token = INFERENCE_MODE.set(True)
+
+    def __exit__(self, type, value, traceback):
+        INFERENCE_MODE.reset(self._token)
 
 
 __all__ = [
     "node",
     "stop_tracing",
+    "inference_mode",
+    "graph_session",
     "GRAPH",
     "Node",
     "bundle",
@@ -30,5 +51,6 @@ __all__ = [
     "NodeContainer",
     "model",
     "apply_op",
+    "capture",
     "propagators",
 ]
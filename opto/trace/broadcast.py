@@ -1,32 +1,127 @@
 import copy
+import functools
 
 from opto.trace.containers import NodeContainer
-from opto.trace.nodes import Node
+from opto.trace.nodes import ExceptionNode, MessageNode, Node, ParameterNode
+
+
+# The kinds of objects handled by recursive_conversion.
+_LEAF, _NODE, _TUPLE, _LIST, _DICT, _SET, _NODE_CONTAINER = range(7)
+# The kinds of the builtin types and the node types, looked up first. Other types go through the
+# bounded cache of _kind_of.
+_KINDS = {
+    **dict.fromkeys((Node, ParameterNode, MessageNode, ExceptionNode), _NODE),
+    **dict.fromkeys((str, int, float, bool, complex, bytes, type(None)), _LEAF),
+    tuple: _TUPLE,
+    list: _LIST,
+    dict: _DICT,
+    set: _SET,
+}
+
+
+@functools.lru_cache(maxsize=1024)
+def _kind_of(cls):
+    """Return the kind of the objects of type cls."""
+    if issubclass(cls, Node):
+        return _NODE
+    elif issubclass(cls, tuple):
+        return _TUPLE
+    elif issubclass(cls, list):
+        return _LIST
+    elif issubclass(cls, dict):
+        return _DICT
+    elif issubclass(cls, set):
+        return _SET
+    elif issubclass(cls, NodeContainer):
+        return _NODE_CONTAINER
+    else:
+        return _LEAF
 
 
-def recursive_conversion(true_func, false_func):
+def recursive_conversion(true_func, false_func=None):
     """Recursively apply true_func to the nodes and false_func to the rest of
     the objects in a container of nodes. Container of nodes are tuple, list,
     dict, set, and NodeContainer.
 
     Args:
         true_func (callable): the function to be applied to the nodes.
-        false_func (callable): the function to be applied to the rest of the objects.
-
+        false_func (callable, optional): the function to be applied to the rest of the objects.
+            If None, the rest of the objects are kept as they are. In this case, the containers
+            in which nothing is changed are returned as they are instead of copied, and only the
+            containers in which a node is converted are rebuilt.
     """
+    if false_func is not None:
+        return _converter(true_func, false_func)
+    kinds = _KINDS
+
+    def func(obj):
+        kind = kinds.get(type(obj))
+        if kind is None:
+            kind = _kind_of(type(obj))
+        if kind == _LEAF:
+            return obj
+        if kind == _NODE:  # base case
+            return true_func(obj)
+        if kind == _TUPLE or kind == _LIST:
+            new = None
+            for i, x in enumerate(obj):
+                if kinds.get(type(x)) == _LEAF:
+                    continue
+                y = func(x)
+                if y is not x:
+                    if new is None:
+                        new = list(obj)
+                    new[i] = y
+            if new is None:
+                return obj
+            return tuple(new) if kind == _TUPLE else new
+        if kind == _DICT:
+            new = None
+            for k, v in obj.items():
+                if kinds.get(type(v)) == _LEAF:
+                    continue
+                y = func(v)
+                if y is not v:
+                    if new is None:
+                        new = dict(obj)
+                    new[k] = y
+            return obj if new is None else new
+        if kind == _SET:
+            new = [func(x) for x in obj]
+            if all(y is x for x, y in zip(obj, new)):
+                return obj
+            return set(new)
+        # NodeContainer
+        new = {k: func(v) for k, v in obj.__dict__.items()}
+        if all(new[k] is v for k, v in obj.__dict__.items()):
+            return obj
+        output = copy.copy(obj)
+        for k, v in new.items():
+            setattr(output, k, v)
+        return output
+
+    return func
+
+
+def _converter(true_func, false_func):
+    """Return the function of recursive_conversion which applies false_func to the objects that are not nodes or containers."""
+    kinds = _KINDS
 
     def func(obj):
-        if isinstance(obj, Node):  # base case
+        kind = kinds.get(type(obj))
+        if kind is None:
+            kind = _kind_of(type(obj))
+        if kind == _NODE:  # base case
             return true_func(obj)
-        elif isinstance(obj, tuple):
+        elif kind == _TUPLE:
             return tuple(func(x) for x in obj)
-        elif isinstance(obj, list):
+        elif kind == _LIST:
             return [func(x) for x in obj]
-        elif isinstance(obj, dict):
+        elif kind == _DICT:
             return {k: func(v) for k, v in obj.items()}
-        elif isinstance(obj, set):
+        elif kind == _SET:
             return {func(x) for x in obj}
-        elif isinstance(obj, NodeContainer):
+        elif kind == _NODE_CONTAINER:
             output = copy.copy(obj)
             for k, v in obj.__dict__.items():
                 setattr(output, k, func(v))
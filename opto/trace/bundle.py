@@ -1,28 +1,31 @@
+import builtins
 import copy
-import ctypes
+import dis
 import functools
 import inspect
 import re
 import sys
 import traceback
+import types
 import asyncio
 
 from typing import List, Dict, Callable, Union, Any
 
 from opto.trace.broadcast import recursive_conversion
+from opto.trace.containers import NodeContainer
 from opto.trace.errors import ExecutionError, TraceMissingInputsError
 from opto.trace.modules import Module
-from opto.trace.nodes import GRAPH
+from opto.trace.nodes import GRAPH, INFERENCE_MODE, GRAPH_CAPTURE
 from opto.trace.nodes import (
     MessageNode,
     USED_NODES,
     Node,
     ParameterNode,
     ExceptionNode,
+    LazyInfo,
     node,
     get_op_name,
 )
-from opto.trace.utils import contain
 
 
 def bundle(
@@ -51,7 +54,7 @@ def bundle(
     Returns:
         FunModule: The wrapped function that returns node objects.
     """
-    prev_f_locals = inspect.stack()[1].frame.f_locals
+    prev_f_locals = sys._getframe(1).f_locals
 
     def decorator(fun):
         fun_module = FunModule(
@@ -75,11 +78,11 @@ class trace_nodes:
 
     def __enter__(self):
         nodes = set()
-        USED_NODES.append(nodes)
+        self._token = USED_NODES.set(nodes)
         return nodes
 
     def __exit__(self, type, value, traceback):
-        USED_NODES.pop()
+        USED_NODES.reset(self._token)
 
 
 class FunModule(Module):
@@ -118,47 +121,29 @@ class FunModule(Module):
 
         assert callable(fun), "fun must be a callable."
 
-        # Get the source code of the function, excluding the decorator line
-        source, line_number = self.get_source(fun)
-
-        # Construct the info dictionary
-        docstring = inspect.getdoc(fun)
-        self.info = dict(  # TODO explain the info dict
-            # info about the decorated function
-            fun=None,  # to be defined at run time
-            fun_name=fun.__qualname__,
-            doc=inspect.cleandoc(docstring) if docstring is not None else "",
-            signature=inspect.signature(fun),
-            source=source,
-            line_number=line_number,
-            file=inspect.getfile(fun),
-            error_comment=None,
-            traceback=None,
-            # for traceable_code == True
-            output=None,  # output of the function
-            inputs={"args": [], "kwargs": {}},  # inputs of the function
-            # misc
-            external_dependencies=None,
-        )
-
-        if description is None:
-            # Generate the description from the function name and docstring.
-            description = f"[{self.info['fun_name']}] {self.info['doc']}."
-        assert len(get_op_name(description)) > 0
+        # The info dict and the default description are constructed on first use (see the info and description properties),
+        # since extracting the source code is slow and most operators are defined at import time.
+        self._info = None
+        if description is not None:
+            assert len(get_op_name(description)) > 0
 
         self.traceable_code = traceable_code
         self._fun = fun
-        self.description = description
+        self._description = description
         self._process_inputs = _process_inputs
         self.catch_execution_error = catch_execution_error
         self.allow_external_dependencies = allow_external_dependencies
         self.parameter = None
         self.overwrite_python_recursion = overwrite_python_recursion
+        self._binder = None  # _ArgumentBinder of the last function called
+        self._compiled = None  # (code, fun_name, fun, fun_globals, error) of the last code defined
+        self._unbundled = None  # (fun, unbundled version of fun, its _FunctionGlobals or None) (see _unbundle_recursion)
         if trainable:
             # trainable code uses exec which has an effect of overwrite_python_recursion==True.
             self.overwrite_python_recursion = True
             # assert overwrite_python_recursion, "trainable requires overwrite_python_recursion to be True."
 
+            source = self.info["source"]
             signature_sr = re.search(r"\s*(def.*\"\"\")", source, re.DOTALL)
             if (
                 signature_sr is None
@@ -172,6 +157,45 @@ class FunModule(Module):
                 constraint="The code should start with:\n" + signature,
             )
 
+    @property
+    def info(self):
+        """The info dict of the decorated function, which is the template of the info of the MessageNodes returned."""
+        if self._info is None:
+            fun = self._fun
+            # Get the source code of the function, excluding the decorator line
+            source, line_number = self.get_source(fun)
+            self._info = dict(  # TODO explain the info dict
+                # info about the decorated function
+                fun=None,  # to be defined at run time
+                fun_name=fun.__qualname__,
+                doc=get_doc(fun),
+                signature=inspect.signature(fun),
+                source=source,
+                line_number=line_number,
+                file=inspect.getfile(fun),
+                error_comment=None,
+                traceback=None,
+                # for traceable_code == True
+                output=None,  # output of the function
+                inputs={"args": [], "kwargs": {}},  # inputs of the function
+                # misc
+                external_dependencies=None,
+            )
+        return self._info
+
+    @property
+    def description(self):
+        if self._description is None:
+            # Generate the description from the function name and docstring.
+            description = f"[{self._fun.__qualname__}] {get_doc(self._fun)}."
+            assert len(get_op_name(description)) > 0
+            self._description = description
+        return self._description
+
+    @description.setter
+    def description(self, description):
+        self._description = description
+
     @property
     def trainable(self):
         return self.parameter is not None
@@ -179,60 +203,106 @@ class FunModule(Module):
     @property
     def fun(self, *args, **kwargs):
         """Return a callable function. Return the decorated function if the parameter is None. Otherwise, return the function defined by the parameter. When exception happens during the defining the function with the parameter, raise a trace.ExecutionError."""
+        return self._get_fun(self._call_info())
+
+    def _call_info(self):
+        """Return a new info dict for a call of the operator.
+
+        The fields describing the decorated function are shared with `self.info`, while the
+        fields describing the call (e.g., output, inputs, error_comment) are written to the
+        new dict only. Therefore, concurrent calls of the same FunModule do not overwrite
+        each other's records.
+        """
+        info = self.info.copy()
+        info["inputs"] = {"args": [], "kwargs": {}}
+        return info
+
+    def _get_fun(self, info):
+        """Return the callable function of the operator. See `fun`. The errors are recorded in the info dict of the call."""
 
         # This function should be later called within trace_nodes context manager.
         if self.parameter is None:
             return self._fun
-        else:
-            code = (
-                self.parameter._data
-            )  # This is not traced, but we will add this as the parent later.
-            # before we execute,  we should try to import all the global name spaces from the original function
-            try:
-                _ldict = {}
-                gdict = self._fun.__globals__.copy()
-                gdict.update(self._ldict)
-                exec(code, gdict, _ldict)  # define the function
-                fun_name = re.search(r"\s*def\s+(\w+)", code).group(1)
-                fun = _ldict[fun_name]
-                fun.__globals__[fun_name] = fun  # for recursive calls
-            except SyntaxError as err:
-                error_class = err.__class__.__name__
-                detail = err.args[0]
-                line_number = err.lineno
-                e = err
-            except Exception as err:
-                # TODO would this ever happen?
-                error_class = err.__class__.__name__
-                detail = err.args[0]
-                cl, exc, tb = sys.exc_info()
-                line_number = traceback.extract_tb(tb)[-1][1]
-                e = err
-            else:
-                return fun
+        fun, error = self._trainable_fun()
+        if error is None:
+            return fun
+
+        e, commented_code, raw_traceback = error
+        info["error_comment"] = commented_code
+        info["traceback"] = raw_traceback  # This is saved for user debugging
+
+        e_node = ExceptionNode(
+            e,
+            inputs={"code": self.parameter},
+            description=f"[exception] The code parameter {self.parameter.py_name} has an error.",
+            name="exception_" + self.parameter.py_name,
+            info=info,
+        )
 
-            base_message = f"({error_class}) {detail}."
-            commented_code = (
-                self.generate_comment(code, base_message, line_number, 1)
-                + f"\n{base_message}"
-            )
-            raw_traceback = (
-                "SyntaxError in trainable code definition.\n" + commented_code
-                if "SyntaxError" == error_class
-                else traceback.format_exc()
-            )
-            self.info["error_comment"] = commented_code
-            self.info["traceback"] = raw_traceback  # This is saved for user debugging
+        raise ExecutionError(e_node)
+
+    def _trainable_fun(self):
+        """Return the function defined from the code of the parameter and the error of its definition (see `_define_fun`)."""
+        code = (
+            self.parameter._data
+        )  # This is not traced, but we will add this as the parent later.
+        # The function is defined once per version of the code.
+        compiled = self._compiled
+        if compiled is None or compiled[0] != code:
+            compiled = self._compiled = (code,) + self._define_fun(code)
+        _, _, fun, fun_globals, error = compiled
+        if error is None:
+            # Copy the global names used by the code from the original function, since they may have changed.
+            fun_globals.refresh()
+        return fun, error
+
+    def _define_fun(self, code):
+        """Define the function from the code of the parameter.
 
-            e_node = ExceptionNode(
-                e,
-                inputs={"code": self.parameter},
-                description=f"[exception] The code parameter {self.parameter.py_name} has an error.",
-                name="exception_" + self.parameter.py_name,
-                info=self.info,
-            )
+        Returns:
+            fun_name (str): the name of the function, or None if there is an error.
+            fun (callable): the function, or None if there is an error.
+            fun_globals (_FunctionGlobals): the global name space of the function.
+            error (tuple): None, or the exception, the commented code and the traceback of the error.
+        """
+        # The code is executed in a name space with the names it uses from the name spaces of the original
+        # function. The names defined by the code (e.g., the function itself for recursive calls) are kept.
+        try:
+            compiled_code = compile(code, "<string>", "exec")
+            fun_globals = _FunctionGlobals(compiled_code, (self._ldict, self._fun.__globals__))
+            namespace = fun_globals.namespace
+            copied = dict(namespace)
+            exec(compiled_code, namespace)  # define the function
+            for name, value in list(namespace.items()):
+                if copied.get(name, _MISSING) is not value:
+                    fun_globals.bind(name, value)
+            fun_name = re.search(r"\s*def\s+(\w+)", code).group(1)
+            fun = namespace[fun_name]
+        except SyntaxError as err:
+            error_class = err.__class__.__name__
+            detail = err.args[0]
+            line_number = err.lineno
+            e = err
+            raw_traceback = None
+        except Exception as err:
+            # TODO would this ever happen?
+            error_class = err.__class__.__name__
+            detail = err.args[0]
+            cl, exc, tb = sys.exc_info()
+            line_number = traceback.extract_tb(tb)[-1][1]
+            e = err
+            raw_traceback = traceback.format_exc()
+        else:
+            return fun_name, fun, fun_globals, None
 
-            raise ExecutionError(e_node)
+        base_message = f"({error_class}) {detail}."
+        commented_code = (
+            self.generate_comment(code, base_message, line_number, 1)
+            + f"\n{base_message}"
+        )
+        if raw_traceback is None:
+            raw_traceback = "SyntaxError in trainable code definition.\n" + commented_code
+        return None, None, None, (e, commented_code, raw_traceback)
 
     @property
     def name(self):
@@ -254,28 +324,23 @@ class FunModule(Module):
             _kwargs (dict): the original keyword arguments (including the default values).
         """
         # Wrap the inputs as nodes
+        binder = self._get_binder(fun)
 
         # add default into kwargs
-        ba = inspect.signature(fun).bind(*args, **kwargs)
-        a0 = ba.arguments.copy()
-        ba.apply_defaults()
-        a1 = ba.arguments
-        fullargspec = inspect.getfullargspec(fun)
-        # include default into the kwargs
-        for k, v in a1.items():
-            if k not in a0:
-                if k != fullargspec.varargs and k != fullargspec.varkw:
-                    kwargs[k] = v
+        arguments, defaulted = binder.bind(args, kwargs)
+        for k in defaulted:
+            kwargs[k] = arguments[k]
         # convert args and kwargs to nodes, except for FunModule
         _args, _kwargs = args, kwargs  # back up
 
+        argnames = binder.argnames
         args = [
             (
                 node(
                     a,
                     name=(
-                        fullargspec.args[i]
-                        if i < len(fullargspec.args) and not isinstance(a, Node)
+                        argnames[i]
+                        if i < len(argnames) and not isinstance(a, Node)
                         else None
                     ),
                 )
@@ -295,12 +360,10 @@ class FunModule(Module):
 
         # Construct the input dict of the MessageNode from function inputs
         inputs = {}
-        # args, varargs, varkw, defaults, kwonlyargs, kwonlydefaults, ann
-        _, varargs, varkw, _, _, _, _ = inspect.getfullargspec(fun)
+        varargs, varkw = binder.varargs, binder.varkw
 
         # bind the node version of args and kwargs
-        ba = inspect.signature(fun).bind(*args, **kwargs)
-        spec = ba.arguments
+        spec, _ = binder.bind(args, kwargs)
 
         def extract_param(n):
             return (
@@ -327,55 +390,92 @@ class FunModule(Module):
 
         return inputs, args, kwargs, _args, _kwargs
 
-    def _get_tracer(self):
-        """Get a tracer to overwrite the python recursion behavior of calling the decorated function."""
-
-        # Define a tracer to deal with recursive function calls
-        _bundled_func = None
-
-        def tracer(frame, event, arg=None):
-            """This tracer modifies the local/global dict of the frame, so that
-            when a recursive call of the wrapped function is made, it calls the
-            unwrapped function."""
-            nonlocal _bundled_func
-
-            if frame.f_code == self._fun.__code__:  # entering the wrapped function
-                # Use the original function, rather than the bundled function
-                if event == "call":  # Detect potential recursive calls
-                    if frame.f_code.co_name in frame.f_locals:
-                        # # the function is not defined globally at the top level
-                        current_fun = frame.f_locals[frame.f_code.co_name]
-                        if current_fun != self._fun:
-                            update_local(frame, frame.f_code.co_name, self._fun)
-                    elif frame.f_code.co_name in frame.f_globals:
-                        current_fun = frame.f_globals[frame.f_code.co_name]
-                        if current_fun != self._fun:
-                            assert isinstance(current_fun, FunModule)
-                            _bundled_func = current_fun  # save the original function
-                            frame.f_globals[frame.f_code.co_name] = self._fun
-
-                elif event == "return":
-                    if frame.f_code.co_name in frame.f_globals:
-                        frame.f_globals[frame.f_code.co_name] = _bundled_func
-            return tracer
-
-        return tracer
-
-    def _construct_error_comment(self, e):
-        """Construct the error comment on the source code and traceback."""
-        self.info["traceback"] = (
-            traceback.format_exc()
-        )  # This is saved for user debugging
-        # Construct message to optimizer
-        error_class = e.__class__.__name__
-        detail = e.args[0]
+    def _get_binder(self, fun):
+        """Return the _ArgumentBinder of fun. The binder is cached for the last function bound."""
+        binder = self._binder
+        if binder is None or binder.fun is not fun:
+            binder = self._binder = _ArgumentBinder(fun)
+        return binder
+
+    def _unbundle_recursion(self, fun):
+        """Return a version of fun whose recursive calls call the undecorated function, rather than the bundled one.
+
+        If fun is defined in another function, its name is a closure variable, and the version gets
+        a new closure cell containing the version itself. If fun is defined at the module level, the
+        version runs in its own copy of the global names that fun uses (see _FunctionGlobals), where
+        its name is bound to the version itself; the globals of the module are not changed. The
+        version is cached, so no tracer or per-call patching is needed.
+        """
+        cached = self._unbundled
+        if cached is not None and cached[0] is fun:
+            _, unbundled_fun, fun_globals = cached
+            if fun_globals is not None:
+                fun_globals.refresh()
+            return unbundled_fun
+        code = fun.__code__
+        name = code.co_name
+        unbundled_fun, fun_globals = fun, None
+        if name in code.co_freevars:
+            index = code.co_freevars.index(name)
+            try:
+                current_fun = fun.__closure__[index].cell_contents
+            except ValueError:  # the cell is not filled yet
+                current_fun = None
+            if isinstance(current_fun, FunModule):
+                cell = types.CellType()
+                closure = fun.__closure__[:index] + (cell,) + fun.__closure__[index + 1:]
+                unbundled_fun = self._copy_function(fun, code, fun.__globals__, closure)
+                cell.cell_contents = unbundled_fun
+        elif isinstance(fun.__globals__.get(name), FunModule):
+            fun_globals = _FunctionGlobals(code, (fun.__globals__,))
+            unbundled_fun = self._copy_function(fun, code, fun_globals.namespace, fun.__closure__)
+            fun_globals.bind(name, unbundled_fun)
+            if fun_globals.assigned:  # e.g., a counter declared global in fun
+                unbundled_fun = fun_globals.writing_back(unbundled_fun)
+        self._unbundled = (fun, unbundled_fun, fun_globals)
+        return unbundled_fun
+
+    @staticmethod
+    def _copy_function(fun, code, fun_globals, closure):
+        """Return a copy of fun with the given code, globals and closure."""
+        new_fun = types.FunctionType(code, fun_globals, fun.__name__, fun.__defaults__, closure)
+        new_fun.__kwdefaults__ = fun.__kwdefaults__
+        new_fun.__qualname__ = fun.__qualname__
+        return new_fun
+
+    def _construct_error_comment(self, e, info):
+        """Record the traceback and the error comment of the exception e in the info dict of the call.
+
+        They are constructed on first access of the info of the ExceptionNode (e.g., by
+        `ExceptionNode.create_feedback("full")`), since the ExceptionNodes of failing calls are
+        often discarded without being rendered. What they need (the code objects and the line numbers
+        of the frames) is extracted here, and the locals of the frames are cleared, so that a discarded
+        ExceptionNode does not keep the inputs and the other locals of the failed call alive.
+        """
         cl, exc, tb = sys.exc_info()
         assert tb is not None  # we're in the except block, so tb should not be None
-        n_fun_calls = len(traceback.extract_tb(tb))
+        # The code may be updated before the error comment is constructed.
+        code = self.parameter._data if self.parameter is not None else None
+        summary = traceback.TracebackException(cl, exc, tb, lookup_lines=False)
+        frames = [(f.f_code, ln) for f, ln in traceback.walk_tb(tb)]
+        traceback.clear_frames(tb)
+        del exc, tb
+        info["traceback"] = LazyInfo(lambda: "".join(summary.format()))  # This is saved for user debugging
+        cls = type(self)
+        info["error_comment"] = LazyInfo(lambda: cls._error_comment(e, frames, code))
+        output = e
+        return output
+
+    @classmethod
+    def _error_comment(cls, e, frames, code):
+        """Construct the error comment on the source code of the frames (code object, line number) of the traceback of the exception e."""
+        error_class = e.__class__.__name__
+        detail = e.args[0] if e.args else ""
+        n_fun_calls = len(frames)
         # Step through the traceback stack
         comments = []
         base_message = f"({error_class}) {detail}."
-        for i, (f, ln) in enumerate(traceback.walk_tb(tb)):
+        for i, (f, ln) in enumerate(frames):
             if i > 0:  # ignore the first one, since that is the try statement above
                 error_message = (
                     base_message
@@ -384,70 +484,58 @@ class FunModule(Module):
                 )
 
                 if (
-                    i == 1 and self.parameter is not None
+                    i == 1 and code is not None
                 ):  # this is the trainable function defined by exec, which needs special treatment. inspect.getsource doesn't work here.
-                    comment = self.generate_comment(
-                        self.parameter._data, error_message, ln, 1
-                    )
-                    comment_backup = self.generate_comment(
-                        self.parameter._data, base_message, ln, 1
-                    )
+                    comment = cls.generate_comment(code, error_message, ln, 1)
+                    comment_backup = cls.generate_comment(code, base_message, ln, 1)
                 else:
                     try:
-                        f_source, f_source_ln = self.get_source(f, bug_mode=True)
+                        f_source, f_source_ln = cls.get_source(f, bug_mode=True)
                     except OSError:  # OSError: could not get source code
                         # we reach the compiled C level, so the previous level is actually the bottom
                         comments[-1] = comment_backup  # replace the previous comment
                         break  # exit the loop
-                    comment = self.generate_comment(
+                    comment = cls.generate_comment(
                         f_source, error_message, ln, f_source_ln
                     )
-                    comment_backup = self.generate_comment(
+                    comment_backup = cls.generate_comment(
                         f_source, base_message, ln, f_source_ln
                     )
                 comments.append(comment)
         commented_code = "\n\n".join(comments)
-        self.info["error_comment"] = commented_code + f"\n{base_message}"
-        output = e
-        return output
+        return commented_code + f"\n{base_message}"
 
-    def sync_call_fun(self, fun, *_args, **_kwargs):
+    def sync_call_fun(self, fun, info, *_args, **_kwargs):
         """Call the operator fun and return the output. Catch the exception if catch_execution_error is True."""
-        oldtracer = sys.gettrace()
         if (
             self.overwrite_python_recursion and self.parameter is None
         ):  # Overwrite the python recursion behavior
-            # Running a tracer would slow down the execution, so we only do this when necessary.
-            sys.settrace(self._get_tracer())
+            fun = self._unbundle_recursion(fun)
 
         if self.catch_execution_error:
             try:
                 output = fun(*_args, **_kwargs)
             except Exception as e:
-                output = self._construct_error_comment(e)
+                output = self._construct_error_comment(e, info)
         else:
             output = fun(*_args, **_kwargs)
 
-        sys.settrace(oldtracer)
         return output
 
-    async def async_call_fun(self, fun, *_args, **_kwargs):
-        oldtracer = sys.gettrace()
+    async def async_call_fun(self, fun, info, *_args, **_kwargs):
         if (
             self.overwrite_python_recursion and self.parameter is None
         ):  # Overwrite the python recursion behavior
-            # Running a tracer would slow down the execution, so we only do this when necessary.
-            sys.settrace(self._get_tracer())
+            fun = self._unbundle_recursion(fun)
 
         if self.catch_execution_error:
             try:
                 output = await fun(*_args, **_kwargs)
             except Exception as e:
-                output = self._construct_error_comment(e)
+                output = self._construct_error_comment(e, info)
         else:
             output = await fun(*_args, **_kwargs)
 
-        sys.settrace(oldtracer)
         return output
 
     def preprocess_inputs(self, args, kwargs, _args, _kwargs):
@@ -472,13 +560,14 @@ class FunModule(Module):
         # so we don't change _args and _kwargs
         return _args, _kwargs  # this will be passed as the input to the function
 
-    def postprocess_output(self, output, fun, _args, _kwargs, used_nodes, inputs):
+    def postprocess_output(self, output, fun, info, _args, _kwargs, used_nodes, inputs):
         """
             Wrap the output as a MessageNode. Log the inputs and output of the function call.
 
         Args:
             output (Any): the output of the operator fun.
             fun (callable): the operator fun.
+            info (dict): the info dict of the call (see `_call_info`).
             _args (list): the original positional arguments. This includes the default values.
             _kwargs (dict): the original keyword arguments. This includes the default values.
             used_nodes (List[Node]): the nodes used in the operator fun.
@@ -486,15 +575,16 @@ class FunModule(Module):
         """
 
         # Log inputs and output of the function call
-        self.info["output"] = output
-        self.info["inputs"]["args"] = _args
-        self.info["inputs"]["kwargs"] = _kwargs
+        info["output"] = output
+        info["inputs"]["args"] = _args
+        info["inputs"]["kwargs"] = _kwargs
 
         # Nodes used to create the output but not in the inputs are external dependencies.
+        input_ids = {id(node) for node in inputs.values()}  # check for identity instead of value
         external_dependencies = [
-            node for node in used_nodes if not contain(inputs.values(), node)
+            node for node in used_nodes if id(node) not in input_ids
         ]
-        self.info["external_dependencies"] = external_dependencies
+        info["external_dependencies"] = external_dependencies
 
         # Make sure all nodes in used_nodes are in the parents of the returned node.
         if len(external_dependencies) > 0 and not self.allow_external_dependencies:
@@ -507,20 +597,42 @@ class FunModule(Module):
                 {}
             )  # We don't need to keep track of the inputs if we are not tracing.
         # Wrap the output as a MessageNode or an ExceptionNode
-        nodes = self.wrap(output, inputs, external_dependencies)
+        nodes = self.wrap(output, inputs, external_dependencies, info)
         return nodes
 
     def forward(self, *args, **kwargs):
-        fun = self.fun  # Define the function (only once)
-        self.info["fun"] = fun
+        if INFERENCE_MODE.get():
+            return self.inference_forward(*args, **kwargs)
+        info = self._call_info()  # The record of this call
+        fun = self._get_fun(info)  # Define the function (only once)
+        info["fun"] = fun
         if inspect.iscoroutinefunction(fun):
             return self.async_forward(
-                fun, *args, **kwargs
+                fun, info, *args, **kwargs
             )  # Return a coroutine that returns a MessageNode
         else:
-            return self.sync_forward(fun, *args, **kwargs)  # Return a MessageNode
+            return self.sync_forward(fun, info, *args, **kwargs)  # Return a MessageNode
 
-    def sync_forward(self, fun, *args, **kwargs):
+    def inference_forward(self, *args, **kwargs):
+        """
+        Call the operator fun on the data of the inputs and return its output
+        as is. No node is created and no used node is recorded, and exceptions
+        are raised as they are. This is used in inference mode. For async
+        functions, this returns the coroutine of fun.
+        """
+        if self.parameter is None:
+            fun = self._fun
+        else:
+            fun, error = self._trainable_fun()
+            if error is not None:  # e.g., a syntax error of the code
+                raise error[0].with_traceback(None)
+        if self._process_inputs:
+            args = [a._data if isinstance(a, Node) else inference_data(a) for a in args]
+            if kwargs:
+                kwargs = {k: inference_data(v) for k, v in kwargs.items()}
+        return fun(*args, **kwargs)
+
+    def sync_forward(self, fun, info, *args, **kwargs):
         """
         Call the operator fun and return a MessageNode. All nodes used in
         the operator fun are added to used_nodes during the execution. If
@@ -533,12 +645,17 @@ class FunModule(Module):
         with trace_nodes() as used_nodes:
             # After exit, used_nodes contains the nodes whose data attribute is read in the operator fun.
             _args, _kwargs = self.preprocess_inputs(args, kwargs, _args, _kwargs)
-            output = self.sync_call_fun(fun, *_args, **_kwargs)
+            output = self.sync_call_fun(fun, info, *_args, **_kwargs)
         # Wrap the output as a MessageNode or an ExceptionNode
-        nodes = self.postprocess_output(output, fun, _args, _kwargs, used_nodes, inputs)
+        nodes = self.postprocess_output(
+            output, fun, info, _args, _kwargs, used_nodes, inputs
+        )
+        calls = GRAPH_CAPTURE.get()
+        if calls is not None:  # Record the call to replay it later
+            calls.append((self, args, kwargs, nodes))
         return nodes
 
-    async def async_forward(self, fun, *args, **kwargs):
+    async def async_forward(self, fun, info, *args, **kwargs):
         """
         Call the operator fun and return a MessageNode. All nodes used in
         the operator fun are added to used_nodes during the execution. If
@@ -552,10 +669,12 @@ class FunModule(Module):
             # After exit, used_nodes contains the nodes whose data attribute is read in the operator fun.
             _args, _kwargs = self.preprocess_inputs(args, kwargs, _args, _kwargs)
             output = await self.async_call_fun(
-                fun, *_args, **_kwargs
+                fun, info, *_args, **_kwargs
             )  # use await to call the async function
         # Wrap the output as a MessageNode or an ExceptionNode
-        nodes = self.postprocess_output(output, fun, _args, _kwargs, used_nodes, inputs)
+        nodes = self.postprocess_output(
+            output, fun, info, _args, _kwargs, used_nodes, inputs
+        )
         return nodes
 
     def wrap(
@@ -563,24 +682,26 @@ class FunModule(Module):
         output: Any,
         inputs: Union[List[Node], Dict[str, Node]],
         external_dependencies: List[Node],
+        info: Dict = None,
     ):
-        """Wrap the output as a MessageNode of inputs as the parents."""
+        """Wrap the output as a MessageNode of inputs as the parents. info is the info dict of the call (see `_call_info`)."""
+        if info is None:
+            info = self._call_info()
         # Some nodes are used in the operator fun, we need to wrap the output as a MessageNode.
         if self.parameter is not None:
             # This is a trainiable op. Create a new op eval.
             inputs.update({"__code": self.parameter})
             description = "[eval] This operator eval(__code, *args, **kwargs) evaluates the code block, where __code is the code (str) and *args and **kwargs are the arguments of the function. The output is the result of the evaluation, i.e., __code(*args, **kwargs)."
             name = "eval"
-            self.info["fun_name"] = "eval"
+            info["fun_name"] = "eval"
         else:
             description = self.description
             name = self.name
-        info = self.info.copy()
         if isinstance(output, Exception):
             e_node = ExceptionNode(
                 output,
                 inputs=inputs,
-                description=f'[exception] The operator {self.info["fun_name"]} raises an exception.',
+                description=f'[exception] The operator {info["fun_name"]} raises an exception.',
                 name="exception_" + name,
                 info=info,
             )
@@ -604,23 +725,45 @@ class FunModule(Module):
         # Support instance methods.
         method_name = f'__TRACE_RESERVED_bundle_{self.name}'  # NOTE we assume these are secret names not taken
         obj_node_name = f'__TRACE_RESERVED_self_node'
-        if not hasattr(obj, obj_node_name):
-            setattr(obj, obj_node_name, node(obj))
         if not hasattr(obj, method_name):
-            funmodule = copy.deepcopy(self)  # instance specific version
-            funmodule.forward = functools.partial(funmodule.forward, getattr(obj, obj_node_name))
-            setattr(obj, method_name, funmodule)
+            setattr(obj, method_name, self._bind())  # instance specific version
         fun = getattr(obj, method_name)
+        if "forward" not in fun.__dict__:  # self is not bound yet
+            if INFERENCE_MODE.get():
+                # node(obj) returns obj itself in inference mode, so the node of self is not created (nor
+                # cached) here. The raw object is passed to the function instead, by a version bound once per instance.
+                bound = fun.__dict__.get("_inference_bound")
+                if bound is None:
+                    bound = copy.copy(fun)
+                    bound.forward = functools.partial(fun.forward, obj)
+                    fun._inference_bound = bound
+                return bound
+            if not hasattr(obj, obj_node_name):
+                setattr(obj, obj_node_name, node(obj))
+            fun.forward = functools.partial(fun.forward, getattr(obj, obj_node_name))
         assert fun is not self  # self is defined in the class level
         assert isinstance(fun, FunModule), f"Expected {method_name} to be a FunModule, but got {type(fun)}"
         # fun = functools.partial(self.__call__, obj)
         return fun
 
+    def _bind(self):
+        """Return the instance specific version of the FunModule of a method.
+
+        The version is a shallow copy, which shares the decorated function, the info dict and the
+        caches with self, since they are not modified per instance. Only the trainable code is
+        copied, so that each instance has its own parameter.
+        """
+        self.info  # construct the info dict once, so that it is shared by the instances
+        funmodule = copy.copy(self)
+        if self.parameter is not None:
+            funmodule.parameter = copy.deepcopy(self.parameter)
+        return funmodule
+
     def detach(self):
         return copy.deepcopy(self)
 
+    @staticmethod
     def generate_comment(
-        self,
         code: str,
         comment: str,
         comment_line_number: int,
@@ -635,7 +778,8 @@ class FunModule(Module):
         commented_code = "\n".join(commented_code)
         return commented_code
 
-    def get_source(self, obj: Any, bug_mode=False):
+    @staticmethod
+    def get_source(obj: Any, bug_mode=False):
         """Get the source code of the function and its line number, excluding the @bundle decorator line.
         bug_mode=True means
         We are in the forward() function, but there is an error during execution.
@@ -654,10 +798,11 @@ class FunModule(Module):
             or inline usage
         >>>    bundle()(fun)  # or ....bundle()(fun)
         """
-        source = inspect.getsource(
-            obj
+        source_lines, line_number = getsourcelines(obj)
+        source = "".join(
+            source_lines
         )  # the source includes @bundle, or @trace.bundle, etc. we will remove those parts.
-        line_number = int(inspect.getsourcelines(obj)[1])  # line number of obj
+        line_number = int(line_number)  # line number of obj
 
         # Check if it's a decorator or an inline usage.
         decorator_usage = False
@@ -717,7 +862,7 @@ class FunModule(Module):
             # The inline usecase of
             # fun = @bundle(...)fun(...)
             #   ...
-            extracted_source = inspect.getsource(obj).strip()
+            extracted_source = source.strip()
 
         if not bug_mode:
             assert (
@@ -727,9 +872,120 @@ class FunModule(Module):
         return extracted_source, line_number
 
 
+class _ArgumentBinder:
+    """Bind the arguments of calls to a function to its parameters.
+
+    The signature of the function is analyzed once when the binder is created, so that
+    binding a call does not use `inspect`. The result is the same as
+    `inspect.signature(fun).bind(*args, **kwargs)` followed by `apply_defaults()`. Calls
+    which the fast path does not handle (e.g., invalid calls) fall back to `inspect`, so
+    the same TypeError is raised for invalid calls.
+
+    Attributes:
+        fun (callable): the function.
+        argnames (list): the names of the positional arguments (see `inspect.getfullargspec`).
+        varargs (str): the name of the variable positional parameter, or None.
+        varkw (str): the name of the variable keyword parameter, or None.
+    """
+
+    def __init__(self, fun):
+        self.fun = fun
+        self.signature = inspect.signature(fun)
+        fullargspec = inspect.getfullargspec(fun)
+        self.argnames = fullargspec.args
+        self.varargs = fullargspec.varargs
+        self.varkw = fullargspec.varkw
+
+        kind = inspect.Parameter
+        parameters = list(self.signature.parameters.values())
+        self._order = tuple(p.name for p in parameters)
+        self._positional = tuple(
+            p.name
+            for p in parameters
+            if p.kind in (kind.POSITIONAL_ONLY, kind.POSITIONAL_OR_KEYWORD)
+        )
+        self._keywords = frozenset(
+            p.name
+            for p in parameters
+            if p.kind in (kind.POSITIONAL_OR_KEYWORD, kind.KEYWORD_ONLY)
+        )
+        self._var_positional = next(
+            (p.name for p in parameters if p.kind == kind.VAR_POSITIONAL), None
+        )
+        self._var_keyword = next(
+            (p.name for p in parameters if p.kind == kind.VAR_KEYWORD), None
+        )
+        self._defaults = {
+            p.name: p.default for p in parameters if p.default is not kind.empty
+        }
+
+    def bind(self, args, kwargs):
+        """Bind args and kwargs to the parameters of the function.
+
+        Returns:
+            arguments (dict): the value of each parameter (including default values), in the order of the parameters.
+            defaulted (list): the names of the parameters (except for *args and **kwargs) set to their default values.
+        """
+        positional = self._positional
+        n_positional = len(positional)
+        if len(args) > n_positional and self._var_positional is None:
+            return self._bind_slow(args, kwargs)  # too many positional arguments
+        given = dict(zip(positional, args))
+        extra = {}
+        for k, v in kwargs.items():
+            if k in self._keywords and k not in given:
+                given[k] = v
+            elif self._var_keyword is not None and k not in self._order:
+                extra[k] = v
+            else:
+                return self._bind_slow(args, kwargs)
+
+        arguments = {}
+        defaulted = []
+        for name in self._order:
+            if name in given:
+                arguments[name] = given[name]
+            elif name == self._var_positional:
+                arguments[name] = tuple(args[n_positional:])
+            elif name == self._var_keyword:
+                arguments[name] = extra
+            elif name in self._defaults:
+                arguments[name] = self._defaults[name]
+                defaulted.append(name)
+            else:
+                return self._bind_slow(args, kwargs)  # missing argument
+        return arguments, defaulted
+
+    def _bind_slow(self, args, kwargs):
+        ba = self.signature.bind(*args, **kwargs)
+        explicit = set(ba.arguments)
+        ba.apply_defaults()
+        defaulted = [
+            k
+            for k in ba.arguments
+            if k not in explicit and k != self._var_positional and k != self._var_keyword
+        ]
+        return ba.arguments, defaulted
+
+
+def get_doc(fun):
+    """Return the cleaned docstring of a function, or an empty string."""
+    docstring = inspect.getdoc(fun)
+    return inspect.cleandoc(docstring) if docstring is not None else ""
+
+
+def inference_data(obj):
+    """Extract the data from a node or a container of nodes, without tracing the nodes read."""
+    if isinstance(obj, Node):
+        return obj._data
+    if isinstance(obj, (tuple, list, dict, set, NodeContainer)):
+        return recursive_conversion(lambda x: x._data)(obj)
+    return obj
+
+
 def to_data(obj):
     """Extract the data from a node or a container of nodes."""
-    return recursive_conversion(lambda x: x.data, lambda x: x)(obj)
+    return recursive_conversion(lambda x: x.data)(obj)
 
 
 def wrap_node(obj):
@@ -739,13 +995,137 @@ def wrap_node(obj):
 
 def detach_inputs(obj):
     """Detach a node or a container of nodes."""
-    return recursive_conversion(lambda x: x.detach(), lambda x: x)(obj)
+    return recursive_conversion(lambda x: x.detach())(obj)
+
+
+def getsourcelines(obj):
+    """Return the source lines and the starting line number of obj, as `inspect.getsourcelines`.
+
+    The source of frames and code objects (e.g., the frames of tracebacks) is looked up once per
+    code object and cached.
+    """
+    if inspect.isframe(obj):
+        obj = obj.f_code
+    if not inspect.iscode(obj):
+        return inspect.getsourcelines(obj)
+    source = _getsourcelines_of_code(obj)
+    if source is None:
+        raise OSError("could not get source code")
+    return source
+
+
+@functools.lru_cache(maxsize=1024)
+def _getsourcelines_of_code(code):
+    """Return the source lines and the starting line number of a code object, or None if the source is not available."""
+    try:
+        lines, line_number = inspect.getsourcelines(code)
+    except OSError:
+        return None
+    return tuple(lines), line_number
+
+
+_GLOBAL_OPS = {"LOAD_GLOBAL", "LOAD_NAME", "LOAD_FROM_DICT_OR_GLOBALS", "STORE_GLOBAL", "DELETE_GLOBAL"}
+_MISSING = object()
+
+
+def _global_names(code):
+    """Return the global names used by code (and the code objects nested in it), and those of them which it assigns or deletes."""
+    names, assigned = set(), set()
+    for instruction in dis.get_instructions(code):
+        if instruction.opname in _GLOBAL_OPS:
+            names.add(instruction.argval)
+            if instruction.opname in ("STORE_GLOBAL", "DELETE_GLOBAL"):
+                assigned.add(instruction.argval)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            nested_names, nested_assigned = _global_names(const)
+            names |= nested_names
+            assigned |= nested_assigned
+    return names, assigned
+
+
+class _FunctionGlobals:
+    """The global name space of a function rebuilt by FunModule (see _unbundle_recursion and _define_fun).
+
+    The name space is a real dict, so the global lookups of the function are as fast as usual. It
+    holds the names bound for the function (e.g., the function itself for its recursive calls) and
+    the other global names which its code uses, copied from the fallback name spaces (e.g., the
+    globals of the original function) by `refresh`. Only these names are copied, so a refresh costs
+    a few lookups per name, independently of the size of the module.
+
+    Args:
+        code: the code object of the function (or of the code block defining it).
+        fallbacks (tuple): the name spaces where the names are looked up, in order. The last one is
+            the globals of the module, which also provides the builtins.
+    """
+
+    def __init__(self, code, fallbacks):
+        names, self.assigned = _global_names(code)
+        self.fallbacks = fallbacks
+        self.bound = {}
+        self._names = tuple(names)
+        module_globals = fallbacks[-1]
+        self.namespace = {
+            "__builtins__": module_globals.get("__builtins__", builtins),
+            "__name__": module_globals.get("__name__"),
+        }
+        self._refreshed = {}  # the values of the assigned names after the last refresh
+        self.refresh()
+
+    def __deepcopy__(self, memo):
+        return self  # shared by the copies of the FunModule, like the functions using it
+
+    def bind(self, name, value):
+        """Bind name to value in the name space, instead of copying it."""
+        self.bound[name] = value
+        self.namespace[name] = value
+        self._names = tuple(n for n in self._names if n not in self.bound)
+
+    def refresh(self):
+        """Copy the current values of the names used by the code from the fallback name spaces."""
+        namespace = self.namespace
+        for name in self._names:
+            for fallback in self.fallbacks:
+                if name in fallback:
+                    namespace[name] = fallback[name]
+                    break
+        if self.assigned:
+            self._refreshed = {name: namespace.get(name, _MISSING) for name in self.assigned}
+
+    def write_back(self):
+        """Write the global names which the function assigned (or deleted) since the last refresh to the module."""
+        module_globals = self.fallbacks[-1]
+        namespace = self.namespace
+        for name, value in self._refreshed.items():
+            current = namespace.get(name, _MISSING)
+            if current is value:
+                continue
+            if current is _MISSING:
+                module_globals.pop(name, None)
+            else:
+                module_globals[name] = current
+
+    def writing_back(self, fun):
+        """Return a wrapper of fun which writes the global names it assigns back to the module when it returns."""
+        if inspect.iscoroutinefunction(fun):
+
+            @functools.wraps(fun)
+            async def wrapper(*args, **kwargs):
+                try:
+                    return await fun(*args, **kwargs)
+                finally:
+                    self.write_back()
+
+        else:
 
+            @functools.wraps(fun)
+            def wrapper(*args, **kwargs):
+                try:
+                    return fun(*args, **kwargs)
+                finally:
+                    self.write_back()
 
-def update_local(frame, name, value):
-    """Update the value of a local variable in a frame."""
-    frame.f_locals[name] = value
-    ctypes.pythonapi.PyFrame_LocalsToFast(ctypes.py_object(frame), ctypes.c_int(0))
+        return wrapper
 
 
 if __name__ == "__main__":
@@ -0,0 +1,272 @@
+import inspect
+from typing import Callable, Optional
+
+from opto.trace.broadcast import recursive_conversion
+from opto.trace.bundle import FunModule
+from opto.trace.containers import NodeContainer
+from opto.trace.errors import ExecutionError
+from opto.trace.modules import Module
+from opto.trace.nodes import (
+    GRAPH,
+    GRAPH_CAPTURE,
+    GRAPH_SESSIONS,
+    INFERENCE_MODE,
+    USED_NODES,
+    Node,
+    node,
+)
+
+
+def capture(module: Module, guard: Optional[Callable] = None):
+    """Trace the forward of a module once and replay the captured graph on new inputs.
+
+    Args:
+        module (Module): a module whose forward has a static control flow.
+        guard (callable, optional): a function of the inputs of forward (as nodes) returning a hashable key.
+            A graph is captured for each key, so the key should determine the control flow of forward and
+            the values that forward computes from the data of the inputs outside of bundled operators.
+
+    Returns:
+        CapturedModule: a callable with the same inputs and outputs as `module`.
+
+    Examples:
+        >>> agent = capture(Agent())
+        >>> for x in dataset:
+        >>>     output = agent(x)  # the first call traces Agent.forward, the others replay it
+    """
+    return CapturedModule(module, guard=guard)
+
+
+class CapturedModule:
+    """A module whose forward is run by replaying captured graphs (see `capture`).
+
+    The first call (for each key of the guard) runs `module.forward` eagerly and records the bundled
+    calls which create the graph of the output. Later calls do not run `forward`. They execute the
+    recorded calls in topological order on the new inputs, creating a new MessageNode for each call
+    as eager tracing does, so the returned graph is equivalent to the one that `forward` would create.
+
+    Notes:
+        The inputs of forward are wrapped as nodes, so that they can be replaced in the replay.
+        Only the calls which the output depends on are replayed; other side effects of forward are
+        not. If forward reads the data of the inputs (or of nodes computed from them) outside of
+        bundled operators, e.g., in `if x.data > 0` or `self.f(len(x.data))`, a replay could take
+        the wrong branch or reuse a stale value, so without a guard forward is always run eagerly.
+        If a replayed call raises an exception, or the structure of the inputs differs from the
+        captured one, the call falls back to running forward eagerly. Calls of async operators
+        cannot be replayed, so graphs containing them are always traced eagerly. When tracing is
+        disabled (`stop_tracing` or `inference_mode`), forward is run directly.
+    """
+
+    def __init__(self, module: Module, guard: Optional[Callable] = None):
+        self.module = module
+        self.guard = guard
+        self._graphs = {}  # guard key -> CapturedGraph, or None if the graph cannot be replayed
+
+    def __call__(self, *args, **kwargs):
+        if INFERENCE_MODE.get() or not GRAPH.TRACE:
+            return self.module(*args, **kwargs)
+        args = [node(a) if not isinstance(a, FunModule) else a for a in args]
+        kwargs = {k: node(v) if not isinstance(v, FunModule) else v for k, v in kwargs.items()}
+        key = self.guard(*args, **kwargs) if self.guard is not None else None
+        if key not in self._graphs:
+            output, self._graphs[key] = CapturedGraph.capture(self.module, args, kwargs, self.guard)
+            return output
+        graph = self._graphs[key]
+        if graph is not None:
+            try:
+                return graph.replay(args, kwargs)
+            except ReplayError:
+                pass
+        return self.module(*args, **kwargs)
+
+
+class ReplayError(Exception):
+    """Raised when a captured graph cannot be replayed on the given inputs."""
+
+
+class CapturedGraph:
+    """The bundled calls recorded from a run of a module's forward.
+
+    Attributes:
+        inputs (list): the input nodes of the captured run (positional ones first).
+        kwarg_names (tuple): the names of the keyword inputs.
+        output (Any): the output of the captured run.
+        steps (list): the recorded calls (FunModule, args, kwargs, output node) which the output depends on, in the order they were made.
+        constants (set): the ids of the constant nodes created in the captured run; they are recreated in each replay.
+    """
+
+    def __init__(self, inputs, kwarg_names, output, steps, constants):
+        self.inputs = inputs
+        self.kwarg_names = kwarg_names
+        self.output = output
+        self.steps = steps
+        self.constants = constants
+
+    @classmethod
+    def capture(cls, module, args, kwargs, guard=None):
+        """Run module(*args, **kwargs) and capture its graph. guard is the guard of the CapturedModule, if any.
+
+        Returns:
+            output (Any): the output of the module.
+            graph (CapturedGraph): the captured graph, or None if the graph cannot be replayed.
+        """
+        calls = []
+        recorder = _CreatedNodes()
+        read = set()  # the nodes whose data is read in forward outside of the bundled calls
+        calls_token = GRAPH_CAPTURE.set(calls)
+        sessions_token = GRAPH_SESSIONS.set(GRAPH_SESSIONS.get() + (recorder,))
+        used_token = USED_NODES.set(read)
+        try:
+            output = module(*args, **kwargs)
+        finally:
+            USED_NODES.reset(used_token)
+            GRAPH_SESSIONS.reset(sessions_token)
+            GRAPH_CAPTURE.reset(calls_token)
+        inputs = list(args) + list(kwargs.values())
+        if _depends_on(read, inputs, calls) and guard is None:
+            return output, None  # forward computes from the data of the inputs
+        graph = cls._from_calls(inputs, tuple(kwargs), output, calls, recorder._created)
+        return output, graph
+
+    @classmethod
+    def _from_calls(cls, inputs, kwarg_names, output, calls, created):
+        if len({id(x) for x in inputs}) != len(inputs):
+            return None  # the same node is passed as different inputs
+        input_ids = {id(x) for x in inputs}
+        calls_by_output = {id(c[3]): c for c in calls}
+        # The code parameters of the operators may be created in forward (see FunModule.__get__),
+        # but they are kept by the operators and are shared by the replays.
+        shared = {id(c[0].parameter) for c in calls if c[0].parameter is not None}
+        # Collect the calls and the constants which the output depends on.
+        needed, constants, visited = set(), set(), set()
+        stack = _nodes_in(output)
+        while stack:
+            n = stack.pop()
+            if id(n) in visited or id(n) in input_ids:
+                continue
+            visited.add(id(n))
+            if id(n) in calls_by_output:
+                needed.add(id(n))
+                _, args, kwargs, _ = calls_by_output[id(n)]
+                stack.extend(n._inputs.values())
+                stack.extend(_nodes_in(args) + _nodes_in(kwargs))
+            elif id(n) in created and id(n) not in shared and not _is_self_node(n):
+                if type(n) is not Node or len(n.parents) > 0 or _contains_node(n._data):
+                    return None  # created by other means than a recorded call
+                constants.add(id(n))
+            # Otherwise, the node is created before forward (e.g., a parameter) or cached
+            # (e.g., the node of self of a bundled method), and is shared by the replays.
+        steps = [c for c in calls if id(c[3]) in needed]
+        return cls(inputs, kwarg_names, output, steps, constants)
+
+    def replay(self, args, kwargs):
+        """Execute the recorded calls on new inputs and return the new output.
+
+        Raises:
+            ReplayError: if the inputs do not match the captured ones or a call raises an exception.
+        """
+        if len(args) + len(kwargs) != len(self.inputs) or tuple(kwargs) != self.kwarg_names:
+            raise ReplayError("The inputs do not match the captured inputs.")
+        env = {id(x): y for x, y in zip(self.inputs, list(args) + list(kwargs.values()))}
+
+        def resolve(n):
+            m = env.get(id(n))
+            if m is None:
+                if id(n) in self.constants:
+                    m = Node(
+                        n._data,
+                        name=n.name.split(":")[0],
+                        description=n._description,
+                        constraint=n._constraint,
+                        info=n._info,
+                    )
+                else:
+                    m = n
+                env[id(n)] = m
+            return m
+
+        for module, args, kwargs, output in self.steps:
+            # The recorded inputs are wrapped by FunModule._wrap_inputs, so they are nodes or FunModules.
+            args = [resolve(a) if isinstance(a, Node) else a for a in args]
+            kwargs = {k: resolve(v) if isinstance(v, Node) else v for k, v in kwargs.items()}
+            env[id(output)] = self._replay_call(module, args, kwargs, output, resolve)
+        return recursive_conversion(resolve)(self.output)
+
+    @staticmethod
+    def _replay_call(module, args, kwargs, recorded, resolve):
+        """Call module as recorded, with the inputs replaced by the nodes of the replay."""
+        if module.traceable_code or not module._process_inputs:
+            try:
+                return FunModule.forward(module, *args, **kwargs)
+            except ExecutionError as e:
+                raise ReplayError("The operator raises an exception.") from e
+        # This is FunModule.sync_forward without the binding of the inputs, which is known from the recorded call.
+        info = module._call_info()
+        try:
+            fun = module._get_fun(info)
+        except ExecutionError as e:
+            raise ReplayError("The code of the operator has an error.") from e
+        if inspect.iscoroutinefunction(fun):
+            raise ReplayError("Async operators cannot be replayed.")
+        info["fun"] = fun
+        _args = [a._data if isinstance(a, Node) else a for a in args]
+        _kwargs = {k: v._data if isinstance(v, Node) else v for k, v in kwargs.items()}
+        output = module.sync_call_fun(fun, info, *_args, **_kwargs)
+        if isinstance(output, Exception):
+            raise ReplayError("The operator raises an exception.") from output
+        info["output"] = output
+        info["inputs"]["args"] = _args
+        info["inputs"]["kwargs"] = _kwargs
+        external_dependencies = [resolve(n) for n in recorded.info["external_dependencies"]]
+        info["external_dependencies"] = external_dependencies
+        inputs = {
+            k: resolve(v)
+            for k, v in recorded._inputs.items()
+            if not (k == "__code" and module.parameter is not None)  # added by wrap
+        }
+        return module.wrap(output, inputs, external_dependencies, info)
+
+
+class _CreatedNodes:
+    """Collects the nodes created while it is in GRAPH_SESSIONS (see Graph.register)."""
+
+    def __init__(self):
+        self._created = {}
+
+
+def _depends_on(nodes, inputs, calls) -> bool:
+    """Whether any of nodes is one of inputs or the output of a recorded call depending on them."""
+    dependent = {id(x) for x in inputs}
+    for _, _, _, output in calls:  # the calls are recorded in the order they are made
+        if any(id(p) in dependent for p in output.parents):
+            dependent.add(id(output))
+    return any(id(n) in dependent for n in nodes)
+
+
+def _is_self_node(n):
+    """Whether n is the node of an object created when a bundled method of the object is accessed (see FunModule.__get__)."""
+    return getattr(n._data, "__TRACE_RESERVED_self_node", None) is n
+
+
+def _contains_node(obj):
+    """Whether obj is a node or a tuple, list, set or dict containing nodes."""
+    if isinstance(obj, Node):
+        return True
+    if isinstance(obj, (tuple, list, set)):
+        return any(_contains_node(x) for x in obj)
+    if isinstance(obj, dict):
+        return any(_contains_node(x) for x in obj.values())
+    return False
+
+
+def _nodes_in(obj) -> list:
+    """Return the nodes in a node or a container of nodes."""
+    nodes = []
+
+    def collect(n):
+        nodes.append(n)
+        return n
+
+    if isinstance(obj, (Node, tuple, list, dict, set, NodeContainer)):
+        recursive_conversion(collect)(obj)
+    return nodes
@@ -1,13 +1,14 @@
-import inspect
 from collections import UserDict, UserList
 from opto.trace.nodes import ParameterNode
 import functools
+import types
+import weakref
 
 
 class NodeContainer:
     """An identifier for a container of nodes."""
 
-    ...
+    __slots__ = ()  # so that subclasses can use __slots__
 
 
 def trainable_method(method):
@@ -21,6 +22,8 @@ def trainable_method(method):
 class ParameterContainer(NodeContainer):
     """A container of parameter nodes."""
 
+    __slots__ = ()
+
     def parameters(self):
         """Return a flattned list of all the parameters in the model's
         parameters_dict, useful for optimization."""
@@ -39,12 +42,29 @@ class ParameterContainer(NodeContainer):
         """Return a dictionary of all the parameters in the model, including
         both trainable and non-trainable parameters. The dict contains
         ParameterNodes or ParameterContainers.
+
+        Notes:
+            The attributes which may hold parameters are looked up: the instance attributes and the
+            class attributes which are ParameterNodes, ParameterContainers (e.g., bundled methods) or
+            partial functions, and the descriptors of the class (e.g., properties and slots), which
+            are evaluated as `inspect.getmembers` does. Methods and other attributes are not
+            evaluated. If the object has no __dict__, all the attributes listed by `dir` are looked up.
         """
+        instance_dict = getattr(self, "__dict__", None)
+        if instance_dict is None:
+            names = set(dir(self))
+        else:
+            names = _parameter_member_names(type(self))
+            names.update(name for name, attr in instance_dict.items() if isinstance(attr, _PARAMETER_TYPES))
         parameters = {}
-        for name, attr in inspect.getmembers(self):
+        for name in sorted(names):
             if name.startswith('__TRACE_RESERVED_'):
                 # These are reserved for internal use.
                 continue
+            try:
+                attr = getattr(self, name)
+            except AttributeError:  # e.g., an unset slot, or a property raising AttributeError
+                continue
             if isinstance(attr, functools.partial):  # this is a class method
                 method = attr.func.__self__
                 if trainable_method(method):
@@ -64,6 +84,58 @@ class ParameterContainer(NodeContainer):
         return parameters  # include both trainable and non-trainable parameters
 
 
+_PARAMETER_TYPES = (ParameterNode, ParameterContainer, functools.partial)
+# The descriptors which never return parameters, so they are not evaluated.
+_METHOD_TYPES = (types.FunctionType, classmethod, type, types.BuiltinFunctionType, types.WrapperDescriptorType,
+                 types.MethodDescriptorType, types.ClassMethodDescriptorType)
+
+
+def _parameter_member_names(cls):
+    """Return the names of the attributes of the class cls (including the inherited ones) which may hold parameters.
+
+    These are ParameterNodes, ParameterContainers (e.g., bundled methods), partial functions, and
+    descriptors other than methods (e.g., properties and slots).
+    """
+    names = set()
+    for klass in cls.__mro__:
+        if klass is not object:
+            names.update(_class_member_names(klass))
+    return names
+
+
+_CLASS_MEMBER_NAMES = weakref.WeakKeyDictionary()  # class -> (ids of its attribute names, ids of its attributes, names)
+
+
+def _class_member_names(klass):
+    """Return the names of the attributes defined by klass which may hold parameters.
+
+    The result is cached, and it is recomputed when the attributes of klass change (e.g., a class
+    attribute is assigned after a call). The cache holds the ids of the attributes rather than the
+    attributes, since some of them (e.g., the descriptor of __dict__) refer to klass.
+    """
+    attrs = vars(klass)
+    keys = tuple(map(id, attrs))
+    values = tuple(map(id, attrs.values()))
+    cached = _CLASS_MEMBER_NAMES.get(klass)
+    if cached is not None and cached[0] == keys and cached[1] == values:
+        return cached[2]
+    names = set()
+    for name, attr in attrs.items():
+        if isinstance(attr, staticmethod):
+            attr = attr.__func__
+        if isinstance(attr, _PARAMETER_TYPES):
+            names.add(name)
+        elif (
+            hasattr(type(attr), "__get__")
+            and not isinstance(attr, _METHOD_TYPES)
+            and not (name.startswith("__") and name.endswith("__"))  # e.g., __dict__ and __weakref__
+        ):
+            names.add(name)
+    names = frozenset(names)
+    _CLASS_MEMBER_NAMES[klass] = (keys, values, names)
+    return names
+
+
 class Seq(UserList, ParameterContainer):
     """
     Seq is defined as having a length and an index.
@@ -5,6 +5,10 @@ from collections import defaultdict
 from typing import TypeVar, Generic
 import re
 import heapq
+import weakref
+import contextvars
+import threading
+from types import MappingProxyType
 
 
 def node(data, name=None, trainable=False, description=None, constraint=None):
@@ -28,6 +32,7 @@ def node(data, name=None, trainable=False, description=None, constraint=None):
         If trainable=False:
             - If data is already a Node, returns it (with warning if name provided)
             - Otherwise creates new Node with data, name and constraint
+            - In inference mode, returns data itself instead of creating a Node
     """
     assert type(description) is str or description is None
 
@@ -48,51 +53,86 @@ def node(data, name=None, trainable=False, description=None, constraint=None):
             if name is not None:
                 warnings.warn(f"Name {name} is ignored because data is already a Node.")
             return data
+        elif INFERENCE_MODE.get():
+            return data  # no graph is created in inference mode
         else:
             return Node(data, name=name, description=description, constraint=constraint)
 
 
-NAME_SCOPES = []  # A stack of name scopes
+# The tracing state is context-local, so that threads and asyncio tasks trace
+# independently. A new thread starts with the default values; an asyncio task
+# starts with a copy of the values of the context that creates it.
+NAME_SCOPES = contextvars.ContextVar("NAME_SCOPES", default=())  # A stack of name scopes
+TRACING = contextvars.ContextVar("TRACING", default=True)  # Whether to trace the graph
+INFERENCE_MODE = contextvars.ContextVar("INFERENCE_MODE", default=False)  # Whether to skip creating nodes altogether
+GRAPH_SESSIONS = contextvars.ContextVar("GRAPH_SESSIONS", default=())  # A stack of the active graph_session
+GRAPH_CAPTURE = contextvars.ContextVar("GRAPH_CAPTURE", default=None)  # The list recording FunModule calls (see opto.trace.capture)
+
+
+class name_scope:
+    """A context manager to prefix the names of the nodes created within it with `name/`."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._token = NAME_SCOPES.set(NAME_SCOPES.get() + (self.name,))
+        return self
+
+    def __exit__(self, type, value, traceback):
+        NAME_SCOPES.reset(self._token)
 
 
 class Graph:
     """Graph is a registry of all the nodes, forming a Directed Acyclic Graph (DAG).
 
     Attributes:
-        _nodes (defaultdict): An instance-level attribute, which is a defaultdict of lists, used as a lookup table to find nodes by name.
+        _nodes (defaultdict): An instance-level attribute, which is a defaultdict of WeakValueDictionary, used as a lookup table to find live nodes by name and index.
+        _counts (defaultdict): An instance-level attribute, which counts the number of nodes ever registered with each name.
 
     Notes:
         The Graph class manages and organizes nodes in a Directed Acyclic Graph (DAG).
         It provides methods to register nodes, clear the graph, retrieve nodes by name, and identify root nodes.
-        The `register` method assumes that elements in `_nodes` are never removed,
-        which is important for maintaining the integrity of node names.
+        The registry holds the nodes weakly, so nodes which are no longer referenced (e.g., the graph of
+        a finished iteration) can be garbage-collected. The index in a node's name is taken from `_counts`,
+        which never decreases, so names stay unique even after nodes are collected.
     """
 
-    TRACE = True  # When True, we trace the graph when creating MessageNode. When False, we don't trace the graph.
+    @property
+    def TRACE(self):
+        """When True, we trace the graph when creating MessageNode. When False, we don't trace the graph.
+
+        The value is stored in the context variable `TRACING`, so setting it only affects the current thread or asyncio task.
+        """
+        return TRACING.get()
+
+    @TRACE.setter
+    def TRACE(self, value):
+        TRACING.set(value)
 
     def __init__(self):
         """Initialize the Graph object.
 
-        The initialization sets up the `_nodes` attribute as a defaultdict of lists to store nodes by their names.
+        The initialization sets up the `_nodes` attribute as a defaultdict of WeakValueDictionary to store nodes by their names,
+        and the `_counts` attribute as a defaultdict of int to generate unique names.
         """
-        self._nodes = defaultdict(list)  # a lookup table to find nodes by name
+        self._nodes = defaultdict(weakref.WeakValueDictionary)  # a lookup table to find nodes by name
+        self._counts = defaultdict(int)  # the number of nodes registered with each name
 
     def clear(self):
         """Remove all nodes from the graph.
 
-        The clear function iterates over the current nodes stored in the _nodes attribute and deletes each node.
-        After all nodes have been deleted, it reinitializes the _nodes attribute to an empty defaultdict of lists.
+        The clear function reinitializes the _nodes and _counts attributes.
         This ensures that the graph is completely cleared and ready to be repopulated with new nodes if necessary.
 
         Notes:
-            After calling clear, any references to the previously stored nodes will become invalid.
+            After calling clear, names of new nodes are generated from index 0 again, so they may
+            coincide with the names of the previously registered nodes which are still alive.
             The function is called in unit tests to reset the state of the graph between test cases,
             ensuring that each test runs with a clean slate and is not affected by the state left by previous tests.
         """
-        for node in self._nodes.values():
-            del node
-        self._nodes = defaultdict(list)
-        # self._levels = defaultdict(list)
+        self._nodes = defaultdict(weakref.WeakValueDictionary)
+        self._counts = defaultdict(int)
 
     def register(self, node):
         """Add a node to the graph.
@@ -102,21 +142,23 @@ class Graph:
 
         Notes:
             The register function should only be called after the node has been properly initialized and its name has been set.
-            The function assumes that elements in the `_nodes` dictionary never get removed.
             After checking that the input is a `Node` and its name has the right format, the function splits the name of the node into the `name` variable and the identifier.
-            The function then checks if there are any name scopes defined in the `NAME_SCOPES` list. If the length of the list is greater than 0, the name is prefixed with the last scope in the list followed by a "/". This allows for scoping of node names.
-            Finally, the function adds the node to the `_nodes` dictionary using the modified name as the key. The `_name` attribute of the node is set to the modified name followed by the index of the node in the list of nodes with the same name.
+            The function then checks if there are any name scopes defined in the `NAME_SCOPES` context variable. If there are, the name is prefixed with the last scope in the list followed by a "/". This allows for scoping of node names.
+            Finally, the function adds a weak reference of the node to the `_nodes` dictionary using the modified name as the key. The `_name` attribute of the node is set to the modified name followed by the number of nodes registered with the same name before.
+            The node is also recorded in the graph sessions active in the current context.
         """
         assert isinstance(node, Node)
         assert len(node.name.split(":")) == 2
         name, _ = node.name.split(":")
-        if len(NAME_SCOPES) > 0:
-            name = NAME_SCOPES[-1] + "/" + name
-        self._nodes[name].append(node)
-        node._name = (
-            name + ":" + str(len(self._nodes[name]) - 1)
-        )  # NOTE assume elements in self._nodes never get removed.
-        # self._levels[node._level].append(node)
+        scopes = NAME_SCOPES.get()
+        if scopes:
+            name = scopes[-1] + "/" + name
+        index = self._counts[name]
+        self._counts[name] += 1
+        self._nodes[name][index] = node
+        node._name = name + ":" + str(index)
+        for session in GRAPH_SESSIONS.get():
+            session._created[id(node)] = node
 
     def get(self, name):
         """Retrieve a node from the graph by its name.
@@ -127,49 +169,197 @@ class Graph:
         Returns:
             Node: The requested node from the graph.
 
+        Raises:
+            KeyError: If no node with the given name was registered, or if it has been garbage-collected.
+
         Notes:
             Ensure that the 'name' parameter is correctly formatted as "name:id" before calling this function.
-            The function assumes that the '_nodes' attribute is a dictionary where each key is a node name and the corresponding value is a list of nodes.
-            The 'id' should be a valid index within the list of nodes for the given 'name'.
+            Only nodes which are still alive (i.e., referenced somewhere other than the graph) can be retrieved.
         """
         name, id = name.split(":")
-        return self._nodes[name][int(id)]
+        nodes = self._nodes.get(name)
+        node = nodes.get(int(id)) if nodes is not None else None
+        if node is None:
+            if int(id) < self._counts.get(name, 0):
+                raise KeyError(f"The node {name}:{id} has been garbage-collected. The graph only keeps the nodes which are referenced elsewhere.")
+            raise KeyError(f"There is no node named {name}:{id} in the graph.")
+        return node
 
     @property
     def roots(self):
         """Get all root nodes in the graph.
 
         Returns:
-            list: A list of all root nodes in the graph. A root node is identified by its `is_root` attribute.
+            list: A list of all live root nodes in the graph. A root node is identified by its `is_root` attribute.
         """
-        return [v for vv in self._nodes.values() for v in vv if v.is_root]
+        return [v for vv in self._nodes.values() for v in list(vv.values()) if v.is_root]
 
     def __str__(self):
         """Get string representation of the graph.
 
         Returns:
-            str: String representation of the `_nodes` attribute, useful for debugging and logging.
+            str: String representation of the live nodes in the `_nodes` attribute, useful for debugging and logging.
         """
-        return str(self._nodes)
+        return str({k: list(v.values()) for k, v in self._nodes.items()})
 
     def __len__(self):
         """Get total number of nodes in the graph.
 
         Returns:
-            int: The total number of nodes in the graph by summing the lengths of all lists in the `_nodes` dictionary.
+            int: The total number of nodes registered since the graph was created or last cleared.
+
+        Notes:
+            Garbage-collected nodes are still counted, so the number does not decrease while code runs
+            and can be used to count the nodes created by some code.
         """
         # This is the number of nodes in the graph
-        return sum([len(v) for v in self._nodes.values()])
+        return sum(self._counts.values())
 
 
 GRAPH = Graph()  # This is a global registry of all the nodes.
 
-USED_NODES = (
-    list()
-)  # A stack of sets. This is a global registry to track which nodes are read.
+
+class graph_session:
+    """A context manager that scopes the graph created within it.
+
+    When the session exits, the edges from the nodes created before the session
+    (e.g., parameters) to the nodes created within the session are removed.
+    Therefore, the graph of the session can be garbage-collected once it is
+    not referenced anymore, while the nodes created before the session stay
+    intact. Names of nodes remain unique across sessions.
+
+    Examples:
+        >>> for i in range(n_iterations):
+        >>>     with graph_session():
+        >>>         output = model(x)
+        >>>         optimizer.zero_feedback()
+        >>>         optimizer.backward(output, feedback)
+        >>>         optimizer.step()
+
+    Notes:
+        Feedback is not modified when the session exits. Feedback received by
+        nodes created before the session refers to the session's graph, so
+        call `zero_feedback` (e.g., through the optimizer) once it is used.
+    """
+
+    def __enter__(self):
+        self._created = weakref.WeakValueDictionary()  # id -> node created in the session
+        self._token = GRAPH_SESSIONS.set(GRAPH_SESSIONS.get() + (self,))
+        return self
+
+    def __exit__(self, type, value, traceback):
+        GRAPH_SESSIONS.reset(self._token)
+        created = self._created
+        # Collect the nodes created before the session which have children created in the session.
+        outer_parents = {}
+        for child in list(created.values()):
+            for parent in child._parents:
+                if id(parent) not in created:
+                    outer_parents[id(parent)] = parent
+        for parent in outer_parents.values():
+            parent._children = [c for c in parent._children if id(c) not in created]
+        self._created = None
+
+USED_NODES = contextvars.ContextVar(
+    "USED_NODES", default=None
+)  # The set of nodes read in the innermost trace_nodes context of the current thread or asyncio task.
 
 T = TypeVar("T")
 
+# Shared empty containers. Nodes point to these until they get parents, children
+# or feedback, so that root nodes do not allocate containers they never use.
+EMPTY_EDGES = ()
+EMPTY_FEEDBACK = MappingProxyType({})
+EMPTY_DEPENDENCIES = frozenset()
+
+
+class _IndexedRef(weakref.ref):
+    """A weak reference which remembers the index of its referent."""
+
+    __slots__ = ("index",)
+
+
+class ParameterIndex:
+    """A registry which assigns a dense integer index to each ParameterNode.
+
+    Sets of parameters are represented as bitsets (int), where the i-th bit is
+    set if the parameter of index i is in the set. Taking the union of two sets
+    of parameters is then a bitwise or, which is much cheaper than the union
+    of two Python sets.
+
+    Notes:
+        The registry holds the parameters weakly. The index of a garbage-collected
+        parameter is reused for a new parameter, which keeps the bitsets small.
+        This is safe because a node depending on a parameter keeps it alive
+        through its parents. Copies of nodes made by deepcopy or pickle (which
+        have no parents) store their dependencies as a set of nodes instead.
+    """
+
+    def __init__(self):
+        self._refs = []  # index -> weakref of the ParameterNode
+        self._free = []  # indices released by garbage-collected parameters
+        # Parameters may be created in several threads. The lock is reentrant, since _release is called
+        # by the garbage collector, which may run in register.
+        self._lock = threading.RLock()
+
+    def register(self, node):
+        """Assign an index to a ParameterNode and return it."""
+        with self._lock:
+            if len(self._free) > 0:
+                index = self._free.pop()
+            else:
+                index = len(self._refs)
+                self._refs.append(None)
+            ref = _IndexedRef(node, self._release)
+            ref.index = index
+            self._refs[index] = ref
+        return index
+
+    def _release(self, ref):
+        with self._lock:
+            if self._refs[ref.index] is ref:  # the index has not been reused
+                self._refs[ref.index] = None
+                self._free.append(ref.index)
+
+    def bits(self, nodes):
+        """Return the bitset of a collection of ParameterNodes."""
+        bits = 0
+        for node in nodes:
+            bits |= 1 << node._get_parameter_index()
+        return bits
+
+    def nodes(self, bits):
+        """Return the frozenset of ParameterNodes in a bitset."""
+        if bits == 0:
+            return EMPTY_DEPENDENCIES
+        nodes = []
+        index = 0
+        while bits:
+            if bits & 0xFFFFFFFFFFFFFFFF:  # skip empty words quickly
+                for i in range(64):
+                    if (bits >> i) & 1:
+                        nodes.append(self._refs[index + i]())
+            bits >>= 64
+            index += 64
+        return frozenset(n for n in nodes if n is not None)
+
+
+PARAMETER_INDEX = ParameterIndex()  # This is a global registry of the indices of parameters.
+
+
+def _slot_names(cls):
+    """Return the names of the slots defined in cls and its base classes."""
+    names = cls.__dict__.get("_slot_names_cache")
+    if names is None:
+        names = tuple(
+            name
+            for c in reversed(cls.__mro__)
+            for name in c.__dict__.get("__slots__", ())
+            if name not in ("__weakref__", "__dict__")
+        )
+        setattr(cls, "_slot_names_cache", names)
+    return names
+
 
 class AbstractNode(Generic[T]):
     """AbstractNode represents an abstract data node in a directed graph.
@@ -199,8 +389,14 @@ class AbstractNode(Generic[T]):
         The `AbstractNode` class overrides the `__str__` method to provide a string representation of the node. The representation includes the name, the type of the data, and the data itself.
         The `AbstractNode` class implements the `__deepcopy__` method to create a deep copy of the node. This allows the node to be detached from the original graph.
         The `AbstractNode` class provides comparison methods `lt` and `gt` to compare the levels of two nodes in the DAG.
+
+        Nodes use `__slots__` instead of a `__dict__` to keep the per-node memory small, since a graph
+        can contain millions of nodes. The lists of parents and children are allocated only when the first
+        parent or child is added; before that they are the shared empty tuple `EMPTY_EDGES`.
     """
 
+    __slots__ = ("_parents", "_children", "_level", "_data", "_name", "__weakref__")
+
     def __init__(self, value, *, name=None, trainable=False) -> None:
         """Initialize an instance of the AbstractNode class.
 
@@ -217,8 +413,8 @@ class AbstractNode(Generic[T]):
             Otherwise, the `_data` attribute is set to the `value` parameter itself, and the `_name` attribute is set to the default name.
             Finally, the function calls the `register` function of the GRAPH object to register the current node in the graph.
         """
-        self._parents = []
-        self._children = []
+        self._parents = EMPTY_EDGES  # allocated when the first parent is added
+        self._children = EMPTY_EDGES  # allocated when the first child is added
         self._level = 0  # roots are at level 0
         default_name = (
             str(type(value).__name__) + ":0" if name is None else name + ":0"
@@ -239,12 +435,13 @@ class AbstractNode(Generic[T]):
             Any: The internal data stored in the node.
 
         Notes:
-            If within a trace_nodes context and GRAPH.TRACE is True, adds the node to USED_NODES.
+            If within a trace_nodes context and GRAPH.TRACE is True, adds the node to the set in USED_NODES.
             This function assumes that the "_data" attribute exists within the node object.
             If this attribute is not present, an AttributeError will be raised.
         """
-        if len(USED_NODES) > 0 and GRAPH.TRACE:  # We're within trace_nodes context.
-            USED_NODES[-1].add(self)
+        used_nodes = USED_NODES.get()
+        if used_nodes is not None and TRACING.get():  # We're within trace_nodes context.
+            used_nodes.add(self)
         return self.__getattribute__("_data")
 
     @property
@@ -384,8 +581,14 @@ class AbstractNode(Generic[T]):
         assert isinstance(
             parent, Node
         ), f"{parent} is {type(parent)}, which is not a Node."
-        parent._children.append(self)
-        self._parents.append(parent)
+        if len(parent._children) == 0:
+            parent._children = [self]
+        else:
+            parent._children.append(self)
+        if len(self._parents) == 0:
+            self._parents = [parent]
+        else:
+            self._parents.append(parent)
         self._update_level(
             max(self._level, parent._level + 1)
         )  # Update the level, because the parent is added
@@ -438,9 +641,9 @@ class AbstractNode(Generic[T]):
             2. It then creates a new, uninitialized instance of this class (`result = cls.__new__(cls)`).
             3. The `memo` dictionary is updated to associate the original instance's ID with the new instance.
             This helps in tracking already copied objects to prevent infinite loops.
-            4. The function iterates over all the attributes of the original instance.
+            4. The function iterates over all the slots (and the `__dict__` of subclasses without `__slots__`) of the original instance.
             5. For attributes named `_parents` or `_children`, it sets these attributes in the new instance
-            to empty lists. This ensures that the new instance starts with no parent or child nodes.
+            to empty. This ensures that the new instance starts with no parent or child nodes.
             6. For all other attributes, it performs a deep copy of the attribute's value and assigns it
             to the new instance.
             7. Finally, the new instance is returned.
@@ -448,11 +651,18 @@ class AbstractNode(Generic[T]):
         cls = self.__class__
         result = cls.__new__(cls)
         memo[id(self)] = result
-        for k, v in self.__dict__.items():
+        attributes = [(k, getattr(self, k)) for k in _slot_names(cls) if hasattr(self, k)]
+        if hasattr(self, "__dict__"):
+            attributes.extend(self.__dict__.items())
+        for k, v in attributes:
             if k == "_parents" or k == "_children":
-                setattr(result, k, [])
+                setattr(result, k, EMPTY_EDGES)
             elif k == "_feedback":
-                setattr(result, k, defaultdict(list))
+                setattr(result, k, None)
+            elif k == "_parameter_index" or k == "_parameter_bits":
+                setattr(result, k, None)  # computed again when needed
+            elif k == "_parameter_dependencies":
+                setattr(result, k, copy.deepcopy(self.parameter_dependencies, memo))
             else:
                 setattr(result, k, copy.deepcopy(v, memo))
         GRAPH.register(result)
@@ -763,12 +973,14 @@ class Node(AbstractNode[T]):
 
     Attributes:
         trainable (bool): Whether the node is trainable or not.
-        _feedback (dict): Dictionary of feedback from children nodes.
+        _feedback (dict): Dictionary of feedback from children nodes. None until the first feedback is added.
         _description (str): String describing the node.
         _constraint (str): String describing all constraints that the data should satisfy.
         _backwarded (bool): Whether the backward method has been called.
         _info (dict): Dictionary containing additional information about the node.
-        _dependencies (dict): Dictionary of dependencies on parameters and expandable nodes.
+        _parameter_bits (int): The bitset of the parameters this node depends on (see ParameterIndex).
+        _parameter_dependencies (frozenset): The parameters this node depends on. Computed from `_parameter_bits` when needed.
+        _expandable_dependencies (frozenset): The expandable nodes this node depends on.
 
     Notes:
         The Node class extends AbstractNode to represent a data node in a directed graph.
@@ -779,8 +991,23 @@ class Node(AbstractNode[T]):
         aggregation, so feedback should be handled carefully to maintain correct operation order.
         The node can track dependencies on parameters and expandable nodes (nodes that depend
         on parameters not visible in the current graph level).
+        The parameter dependencies are stored as a bitset and the set of nodes is only
+        constructed when `parameter_dependencies` is read. The expandable dependencies are
+        immutable sets, so nodes with the same dependencies share them.
     """
 
+    __slots__ = (
+        "trainable",
+        "_feedback",
+        "_description",
+        "_constraint",
+        "_backwarded",
+        "_info",
+        "_parameter_bits",
+        "_parameter_dependencies",
+        "_expandable_dependencies",
+    )
+
     def __init__(
         self,
         value: Any,
@@ -815,12 +1042,14 @@ class Node(AbstractNode[T]):
         # We keep the propagated feedback as dict and let the propagator performs
         # the aggreation, rather than doing the aggregation incrementally. This is
         # to support implementing aggregation that is not commutable.
-        self._feedback = defaultdict(list)
+        self._feedback = None  # allocated when the first feedback is added
         self._description = description
         self._constraint = constraint
         self._backwarded = False
         self._info = info
-        self._dependencies = {"parameter": set(), "expandable": set()}
+        self._parameter_bits = 0
+        self._parameter_dependencies = None  # computed from _parameter_bits when needed
+        self._expandable_dependencies = EMPTY_DEPENDENCIES
 
     def zero_feedback(self):  # set feedback to zero
         """Zero out the feedback of the node.
@@ -829,12 +1058,12 @@ class Node(AbstractNode[T]):
             zero_feedback should be used judiciously within the feedback propagation process to avoid unintended loss of feedback data.
             It is specifically designed to be used after feedback has been successfully propagated to parent nodes.
         """
-        self._feedback = defaultdict(list)
+        self._feedback = None
 
     @property
     def feedback(self):
         """The feedback from children nodes."""
-        return self._feedback
+        return self._feedback if self._feedback is not None else EMPTY_FEEDBACK
 
     @property
     def description(self):
@@ -855,12 +1084,18 @@ class Node(AbstractNode[T]):
     def parameter_dependencies(self):
         """The depended parameters.
 
-        Notes:
-            Ensure that the '_dependencies' attribute is properly initialized and contains a 'parameter' key
-            with a corresponding value before calling the parameter_dependencies function to avoid potential
-            KeyError exceptions.
+        Returns:
+            frozenset: The parameter nodes this node depends on.
         """
-        return self._dependencies["parameter"]
+        if self._parameter_dependencies is None:
+            self._parameter_dependencies = PARAMETER_INDEX.nodes(self._get_parameter_bits())
+        return self._parameter_dependencies
+
+    def _get_parameter_bits(self):
+        """Return the bitset of the depended parameters."""
+        if self._parameter_bits is None:  # e.g., a copy made by deepcopy or pickle
+            self._parameter_bits = PARAMETER_INDEX.bits(self._parameter_dependencies)
+        return self._parameter_bits
 
     @property
     def expandable_dependencies(self):
@@ -868,11 +1103,22 @@ class Node(AbstractNode[T]):
 
         Notes:
             Expandable nodes are those who depend on parameters not visible in the current graph level.
-            Ensure that the '_dependencies' attribute is properly initialized and contains an 'expandable' key
-            with a corresponding value before calling the expandable_dependencies function to avoid potential
-            KeyError exceptions.
         """
-        return self._dependencies["expandable"]
+        return self._expandable_dependencies
+
+    def __getstate__(self):
+        """Get the state of the node for pickling.
+
+        Notes:
+            Parameter indices are only valid within the current process, so the
+            parameter dependencies are pickled as a set of nodes.
+        """
+        state = {k: getattr(self, k) for k in _slot_names(type(self)) if hasattr(self, k)}
+        state["_parameter_dependencies"] = self.parameter_dependencies
+        state["_parameter_bits"] = None
+        if "_parameter_index" in state:
+            state["_parameter_index"] = None
+        return (getattr(self, "__dict__", None), state)
 
     def _add_feedback(self, child, feedback):
         """Add feedback from a child.
@@ -881,6 +1127,8 @@ class Node(AbstractNode[T]):
             child: The child node from which feedback is received.
             feedback: The feedback received from the child node.
         """
+        if self._feedback is None:
+            self._feedback = defaultdict(list)
         self._feedback[child].append(feedback)
 
     # This is not traced
@@ -981,6 +1229,10 @@ class Node(AbstractNode[T]):
         queue = [
             self._itemize()
         ]  # priority queue; add id() since __eq__ is overloaded to compare values.
+        # Index of the nodes that have been put in the queue, keyed by id() for
+        # the same reason. A node is popped only after all its children, so it
+        # never needs to be enqueued again once it has been visited.
+        enqueued = {id(self)}
         while True:
             try:
                 _, _, node = heapq.heappop(
@@ -1003,9 +1255,8 @@ class Node(AbstractNode[T]):
                         parent._add_feedback(node, propagated_feedback[parent])
 
                     # Put parent in the queue if it has not been visited and it's not a root
-                    if (
-                        len(parent.parents) > 0 and parent._itemize() not in queue
-                    ):  # and parent not in queue:
+                    if len(parent.parents) > 0 and id(parent) not in enqueued:
+                        enqueued.add(id(parent))
                         heapq.heappush(
                             queue, parent._itemize()
                         )  # put parent in the priority queue
@@ -1994,6 +2245,8 @@ class Node(AbstractNode[T]):
 
 class ParameterNode(Node[T]):
     # This is a shorthand of a trainable Node.
+    __slots__ = ("_parameter_index",)
+
     def __init__(
         self,
         value,
@@ -2021,7 +2274,18 @@ class ParameterNode(Node[T]):
             constraint=constraint,
             info=info,
         )
-        self._dependencies["parameter"].add(self)
+        self._parameter_index = PARAMETER_INDEX.register(self)
+        self._parameter_bits = None  # not stored, since it is a large int for large indices
+
+    def _get_parameter_index(self):
+        """Return the index of the parameter in PARAMETER_INDEX."""
+        if self._parameter_index is None:  # e.g., a copy made by deepcopy or pickle
+            self._parameter_index = PARAMETER_INDEX.register(self)
+        return self._parameter_index
+
+    def _get_parameter_bits(self):
+        """Return the bitset of the depended parameters, i.e., the parameter itself."""
+        return 1 << self._get_parameter_index()
 
     def __str__(self) -> str:
         # str(node) allows us to look up in the feedback dictionary easily
@@ -2052,6 +2316,8 @@ class MessageNode(Node[T]):
 
     # TODO document what needs to go into info
 
+    __slots__ = ("_inputs", "_hidden_dependencies", "_hidden_info", "_hidden_output")
+
     def __init__(
         self,
         value,
@@ -2073,6 +2339,9 @@ class MessageNode(Node[T]):
         if isinstance(inputs, list):
             inputs = {v.name: v for v in inputs}
         self._inputs = inputs
+        self._hidden_dependencies = None  # cache of hidden_dependencies
+        self._hidden_info = None  # the info dict when the cache is computed
+        self._hidden_output = None  # info["output"] when the cache is computed
 
         # If not tracing, MessageNode would just behave like a Node.
         if not GRAPH.TRACE:
@@ -2089,7 +2358,7 @@ class MessageNode(Node[T]):
             )  # Initializes the dependencies on parameter and expandable nodes
 
         if len(self.hidden_dependencies) > 0:
-            self._dependencies["expandable"].add(self)
+            self._expandable_dependencies = self._expandable_dependencies | {self}
 
     @property
     def inputs(self):
@@ -2110,51 +2379,119 @@ class MessageNode(Node[T]):
         ), "MessageNode should have only one feedback from each child."
 
     @property
-    def hidden_dependencies(self):  # this needs to be recursive
-        """Returns the set of hidden dependencies that are not visible in the current graph level."""
-        diff = set()
-
-        inputs, output = [None], None
-        if isinstance(self.info, dict):
-            if "inputs" in self.info:
-                inputs = list(self.info["inputs"]["args"]) + list(
-                    self.info["inputs"]["kwargs"].values()
-                )
-            if "output" in self.info:
-                output = self.info["output"]
-
-        if (
-            isinstance(self.info, dict)
-            and isinstance(output, Node)
-            and all(isinstance(i, Node) for i in inputs)
-        ):  # traceable code
-            # The inner function is traceable.
-            diff = diff | (
-                output.parameter_dependencies - self.parameter_dependencies
-            )  # add extra parameters explicitly used in the inner function
-            extra_expandable = (
-                output.expandable_dependencies - self.expandable_dependencies
+    def hidden_dependencies(self):
+        """Returns the set of hidden dependencies that are not visible in the current graph level.
+
+        Notes:
+            The result is computed once and cached. It is computed again only if
+            the info dict is replaced or the output recorded in it changes.
+        """
+        hidden_dependencies = self._cached_hidden_dependencies()
+        if hidden_dependencies is None:
+            hidden_dependencies = self._compute_hidden_dependencies()
+            self._hidden_dependencies = hidden_dependencies
+            self._hidden_info = self._info
+            self._hidden_output = self._info.get("output") if isinstance(self._info, dict) else None
+        return hidden_dependencies
+
+    def _cached_hidden_dependencies(self):
+        """Return the cached hidden dependencies if it is still valid, otherwise None."""
+        if self._hidden_dependencies is None:
+            return None
+        info = self._info
+        output = info.get("output") if isinstance(info, dict) else None
+        if info is not self._hidden_info or output is not self._hidden_output:
+            return None
+        return self._hidden_dependencies
+
+    def _traced_output(self):
+        """Return the output of the inner function if it is traceable, otherwise None."""
+        info = self._info  # not self.info, which computes the lazy values of ExceptionNode
+        if not isinstance(info, dict):
+            return None
+        inputs = [None]
+        if "inputs" in info:
+            inputs = list(info["inputs"]["args"]) + list(
+                info["inputs"]["kwargs"].values()
             )
-            for n in extra_expandable:  # add extra hidden dependencies
-                diff = diff | n.hidden_dependencies
-        return diff
+        output = info.get("output")
+        if isinstance(output, Node) and all(isinstance(i, Node) for i in inputs):
+            return output
+        return None
+
+    def _compute_hidden_dependencies(self):
+        """Compute the hidden dependencies by walking the expandable nodes iteratively.
+
+        The hidden dependencies of a node are the parameters used by its inner
+        function but not by the node itself, together with the hidden
+        dependencies of the expandable nodes in the inner function.
+        """
+        bits = 0  # bitset of the hidden parameters
+        hidden = set()  # hidden parameters found in the cache of nested nodes
+        visited = set()
+        stack = [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            if id(node) in visited:
+                continue
+            visited.add(id(node))
+            if node is not self:
+                cached = node._cached_hidden_dependencies()
+                if cached is not None:
+                    hidden.update(cached)
+                    continue
+            output = node._traced_output()
+            if output is None:
+                continue
+            # add extra parameters explicitly used in the inner function
+            bits |= output._get_parameter_bits() & ~node._get_parameter_bits()
+            # add the hidden dependencies of extra expandable nodes
+            stack.extend(output.expandable_dependencies - node.expandable_dependencies)
+        if len(hidden) == 0:
+            return PARAMETER_INDEX.nodes(bits)
+        return frozenset(hidden).union(PARAMETER_INDEX.nodes(bits))
 
     def _add_dependencies(self, parent):
         assert parent is not self, "Cannot add self as a parent."
         assert isinstance(
             parent, Node
         ), f"{parent} is {type(parent)}, which is not a Node."
-        self._dependencies["parameter"] = (
-            self._dependencies["parameter"] | parent._dependencies["parameter"]
-        )
-        self._dependencies["expandable"] = (
-            self._dependencies["expandable"] | parent._dependencies["expandable"]
+        self._parameter_bits = self._parameter_bits | parent._get_parameter_bits()
+        self._expandable_dependencies = _union(
+            self._expandable_dependencies, parent._expandable_dependencies
         )
 
 
+def _union(a: frozenset, b: frozenset) -> frozenset:
+    """Union of two dependency sets, which reuses one of them when possible."""
+    if len(b) == 0 or a is b:
+        return a
+    if len(a) == 0:
+        return b
+    return a | b
+
+
+class LazyInfo:
+    """A value of the info dict of an ExceptionNode which is computed on first access of `ExceptionNode.info`.
+
+    This is used for the values which are expensive to construct and often not read (e.g., the
+    error comment of an exception).
+    """
+
+    __slots__ = ("_compute",)
+
+    def __init__(self, compute: Callable[[], Any]):
+        self._compute = compute
+
+    def __call__(self):
+        return self._compute()
+
+
 class ExceptionNode(MessageNode[T]):
     """Node containing the exception message."""
 
+    __slots__ = ()
+
     def __init__(
         self,
         value: Exception,
@@ -2178,11 +2515,21 @@ class ExceptionNode(MessageNode[T]):
             info=info,
         )
 
+    @property
+    def info(self):
+        """Additional information about the node. The LazyInfo values are computed on first access."""
+        info = self._info
+        if isinstance(info, dict):
+            for key, value in info.items():
+                if isinstance(value, LazyInfo):
+                    info[key] = value()
+        return info
+
     def create_feedback(self, style="simple"):
         assert style in ("simple", "full")
         feedback = self._data
         if style == "full":
-            if type(self.info) is dict and self.info.get("error_comment") is not None:
+            if isinstance(self.info, dict) and self.info.get("error_comment") is not None:
                 feedback = self.info["error_comment"]
         return feedback
 
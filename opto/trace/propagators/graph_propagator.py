@@ -1,4 +1,3 @@
-from dataclasses import dataclass
 from typing import Any, List, Dict, Tuple
 from opto.trace.nodes import (
     Node,
@@ -9,47 +8,90 @@ from opto.trace.nodes import (
     NodeVizStyleGuideColorful,
 )
 from opto.trace.propagators.propagators import Propagator, AbstractFeedback
-import heapq
+from collections import defaultdict
 from opto.trace.utils import sum_feedback, contain
 
 
-@dataclass
 class TraceGraph(AbstractFeedback):
-    """Feedback container used by GraphPropagator."""
-
-    graph: List[
-        Tuple[int, Node]
-    ]  # a priority queue of nodes in the subgraph, ordered from roots to leaves
-    user_feedback: Any
+    """Feedback container used by GraphPropagator.
+
+    Adding TraceGraphs does not copy their nodes. The sum keeps references to
+    the summands, and the nodes are collected (deduplicated by identity and
+    ordered by level) the first time `graph` is read. This makes propagating
+    TraceGraphs through a large graph linear in the size of the graph.
+
+    Attributes:
+        graph (List[Tuple[int, Node]]): the nodes in the subgraph as (level, node), ordered from roots to leaves.
+        user_feedback (Any): the user feedback at the leaf of the subgraph.
+    """
+
+    def __init__(self, graph: List[Tuple[int, Node]] = None, user_feedback: Any = None):
+        self.graph = [] if graph is None else graph
+        self.user_feedback = user_feedback
+
+    @property
+    def graph(self):
+        if self._graph is None:
+            self._graph = self._collect()
+            self._parts = ()  # the summands are no longer needed
+        return self._graph
+
+    @graph.setter
+    def graph(self, graph):
+        self._graph = list(graph)
+        self._parts = ()
+        self._has_nodes = len(self._graph) > 0
 
     def empty(self):
-        return len(self.graph) == 0 and self.user_feedback is None
+        return not self._has_nodes and self.user_feedback is None
 
-    def __add__(self, other):
-        if self.empty() and other.empty():
+    @classmethod
+    def _merge(cls, graphs: List["TraceGraph"]):
+        """Return the union of TraceGraphs without copying their nodes."""
+        graphs = [g for g in graphs if not g.empty()]
+        if len(graphs) == 0:
             return TraceGraph(graph=[], user_feedback=None)
         # If one of them is not empty, one must contain the user feedback
-        assert not (
-            self.user_feedback is None and other.user_feedback is None
-        ), "One of the user feedback should not be None."
-        if self.user_feedback is None or other.user_feedback is None:
-            user_feedback = (
-                self.user_feedback
-                if other.user_feedback is None
-                else other.user_feedback
-            )
-        else:  # both are not None
-            assert (
-                self.user_feedback == other.user_feedback
-            ), "user feedback should be the same for all children"
-            user_feedback = self.user_feedback
-
-        other_names = [id(n[1]) for n in other.graph]
-        complement = [
-            x for x in self.graph if id(x[1]) not in other_names
-        ]  # `in` uses __eq__ which checks the value not the identity  # TODO
-        graph = [x for x in heapq.merge(complement, other.graph, key=lambda x: x[0])]
-        return TraceGraph(graph=graph, user_feedback=user_feedback)
+        user_feedbacks = [g.user_feedback for g in graphs if g.user_feedback is not None]
+        assert len(user_feedbacks) > 0, "One of the user feedback should not be None."
+        user_feedback = user_feedbacks[0]
+        assert all(
+            f == user_feedback for f in user_feedbacks
+        ), "user feedback should be the same for all children"
+        if len(graphs) == 1:
+            return graphs[0]
+        merged = TraceGraph(graph=[], user_feedback=user_feedback)
+        merged._graph = None  # to be collected from the parts when needed
+        merged._parts = tuple(graphs)
+        merged._has_nodes = any(g._has_nodes for g in graphs)
+        return merged
+
+    def _collect(self):
+        """Collect the nodes of all the summands, ordered by level."""
+        nodes = {}  # id(node) -> (level, node); `in` uses __eq__ which checks the value not the identity
+        visited = set()  # id of the TraceGraphs visited
+        stack = [self]
+        while len(stack) > 0:
+            g = stack.pop()
+            if id(g) in visited:
+                continue
+            visited.add(id(g))
+            if g._graph is not None:
+                for x in g._graph:
+                    if id(x[1]) not in nodes:
+                        nodes[id(x[1])] = x
+            else:
+                stack.extend(reversed(g._parts))  # visit the summands in order
+        levels = defaultdict(list)
+        for x in nodes.values():
+            levels[x[0]].append(x)
+        return [x for level in sorted(levels) for x in levels[level]]
+
+    def __add__(self, other):
+        return self._merge([self, other])
+
+    def __repr__(self):
+        return f"TraceGraph(graph={self.graph}, user_feedback={self.user_feedback})"
 
     @classmethod
     def expand(cls, node: MessageNode):
@@ -146,8 +188,4 @@ class GraphPropagator(Propagator):
         """Aggregate feedback from multiple children"""
         assert all(len(v) == 1 for v in feedback.values())
         assert all(isinstance(v[0], TraceGraph) for v in feedback.values())
-        values = [sum(v) for v in feedback.values()]
-        if len(values) == 0:
-            return TraceGraph(graph=[], user_feedback=None)
-        else:
-            return sum(values)
+        return TraceGraph._merge([v[0] for v in feedback.values()])
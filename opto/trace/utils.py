@@ -1,4 +1,3 @@
-from graphviz import Digraph
 import builtins
 import re
 import json
@@ -18,7 +17,7 @@ def sum_feedback(nodes):
 
 def contain(container_of_nodes, node):
     # check for identity instead of value
-    return any([node is n for n in container_of_nodes])
+    return any(node is n for n in container_of_nodes)
 
 
 def parse_eqs_to_dict(text):
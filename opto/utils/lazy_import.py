@@ -0,0 +1,35 @@
+import importlib
+import threading
+
+
+class LazyModule:
+    """A proxy of a module which imports the module on first attribute access.
+
+    This is used for heavy optional dependencies (e.g., litellm, openai, autogen),
+    so that importing Trace does not pay for backends which are never used.
+
+    Examples:
+        >>> litellm = LazyModule("litellm")  # nothing is imported yet
+        >>> litellm.completion(...)  # litellm is imported here
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            module = self._load()
+        return getattr(module, attr)
+
+    def __repr__(self):
+        status = "imported" if self._module is not None else "not imported"
+        return f"<LazyModule '{self._name}' ({status})>"
@@ -1,36 +1,77 @@
 from typing import List, Tuple, Dict, Any, Callable, Union
+import asyncio
 import os
 import time
 import json
-import litellm
-import os
-import openai
 import warnings
+import weakref
+from opto.utils.lazy_import import LazyModule
+from opto.utils.llm_cache import ResponseCache, make_cache, is_cacheable, cache_key
+from opto.utils.llm_scheduler import LLMScheduler, estimate_tokens, used_tokens
+from opto.utils.llm_retry import RetryPolicy, make_retry_policy, on_abandon
+
+# The backends are imported on first use, since importing them is slow.
+litellm = LazyModule("litellm")
+openai = LazyModule("openai")
+autogen = LazyModule("autogen")  # autogen is optional; it is only needed by AutoGenLLM
 
-try:
-    import autogen  # We import autogen here to avoid the need of installing autogen
-except ImportError:
-    pass
+# The optional features of the backends (see AbstractModel.supports).
+CAPABILITIES = ("json_mode", "structured_outputs", "n", "streaming", "async")
+MODEL_CAPABILITIES = {}  # (backend class, base_url, model name) -> {capability: whether it is supported}, shared by the instances of a model
 
 
 class AbstractModel:
     """
     A minimal abstraction of a model api that refreshes the model every
     reset_freq seconds (this is useful for long-running models that may require
-    refreshing certificates or memory management).
+    refreshing certificates or memory management). The responses can be cached,
+    so that identical requests (e.g., when re-running an optimization) are not
+    sent to the backend again.
+
+    The model can also be called asynchronously with `acall`, so that many
+    requests can be issued concurrently from one event loop. A scheduler can
+    be given to keep the requests within the rate limits of the provider, and
+    a retry policy to retry, time out and hedge the requests.
+
+    The optional features of the backend (e.g., the JSON mode) are given by
+    `supports`, so that callers can shape their requests without trial and error.
     """
 
-    def __init__(self, factory: Callable, reset_freq: Union[int, None] = None) -> None:
+    def __init__(self, factory: Callable, reset_freq: Union[int, None] = None,
+                 cache: Union[bool, str, ResponseCache, None] = None, cache_sampled: bool = False,
+                 async_factory: Union[Callable, None] = None, scheduler: Union[LLMScheduler, None] = None,
+                 retry: Union[bool, RetryPolicy, None] = None) -> None:
         """
         Args:
             factory: A function that takes no arguments and returns a model that is callable.
             reset_freq: The number of seconds after which the model should be
                 refreshed. If None, the model is never refreshed.
+            cache: The cache of the responses. False or None for no cache; True for an in-memory
+                LRU cache; a path for an in-memory LRU cache in front of a SQLite cache stored at
+                the path; or a ResponseCache (see opto.utils.llm_cache).
+            cache_sampled: If False, the responses of sampled requests (temperature > 0, n > 1, or
+                no temperature given) are cached only if a seed is given.
+            async_factory: A function that takes no arguments and returns the async client of the
+                model (see `async_model`). An async client is created for each event loop and shared
+                by the requests made in the loop. If None, `acall` calls the model in a thread.
+            scheduler: The LLMScheduler (see opto.utils.llm_scheduler) which the requests to the model
+                wait for. It can be shared by several models. If None, the requests are sent immediately.
+                Cached responses do not wait.
+            retry: The RetryPolicy (see opto.utils.llm_retry) of the requests. True for the default
+                policy, which retries transient errors 3 times with exponential backoff. False or None
+                for no retries. Each attempt waits for the scheduler.
         """
         self.factory = factory
         self._model = self.factory()
         self.reset_freq = reset_freq
         self._init_time = time.time()
+        self.response_cache = make_cache(cache)
+        self.cache_sampled = cache_sampled
+        self.async_factory = async_factory
+        self._async_models = weakref.WeakKeyDictionary()  # event loop -> async client
+        self.scheduler = scheduler
+        self.retry = make_retry_policy(retry)
+        self._instance_capabilities = {}  # used if the model has no name
 
     # Overwrite this `model` property when subclassing.
     @property
@@ -38,28 +79,164 @@ class AbstractModel:
         """ When self.model is called, text responses should always be available at ['choices'][0].['message']['content'] """
         return self._model
 
+    # Overwrite this `async_model` property when subclassing, if the backend has an async client.
+    @property
+    def async_model(self):
+        """ The async version of self.model, which returns awaitables. If None, self.model is called in a thread. """
+        if self.async_factory is None:
+            return None
+        return self._async_model
+
+    @property
+    def _async_model(self):
+        """ The async client of the running event loop. """
+        loop = asyncio.get_running_loop()
+        model = self._async_models.get(loop)
+        if model is None:
+            model = self._async_models[loop] = self.async_factory()
+        return model
+
+    def supports(self, capability: str) -> Union[bool, None]:
+        """ Whether the model supports a capability, or None if it is unknown.
+
+        The capabilities (see CAPABILITIES) are the JSON mode (`response_format={"type": "json_object"}`),
+        structured outputs (`response_format` with a JSON schema), sampling several responses (`n` > 1),
+        streaming (`stream=True`), and native async calls (`acall` without threads). They are probed
+        from the backend (see `_probe_capability`) or remembered with `set_supports`, and are shared by
+        the models of the same class with the same base_url (if any) and model_name.
+        """
+        if capability not in CAPABILITIES:
+            raise ValueError(f"Unknown capability {capability!r}. Choose from {CAPABILITIES}.")
+        capabilities = self._capabilities()
+        if capability not in capabilities:
+            supported = self._probe_capability(capability)
+            if supported is None:
+                return None
+            capabilities[capability] = supported
+        return capabilities[capability]
+
+    def set_supports(self, capability: str, supported: bool) -> None:
+        """ Remember whether the model supports a capability (e.g., after a request using it fails). """
+        if capability not in CAPABILITIES:
+            raise ValueError(f"Unknown capability {capability!r}. Choose from {CAPABILITIES}.")
+        self._capabilities()[capability] = supported
+
+    def _capabilities(self) -> Dict[str, bool]:
+        model_name = getattr(self, "model_name", None)
+        if model_name is None:
+            return self._instance_capabilities
+        # The same model name may be served by different backends and servers.
+        key = (type(self), getattr(self, "base_url", None), model_name)
+        return MODEL_CAPABILITIES.setdefault(key, {})
+
+    # Overwrite this method when subclassing, if the backend can tell its capabilities.
+    def _probe_capability(self, capability: str) -> Union[bool, None]:
+        """ Return whether the backend supports a capability without sending requests, or None if it is unknown. """
+        if capability == "async":
+            return self.async_factory is not None
+        return None
+
     # This is the main API
     def __call__(self, *args, **kwargs) -> Any:
-        """ The call function handles refreshing the model if needed. """
+        """ The call function handles refreshing the model if needed and caching the responses. """
+        key = self._cache_key(args, kwargs)
+        if key is None:
+            return self._call_model(*args, **kwargs)
+        response = self.response_cache.get(key)
+        if response is None:
+            response = self._call_model(*args, **kwargs)
+            self.response_cache.set(key, response)
+        return response
+
+    async def acall(self, *args, **kwargs) -> Any:
+        """ The async version of __call__. """
+        key = self._cache_key(args, kwargs)
+        if key is None:
+            return await self._acall_model(*args, **kwargs)
+        response = self.response_cache.get(key)
+        if response is None:
+            response = await self._acall_model(*args, **kwargs)
+            self.response_cache.set(key, response)
+        return response
+
+    def _cache_key(self, args, kwargs) -> Union[str, None]:
+        """ Return the key of the request in the response cache, or None if the response should not be cached. """
+        if self.response_cache is None or not is_cacheable(kwargs, self.cache_sampled):
+            return None
+        backend = f"{type(self).__module__}.{type(self).__qualname__}"
+        return cache_key(getattr(self, "model_name", None), args, kwargs, backend, getattr(self, "base_url", None))
+
+    def _refresh(self) -> None:
         if self.reset_freq is not None and time.time() - self._init_time > self.reset_freq:
             self._model = self.factory()
+            self._async_models.clear()
             self._init_time = time.time()
-        return self.model(*args, **kwargs)
+
+    def _call_model(self, *args, **kwargs) -> Any:
+        self._refresh()
+        if self.retry is None:
+            return self._attempt(*args, **kwargs)
+        return self.retry.call(lambda: self._attempt(*args, **kwargs))
+
+    async def _acall_model(self, *args, **kwargs) -> Any:
+        self._refresh()
+        if self.retry is None:
+            return await self._aattempt(*args, **kwargs)
+        return await self.retry.acall(lambda: self._aattempt(*args, **kwargs))
+
+    def _attempt(self, *args, **kwargs) -> Any:
+        """ Send a request to the model, after waiting for the scheduler. """
+        if self.scheduler is None:
+            return self.model(*args, **kwargs)
+        slot = self.scheduler.acquire(estimate_tokens(kwargs))
+        # An attempt abandoned by the retry policy keeps running in its thread, so it gives its slot back.
+        if not on_abandon(lambda: self.scheduler.release(slot)):  # abandoned while it waited for the slot
+            self.scheduler.release(slot)
+            raise TimeoutError("The LLM request was abandoned.")
+        response = None
+        try:
+            response = self.model(*args, **kwargs)
+        finally:
+            self.scheduler.release(slot, used_tokens(response))
+        return response
+
+    async def _aattempt(self, *args, **kwargs) -> Any:
+        """ The async version of _attempt. """
+        async_model = self.async_model
+        if self.scheduler is not None:
+            slot = await self.scheduler.aacquire(estimate_tokens(kwargs))
+        response = None
+        try:
+            if async_model is None:
+                response = await asyncio.to_thread(self.model, *args, **kwargs)
+            else:
+                response = await async_model(*args, **kwargs)
+        finally:
+            if self.scheduler is not None:
+                self.scheduler.release(slot, used_tokens(response))
+        return response
 
     def __getstate__(self):
         state = self.__dict__.copy()
         state["_model"] = None
+        state["_async_models"] = None
         return state
 
     def __setstate__(self, state):
         self.__dict__.update(state)
         self._model = self.factory()
+        self._async_models = weakref.WeakKeyDictionary()
 
 
 class AutoGenLLM(AbstractModel):
-    """ This is the main class Trace uses to interact with the model. It is a wrapper around autogen's OpenAIWrapper. For using models not supported by autogen, subclass AutoGenLLM and override the `_factory` and  `create` method. Users can pass instances of this class to optimizers' llm argument. """
+    """ This is the main class Trace uses to interact with the model. It is a wrapper around autogen's OpenAIWrapper. For using models not supported by autogen, subclass AutoGenLLM and override the `_factory` and  `create` method. Users can pass instances of this class to optimizers' llm argument.
 
-    def __init__(self, config_list: List = None, filter_dict: Dict = None, reset_freq: Union[int, None] = None) -> None:
+    OpenAIWrapper has no async API, so `acall` and `acreate` run `create` in a thread. The
+    clients of OpenAIWrapper retry the requests themselves, so `retry` is off by default.
+    """
+
+    def __init__(self, config_list: List = None, filter_dict: Dict = None, reset_freq: Union[int, None] = None,
+                 scheduler: Union[LLMScheduler, None] = None, retry: Union[bool, RetryPolicy, None] = False) -> None:
         if config_list is None:
             try:
                 config_list = autogen.config_list_from_json("OAI_CONFIG_LIST")
@@ -72,7 +249,7 @@ class AutoGenLLM(AbstractModel):
             config_list = autogen.filter_config(config_list, filter_dict)
 
         factory = lambda *args, **kwargs: self._factory(config_list)
-        super().__init__(factory, reset_freq)
+        super().__init__(factory, reset_freq, scheduler=scheduler, retry=retry)
 
     @classmethod
     def _factory(cls, config_list):
@@ -122,6 +299,10 @@ class AutoGenLLM(AbstractModel):
         """
         return self._model.create(**config)
 
+    async def acreate(self, **config: Any):
+        """The async version of `create`."""
+        return await asyncio.to_thread(self.create, **config)
+
 
 def auto_construct_oai_config_list_from_env() -> List:
     """
@@ -157,10 +338,14 @@ class LiteLLM(AbstractModel):
     default model name through the environment variable TRACE_LITELLM_MODEL.
     When using Azure models via token provider, you can set the Azure token
     provider scope through the environment variable AZURE_TOKEN_PROVIDER_SCOPE.
+
+    `acall` uses litellm.acompletion, which shares the connections of LiteLLM's
+    async HTTP client.
     """
 
     def __init__(self, model: Union[str, None] = None, reset_freq: Union[int, None] = None,
-                 cache=True) -> None:
+                 cache=None, cache_sampled: bool = False, scheduler: Union[LLMScheduler, None] = None,
+                 retry: Union[bool, RetryPolicy, None] = None) -> None:
         if model is None:
             model = os.environ.get('TRACE_LITELLM_MODEL')
             if model is None:
@@ -170,18 +355,39 @@ class LiteLLM(AbstractModel):
         self.model_name = model
         self.cache = cache
         factory = lambda: self._factory(self.model_name)  # an LLM instance uses a fixed model
-        super().__init__(factory, reset_freq)
+        async_factory = lambda: self._factory(self.model_name, asynchronous=True)
+        super().__init__(factory, reset_freq, cache=cache, cache_sampled=cache_sampled,
+                         async_factory=async_factory, scheduler=scheduler, retry=retry)
 
     @classmethod
-    def _factory(cls, model_name: str):
+    def _factory(cls, model_name: str, asynchronous: bool = False):
+        options = {}
         if model_name.startswith('azure/'):  # azure model
             azure_token_provider_scope = os.environ.get('AZURE_TOKEN_PROVIDER_SCOPE', None)
             if azure_token_provider_scope is not None:
                 from azure.identity import DefaultAzureCredential, get_bearer_token_provider
                 credential = get_bearer_token_provider(DefaultAzureCredential(), azure_token_provider_scope)
-                return lambda *args, **kwargs: litellm.completion(model_name, *args,
-                                                                  azure_ad_token_provider=credential, **kwargs)
-        return lambda *args, **kwargs: litellm.completion(model_name, *args, **kwargs)
+                options['azure_ad_token_provider'] = credential
+
+        def completion(*args, **kwargs):
+            complete = litellm.acompletion if asynchronous else litellm.completion
+            return complete(model_name, *args, **options, **kwargs)
+
+        return completion
+
+    def _probe_capability(self, capability: str) -> Union[bool, None]:
+        if capability == "async":
+            return super()._probe_capability(capability)
+        try:
+            params = litellm.get_supported_openai_params(model=self.model_name)
+            if params is None:  # the model is unknown to LiteLLM
+                return None
+            if capability == "structured_outputs":
+                return bool(litellm.supports_response_schema(model=self.model_name))
+        except Exception:
+            return None
+        param = {"json_mode": "response_format", "n": "n", "streaming": "stream"}[capability]
+        return param in params
 
     @property
     def model(self):
@@ -198,47 +404,71 @@ class CustomLLM(AbstractModel):
     """
     This is for Custom server's API endpoints that are OpenAI Compatible.
     Such server includes LiteLLM proxy server.
+
+    `acall` uses openai.AsyncOpenAI. The async client (and its connection pool)
+    of an event loop is shared by all the requests made in the loop.
+
+    Without a retry policy, the openai clients retry the requests themselves.
+    With one, their own retries are turned off.
     """
 
     def __init__(self, model: Union[str, None] = None, reset_freq: Union[int, None] = None,
-                 cache=True) -> None:
+                 cache=None, cache_sampled: bool = False, scheduler: Union[LLMScheduler, None] = None,
+                 retry: Union[bool, RetryPolicy, None] = None) -> None:
         if model is None:
             model = os.environ.get('TRACE_CUSTOMLLM_MODEL', 'gpt-4o')
-            base_url = os.environ.get('TRACE_CUSTOMLLM_URL', 'http://xx.xx.xxx.xx:4000')
-            server_api_key = os.environ.get('TRACE_CUSTOMLLM_API_KEY',
-                                            'sk-Xhg...')  # we assume the server has an API key
-            # the server API is set through `master_key` in `config.yaml` for LiteLLM proxy server
+        base_url = os.environ.get('TRACE_CUSTOMLLM_URL', 'http://xx.xx.xxx.xx:4000')
+        server_api_key = os.environ.get('TRACE_CUSTOMLLM_API_KEY',
+                                        'sk-Xhg...')  # we assume the server has an API key
+        # the server API is set through `master_key` in `config.yaml` for LiteLLM proxy server
 
         self.model_name = model
+        self.base_url = base_url
         self.cache = cache
-        factory = lambda: self._factory(base_url, server_api_key)  # an LLM instance uses a fixed model
-        super().__init__(factory, reset_freq)
+        retry = make_retry_policy(retry)
+        client_retries = retry is None  # otherwise, the requests are retried by AbstractModel
+        factory = lambda: self._factory(base_url, server_api_key, client_retries)  # an LLM instance uses a fixed model
+        async_factory = lambda: self._async_factory(base_url, server_api_key, client_retries)
+        super().__init__(factory, reset_freq, cache=cache, cache_sampled=cache_sampled,
+                         async_factory=async_factory, scheduler=scheduler, retry=retry)
 
     @classmethod
-    def _factory(cls, base_url: str, server_api_key: str) -> openai.OpenAI:
-        return openai.OpenAI(base_url=base_url, api_key=server_api_key)
+    def _factory(cls, base_url: str, server_api_key: str, client_retries: bool = True) -> "openai.OpenAI":
+        options = {} if client_retries else {"max_retries": 0}
+        return openai.OpenAI(base_url=base_url, api_key=server_api_key, **options)
+
+    @classmethod
+    def _async_factory(cls, base_url: str, server_api_key: str, client_retries: bool = True) -> "openai.AsyncOpenAI":
+        options = {} if client_retries else {"max_retries": 0}
+        return openai.AsyncOpenAI(base_url=base_url, api_key=server_api_key, **options)
 
     @property
     def model(self):
         return lambda *args, **kwargs: self.create(*args, **kwargs)
         # return lambda *args, **kwargs: self._model.chat.completions.create(*args, **kwargs)
 
+    @property
+    def async_model(self):
+        return lambda *args, **kwargs: self.acreate(*args, **kwargs)
+
     def create(self, **config: Any):
         if 'model' not in config:
             config['model'] = self.model_name
         return self._model.chat.completions.create(**config)
 
+    async def acreate(self, **config: Any):
+        if 'model' not in config:
+            config['model'] = self.model_name
+        return await self._async_model.chat.completions.create(**config)
+
 
 
 TRACE_DEFAULT_LLM_BACKEND = os.getenv('TRACE_DEFAULT_LLM_BACKEND', 'LiteLLM')
 if TRACE_DEFAULT_LLM_BACKEND == 'AutoGen':
-    print("Using AutoGen as the default LLM backend.")
     LLM = AutoGenLLM
 elif TRACE_DEFAULT_LLM_BACKEND == 'CustomLLM':
-    print("Using CustomLLM as the default LLM backend.")
     LLM = CustomLLM
 elif TRACE_DEFAULT_LLM_BACKEND == 'LiteLLM':
-    print("Using LiteLLM as the default LLM backend.")
     LLM = LiteLLM
 else:
     raise ValueError(f"Unknown LLM backend: {TRACE_DEFAULT_LLM_BACKEND}")
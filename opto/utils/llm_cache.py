@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Union
+
+
+class ResponseCache:
+    """A cache of LLM responses, keyed by the hash of the request (see `cache_key`).
+
+    Subclass this to implement other storages. A response is never None, so `get` returns None for a miss.
+    """
+
+    def get(self, key: str) -> Any:
+        """Return the cached response of key, or None if it is not cached or has expired."""
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any) -> None:
+        """Cache the response value of key."""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """Remove all the cached responses."""
+        raise NotImplementedError
+
+
+class LRUCache(ResponseCache):
+    """An in-memory cache which keeps the maxsize most recently used responses.
+
+    Args:
+        maxsize (int): the maximum number of responses kept.
+        ttl (float, optional): the number of seconds after which a response expires. If None, responses do not expire.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (time of creation, response)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created, value = entry
+            if self.ttl is not None and time.time() - created > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class SQLiteCache(ResponseCache):
+    """An on-disk cache stored in a SQLite database, which can be shared by concurrent threads and processes.
+
+    Responses are pickled. The database is used in WAL mode, and each thread (of each process) uses its own
+    connection, so that readers do not block the writer.
+
+    Args:
+        path (str): the path of the database file. The directory is created if it does not exist.
+        max_entries (int, optional): the maximum number of responses kept; the least recently used ones are removed.
+            If None, the number is not limited.
+        ttl (float, optional): the number of seconds after which a response expires. If None, responses do not expire.
+        timeout (float): the number of seconds to wait for a lock held by another connection.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, os.PathLike],
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        timeout: float = 30.0,
+    ):
+        self.path = os.fspath(path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.timeout = timeout
+        directory = os.path.dirname(self.path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, value BLOB, created REAL, accessed REAL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+
+    def _connection(self):
+        """Return the connection of the current thread and process."""
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():  # connections cannot be shared with forked processes
+            local.connection = sqlite3.connect(self.path, timeout=self.timeout)
+            local.connection.execute("PRAGMA journal_mode=WAL")
+            local.pid = os.getpid()
+        return local.connection
+
+    def get(self, key):
+        connection = self._connection()
+        row = connection.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, created = row
+        now = time.time()
+        with connection:
+            if self.ttl is not None and now - created > self.ttl:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return pickle.loads(value)
+
+    def set(self, key, value):
+        now = time.time()
+        value = pickle.dumps(value)
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            if self.ttl is not None:
+                connection.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            if self.max_entries is not None:
+                connection.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def clear(self):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM responses")
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+
+class TieredCache(ResponseCache):
+    """A cache which looks up the caches in order (e.g., in memory and then on disk).
+
+    A response found in a later cache is copied to the earlier ones, and new responses are stored in all the caches.
+    """
+
+    def __init__(self, *caches: ResponseCache):
+        self.caches = caches
+
+    def get(self, key):
+        for i, cache in enumerate(self.caches):
+            value = cache.get(key)
+            if value is not None:
+                for earlier_cache in self.caches[:i]:
+                    earlier_cache.set(key, value)
+                return value
+        return None
+
+    def set(self, key, value):
+        for cache in self.caches:
+            cache.set(key, value)
+
+    def clear(self):
+        for cache in self.caches:
+            cache.clear()
+
+
+def make_cache(cache: Union[bool, str, os.PathLike, ResponseCache, None]) -> Optional[ResponseCache]:
+    """Return the ResponseCache specified by the cache argument of the LLM classes.
+
+    Args:
+        cache: False or None for no cache; True for an in-memory LRUCache; a path for an in-memory LRUCache
+            in front of a SQLiteCache stored at the path; or a ResponseCache.
+    """
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        return LRUCache()
+    if isinstance(cache, (str, os.PathLike)):
+        return TieredCache(LRUCache(), SQLiteCache(cache))
+    if isinstance(cache, ResponseCache):
+        return cache
+    raise TypeError(f"Unknown cache {cache!r}.")
+
+
+def is_cacheable(kwargs: dict, cache_sampled: bool = False) -> bool:
+    """Whether the response of a request with the keyword arguments kwargs can be cached.
+
+    The responses of sampled requests (temperature > 0 or n > 1) vary between calls, so they are cached
+    only when a seed is given or cache_sampled is True. Requests which do not set the temperature are
+    sampled with the default temperature of the provider (usually 1), so they are treated as sampled.
+    Streamed responses are not cached.
+    """
+    if kwargs.get("stream"):
+        return False  # the response is an iterator
+    if cache_sampled or kwargs.get("seed") is not None:
+        return True
+    return kwargs.get("temperature") == 0 and kwargs.get("n") in (None, 1)
+
+
+def cache_key(
+    model: Optional[str], args: tuple, kwargs: dict, backend: Optional[str] = None, base_url: Optional[str] = None
+) -> Optional[str]:
+    """Return the hash of a request to the model with the arguments args and kwargs (e.g., messages and sampling parameters).
+
+    The same model name may be served by different backends (e.g., the qualified name of the LLM class)
+    and servers (base_url), which are part of the key. Requests with arguments which are not JSON
+    serializable (e.g., client objects) have no stable key, so None is returned and they are not cached.
+    """
+    try:
+        request = json.dumps(
+            {"backend": backend, "base_url": base_url, "model": model, "args": args, "kwargs": kwargs},
+            sort_keys=True,
+        )
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(request.encode("utf-8")).hexdigest()
@@ -0,0 +1,378 @@
+import asyncio
+import collections
+import contextvars
+import math
+import queue
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+# The errors of the LLM clients (openai, litellm) which are transient, matched by name to avoid importing them.
+RETRYABLE_ERROR_NAMES = {
+    "APIConnectionError",
+    "APITimeoutError",
+    "InternalServerError",
+    "RateLimitError",
+    "ServiceUnavailableError",
+    "Timeout",
+}
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+_ATTEMPT = contextvars.ContextVar("_ATTEMPT", default=None)  # The attempt run by RetryPolicy._race in the current thread
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    """Return the HTTP status code of the error of an LLM client, or None if it has none."""
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a request which raises error may succeed if it is sent again (e.g., rate limits,
+    timeouts, connection errors and server errors). Invalid requests are not retryable."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    code = status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES or code >= 500
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Return the number of seconds to wait given by the Retry-After header of the error, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is None:
+        return None
+    try:
+        return max(0.0, float(headers.get("retry-after")))
+    except (TypeError, ValueError):  # the header is missing or is a date
+        return None
+
+
+class RetryPolicy:
+    """How an LLM request is retried, timed out and hedged (see AbstractModel).
+
+    A request is sent again when it raises a retryable error (see `is_retryable`), after an exponential
+    backoff with full jitter (at least the Retry-After of the error). An attempt which runs longer than
+    timeout is abandoned and retried, and no retry starts after the deadline of the request.
+
+    If hedge_percentile is given, a duplicate of an attempt is sent when the attempt runs longer than
+    this percentile of the latencies of the recent requests, and the first response is returned. This
+    cuts the tail latency at the cost of a few more requests.
+
+    Attempts which may be abandoned (timeout or hedging) of sync calls run in daemon threads, which
+    finish in the background; they are told when they are abandoned (see `on_abandon`), e.g., to
+    release their slot of a scheduler. Abandoned async attempts are cancelled.
+
+    Args:
+        max_retries (int): the maximum number of retries of a request.
+        backoff (float): the maximum delay in seconds before the first retry; it doubles for each retry.
+        max_backoff (float): the maximum delay in seconds before a retry.
+        timeout (float, optional): the number of seconds after which an attempt is abandoned.
+        deadline (float, optional): the number of seconds after which a request is not retried.
+        hedge_percentile (float, optional): the percentile (e.g., 95) of the latency after which a
+            duplicate request is sent. If None, requests are not hedged.
+        max_hedges (int): the maximum number of duplicates of an attempt.
+        min_samples (int): the number of latencies recorded before requests are hedged.
+        retryable (callable, optional): a function of an exception returning whether to retry. If None,
+            `is_retryable` is used.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        hedge_percentile: Optional[float] = None,
+        max_hedges: int = 1,
+        min_samples: int = 20,
+        retryable: Optional[Callable[[BaseException], bool]] = None,
+    ):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.max_hedges = max_hedges
+        self.min_samples = min_samples
+        self.retryable = retryable if retryable is not None else is_retryable
+        self._latencies = collections.deque(maxlen=200)  # the latencies of the recent successful attempts
+        self._counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def call(self, attempt: Callable[[], Any]) -> Any:
+        """Return attempt(), retrying, timing out and hedging it according to the policy."""
+        start = time.monotonic()
+        self._count("requests")
+        retry = 0
+        while True:
+            timeout = self._attempt_timeout(start)
+            try:
+                if timeout is None and self.hedge_percentile is None:
+                    return self._timed(attempt)
+                return self._race(attempt, timeout)
+            except Exception as e:
+                delay = self._retry_delay(e, retry, start)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            retry += 1
+
+    async def acall(self, attempt: Callable[[], Awaitable]) -> Any:
+        """The async version of `call`, where attempt returns an awaitable."""
+        start = time.monotonic()
+        self._count("requests")
+        retry = 0
+        while True:
+            timeout = self._attempt_timeout(start)
+            try:
+                if timeout is None and self.hedge_percentile is None:
+                    return await self._atimed(attempt)
+                return await self._arace(attempt, timeout)
+            except Exception as e:
+                delay = self._retry_delay(e, retry, start)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            retry += 1
+
+    def metrics(self) -> dict:
+        """Return the numbers of requests, attempts, retries, timeouts, hedges, hedges which returned
+        first (hedge_wins) and failed requests, the retries by error type (retries_by_error), and the
+        50th and 95th percentiles of the recent latencies in seconds (None if no latency is recorded)."""
+        with self._lock:
+            metrics = {
+                name: self._counts[name]
+                for name in ["requests", "attempts", "retries", "timeouts", "hedges", "hedge_wins", "failures"]
+            }
+            metrics["retries_by_error"] = {
+                name[len("retries:"):]: n for name, n in self._counts.items() if name.startswith("retries:")
+            }
+            latencies = sorted(self._latencies)
+        metrics["latency_p50"] = _percentile(latencies, 50)
+        metrics["latency_p95"] = _percentile(latencies, 95)
+        return metrics
+
+    def hedge_delay(self) -> Optional[float]:
+        """Return the number of seconds after which an attempt is hedged, or None if it is not hedged."""
+        if self.hedge_percentile is None:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        return _percentile(latencies, self.hedge_percentile)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    def _record(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def _attempt_timeout(self, start):
+        """Return the timeout of the next attempt, which ends by the deadline."""
+        if self.deadline is None:
+            return self.timeout
+        remaining = max(0.0, start + self.deadline - time.monotonic())
+        return remaining if self.timeout is None else min(self.timeout, remaining)
+
+    def _retry_delay(self, error, retry, start):
+        """Return the number of seconds to wait before retrying after error, or None if it is not retried."""
+        if retry >= self.max_retries or not self.retryable(error):
+            self._count("failures")
+            return None
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** retry))
+        delay = max(delay, retry_after(error) or 0.0)
+        if self.deadline is not None and time.monotonic() + delay >= start + self.deadline:
+            self._count("failures")
+            return None
+        self._count("retries")
+        self._count("retries:" + type(error).__name__)
+        return delay
+
+    def _timed(self, attempt):
+        self._count("attempts")
+        begin = time.monotonic()
+        response = attempt()
+        self._record(time.monotonic() - begin)
+        return response
+
+    async def _atimed(self, attempt):
+        self._count("attempts")
+        begin = time.monotonic()
+        response = await attempt()
+        self._record(time.monotonic() - begin)
+        return response
+
+    def _race(self, attempt, timeout):
+        """Run attempt in threads, hedging it, and return the first response or raise TimeoutError."""
+        results = queue.SimpleQueue()
+
+        def run(index, context):
+            begin = time.monotonic()
+            try:
+                results.put((index, True, context.run(attempt), time.monotonic() - begin))
+            except BaseException as e:
+                results.put((index, False, e, None))
+
+        attempts = []
+
+        def launch(index):
+            self._count("attempts")
+            context = contextvars.copy_context()
+            attempts.append(_Attempt())
+            context.run(_ATTEMPT.set, attempts[-1])
+            threading.Thread(target=run, args=(index, context), daemon=True).start()
+
+        start = time.monotonic()
+        hedge_delay = self.hedge_delay()
+        launch(0)
+        n_started, n_failed = 1, 0
+        try:
+            while True:
+                wait = self._next_event(start, timeout, hedge_delay, n_started)
+                try:
+                    index, ok, value, latency = results.get(timeout=wait)
+                except queue.Empty:
+                    if timeout is not None and time.monotonic() - start >= timeout:
+                        self._count("timeouts")
+                        raise TimeoutError(f"The LLM request did not finish in {timeout:.1f} seconds.")
+                    self._count("hedges")
+                    launch(n_started)
+                    n_started += 1
+                    continue
+                if ok:
+                    self._record(latency)
+                    if index > 0:
+                        self._count("hedge_wins")
+                    return value
+                n_failed += 1
+                if n_failed == n_started:  # no attempt is running
+                    raise value
+        finally:
+            for attempt_state in attempts:  # the attempts which are still running are abandoned
+                attempt_state.abandon()
+
+    async def _arace(self, attempt, timeout):
+        """The async version of `_race`; the abandoned attempts are cancelled."""
+
+        async def run():
+            begin = time.monotonic()
+            response = await attempt()
+            return response, time.monotonic() - begin
+
+        def launch():
+            self._count("attempts")
+            return asyncio.ensure_future(run())
+
+        start = time.monotonic()
+        hedge_delay = self.hedge_delay()
+        tasks = [launch()]
+        running = set(tasks)
+        try:
+            while True:
+                wait = self._next_event(start, timeout, hedge_delay, len(tasks))
+                done, running = await asyncio.wait(running, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        response, latency = task.result()
+                        self._record(latency)
+                        if task is not tasks[0]:
+                            self._count("hedge_wins")
+                        return response
+                if done and not running:  # no attempt is running
+                    raise done.pop().exception()
+                if not done:
+                    if timeout is not None and time.monotonic() - start >= timeout:
+                        self._count("timeouts")
+                        raise TimeoutError(f"The LLM request did not finish in {timeout:.1f} seconds.")
+                    self._count("hedges")
+                    tasks.append(launch())
+                    running.add(tasks[-1])
+        finally:
+            for task in running:
+                task.cancel()
+
+    def _next_event(self, start, timeout, hedge_delay, n_started):
+        """Return the number of seconds until the timeout or the next hedge, or None if there is neither."""
+        times = []
+        if timeout is not None:
+            times.append(start + timeout)
+        if hedge_delay is not None and n_started <= self.max_hedges:
+            times.append(start + n_started * hedge_delay)
+        if not times:
+            return None
+        return max(0.0, min(times) - time.monotonic())
+
+
+class _Attempt:
+    """An attempt run in a thread by `RetryPolicy._race`, which may be abandoned."""
+
+    def __init__(self):
+        self.abandoned = False
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def on_abandon(self, callback):
+        with self._lock:
+            if self.abandoned:
+                return False
+            self._callbacks.append(callback)
+            return True
+
+    def abandon(self):
+        with self._lock:
+            if self.abandoned:
+                return
+            self.abandoned = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+def on_abandon(callback: Callable[[], Any]) -> bool:
+    """Call callback when the current attempt of a RetryPolicy is abandoned (after its timeout, or when
+    another attempt returns first), e.g., to release the resources it holds. The attempt keeps running.
+
+    Returns:
+        bool: False if the attempt is already abandoned, in which case callback is not registered.
+        Outside of the attempts which can be abandoned, callback is never called and True is returned.
+    """
+    attempt = _ATTEMPT.get()
+    return True if attempt is None else attempt.on_abandon(callback)
+
+
+def make_retry_policy(retry) -> Optional[RetryPolicy]:
+    """Return the RetryPolicy specified by the retry argument of the LLM classes: False or None for no
+    retries, True for the default RetryPolicy, or a RetryPolicy."""
+    if retry is None or retry is False:
+        return None
+    if retry is True:
+        return RetryPolicy()
+    if isinstance(retry, RetryPolicy):
+        return retry
+    raise TypeError(f"Unknown retry policy {retry!r}.")
+
+
+def _percentile(values, percentile):
+    """Return the percentile of the sorted values, or None if there is none."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(percentile / 100 * len(values)) - 1)]
@@ -0,0 +1,282 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Optional
+
+HIGH_PRIORITY = 0  # e.g., the calls made by Optimizer.step
+DEFAULT_PRIORITY = 1
+LOW_PRIORITY = 2  # e.g., bulk evaluation
+
+LLM_PRIORITY = contextvars.ContextVar("LLM_PRIORITY", default=DEFAULT_PRIORITY)  # The priority of the LLM calls
+
+
+class llm_priority:
+    """A contextmanager to set the priority of the LLM calls made within the context.
+
+    A scheduler (see `LLMScheduler`) starts the queued calls with the lowest priority value first.
+    The priority is kept by the threads and tasks started within the context.
+
+    Examples:
+        >>> with llm_priority(LOW_PRIORITY):
+        >>>     scores = evaluate(agent, dataset)  # these calls wait for the calls of optimizer.step
+    """
+
+    def __init__(self, priority: int):
+        self.priority = priority
+
+    def __enter__(self):
+        self._token = LLM_PRIORITY.set(self.priority)
+
+    def __exit__(self, type, value, traceback):
+        LLM_PRIORITY.reset(self._token)
+
+
+class TokenBucket:
+    """A budget of units per minute, which can be spent in bursts of up to one minute's budget."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0  # units per second
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def delay(self, amount: float, now: float) -> float:
+        """Return the number of seconds until amount units are available.
+
+        Amounts larger than the capacity are available when the bucket is full.
+        """
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        """Spend amount units. The level can become negative, which delays the next requests."""
+        self.level -= amount
+
+
+class _Request:
+    """A call waiting for (or holding) a slot of a scheduler."""
+
+    __slots__ = ("priority", "tokens", "enqueued", "wake", "released")
+
+    def __init__(self, priority, tokens, wake):
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.wake = wake
+        self.released = False
+
+
+class LLMScheduler:
+    """A client-side scheduler which keeps the LLM calls within rate limits.
+
+    A call acquires a slot before it is sent and releases it when the response is received. Slots are
+    limited by token buckets of requests per minute and tokens per minute, and by the number of calls in
+    flight. Waiting calls are started in the order of their priority (see `llm_priority`) and then of their
+    arrival, so high priority calls (e.g., of an optimizer) go ahead of the queued low priority ones.
+
+    The number of tokens of a call is estimated before it is sent (see `estimate_tokens`) and corrected
+    with the usage reported in the response. A scheduler can be shared by several models (e.g., of the same
+    provider), threads and event loops.
+
+    Args:
+        requests_per_minute (float, optional): the maximum rate of requests. If None, the rate is not limited.
+        tokens_per_minute (float, optional): the maximum rate of tokens. If None, the rate is not limited.
+        max_in_flight (int, optional): the maximum number of concurrent calls. If None, it is not limited.
+
+    Examples:
+        >>> scheduler = LLMScheduler(requests_per_minute=500, tokens_per_minute=200_000, max_in_flight=32)
+        >>> llm = LLM(scheduler=scheduler)
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_in_flight: Optional[int] = None,
+    ):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute is not None else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute is not None else None
+        self.max_in_flight = max_in_flight
+        self._lock = threading.Lock()
+        self._queue = []  # a heap of (priority, arrival, request)
+        self._arrivals = itertools.count()
+        self._in_flight = 0
+        self._waits = {}  # priority -> [number of started calls, total wait, max wait]
+
+    def acquire(self, tokens: float = 0, priority: Optional[int] = None) -> _Request:
+        """Wait for a slot for a call of about tokens tokens, and return it (see `release`).
+
+        Args:
+            tokens (float): the estimated number of tokens of the call.
+            priority (int, optional): the priority of the call. If None, LLM_PRIORITY is used.
+        """
+        event = threading.Event()
+        request = self._enqueue(priority, tokens, event.set)
+        try:
+            while True:
+                event.clear()
+                delay = self._poll(request)
+                if delay == 0:
+                    return request
+                event.wait(delay)
+        except BaseException:
+            self._dequeue(request)
+            raise
+
+    async def aacquire(self, tokens: float = 0, priority: Optional[int] = None) -> _Request:
+        """The async version of `acquire`."""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        request = self._enqueue(priority, tokens, lambda: loop.call_soon_threadsafe(event.set))
+        try:
+            while True:
+                event.clear()
+                delay = self._poll(request)
+                if delay == 0:
+                    return request
+                try:
+                    await asyncio.wait_for(event.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._dequeue(request)
+            raise
+
+    def release(self, request: _Request, tokens: Optional[float] = None) -> None:
+        """Release the slot of a finished (or abandoned) call.
+
+        A slot is released once; releasing it again only corrects the number of tokens, e.g., when an
+        abandoned call finishes later.
+
+        Args:
+            request: the slot returned by `acquire`.
+            tokens (float, optional): the number of tokens used by the call, which replaces the estimate.
+        """
+        with self._lock:
+            if not request.released:
+                request.released = True
+                self._in_flight -= 1
+            if self.tokens is not None and tokens is not None:
+                self.tokens.consume(tokens - request.tokens)
+                request.tokens = tokens
+            self._wake_head()
+
+    def metrics(self) -> dict:
+        """Return the state of the scheduler.
+
+        Returns:
+            dict: `in_flight` is the number of calls holding a slot and `queue_depth` the number of waiting
+            calls. `lanes` maps each priority to its number of waiting calls (`queue_depth`), the number of
+            started calls (`started`), and the mean and max time in seconds that these waited (`mean_wait`, `max_wait`).
+        """
+        with self._lock:
+            lanes = {}
+            for priority, (started, total_wait, max_wait) in self._waits.items():
+                lanes[priority] = {
+                    "queue_depth": 0,
+                    "started": started,
+                    "mean_wait": total_wait / started,
+                    "max_wait": max_wait,
+                }
+            for priority, _, _ in self._queue:
+                lane = lanes.setdefault(
+                    priority, {"queue_depth": 0, "started": 0, "mean_wait": 0.0, "max_wait": 0.0}
+                )
+                lane["queue_depth"] += 1
+            return {"in_flight": self._in_flight, "queue_depth": len(self._queue), "lanes": lanes}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ["_lock", "_queue", "_arrivals", "_in_flight"]:  # the calls are not kept
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._queue = []
+        self._arrivals = itertools.count()
+        self._in_flight = 0
+
+    def _enqueue(self, priority, tokens, wake):
+        if priority is None:
+            priority = LLM_PRIORITY.get()
+        request = _Request(priority, tokens, wake)
+        with self._lock:
+            heapq.heappush(self._queue, (priority, next(self._arrivals), request))
+            self._wake_head()
+        return request
+
+    def _dequeue(self, request):
+        """Remove a request which stopped waiting (e.g., it is cancelled)."""
+        with self._lock:
+            for i, (_, _, r) in enumerate(self._queue):
+                if r is request:
+                    del self._queue[i]
+                    heapq.heapify(self._queue)
+                    break
+            else:  # the slot was acquired
+                request.released = True
+                self._in_flight -= 1
+            self._wake_head()
+
+    def _poll(self, request):
+        """Start request if possible, and return 0. Otherwise, return the number of seconds to wait, or
+        None if it waits for another request to start or to finish."""
+        with self._lock:
+            if self._queue[0][2] is not request:
+                return None  # only the first request in the queue can start
+            if self.max_in_flight is not None and self._in_flight >= self.max_in_flight:
+                return None
+            now = time.monotonic()
+            delay = 0.0
+            if self.requests is not None:
+                delay = max(delay, self.requests.delay(1, now))
+            if self.tokens is not None:
+                delay = max(delay, self.tokens.delay(request.tokens, now))
+            if delay > 0:
+                return delay
+            if self.requests is not None:
+                self.requests.consume(1)
+            if self.tokens is not None:
+                self.tokens.consume(request.tokens)
+            heapq.heappop(self._queue)
+            self._in_flight += 1
+            wait = now - request.enqueued
+            stats = self._waits.setdefault(request.priority, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += wait
+            stats[2] = max(stats[2], wait)
+            self._wake_head()
+            return 0
+
+    def _wake_head(self):
+        if self._queue:
+            self._queue[0][2].wake()
+
+
+def estimate_tokens(kwargs: dict) -> int:
+    """Estimate the number of tokens of a chat completion request: about 4 characters per token of the
+    messages plus the maximum number of generated tokens."""
+    n_chars = 0
+    for message in kwargs.get("messages") or ():
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, str):
+            n_chars += len(content)
+        elif isinstance(content, list):  # a list of parts, e.g., text and images
+            n_chars += sum(len(part.get("text", "")) for part in content if isinstance(part, dict))
+    max_tokens = kwargs.get("max_tokens") or kwargs.get("max_completion_tokens") or 0
+    return n_chars // 4 + max_tokens
+
+
+def used_tokens(response: Any) -> Optional[int]:
+    """Return the total number of tokens reported in the usage of a response, or None if it is not reported."""
+    usage = response.get("usage") if isinstance(response, dict) else getattr(response, "usage", None)
+    if usage is None:
+        return None
+    total = usage.get("total_tokens") if isinstance(usage, dict) else getattr(usage, "total_tokens", None)
+    return total if isinstance(total, (int, float)) else None
@@ -0,0 +1,74 @@
+"""Benchmark sequential LLM calls against concurrent async calls.
+
+Starts a local OpenAI-compatible server which answers each chat completion
+after a fixed latency, and reports the time to make n requests with
+CustomLLM.__call__ one by one and with CustomLLM.acall from one event loop.
+
+Usage:
+    python tests/benchmarks/bench_async_llm.py [n_requests] [latency]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from opto.utils.llm import CustomLLM
+
+LATENCY = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(LATENCY)
+        body = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def messages(i):
+    return [{"role": "user", "content": f"question {i}"}]
+
+
+if __name__ == "__main__":
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["TRACE_CUSTOMLLM_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ["TRACE_CUSTOMLLM_API_KEY"] = "sk-stub"
+    llm = CustomLLM(model="stub-model", cache=False)
+
+    start = time.perf_counter()
+    for i in range(n_requests):
+        llm(messages=messages(i))
+    sequential = time.perf_counter() - start
+
+    async def run():
+        return await asyncio.gather(*[llm.acall(messages=messages(i)) for i in range(n_requests)])
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    concurrent = time.perf_counter() - start
+
+    print(f"{n_requests} requests, {1000 * LATENCY:.0f} ms latency")
+    print(f"{'sequential __call__':>20}: {sequential:8.2f} s")
+    print(f"{'concurrent acall':>20}: {concurrent:8.2f} s ({sequential / concurrent:.1f}x)")
+    server.shutdown()
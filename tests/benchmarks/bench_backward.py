@@ -0,0 +1,83 @@
+"""Benchmark the graph traversal of Node.backward.
+
+The PassThroughPropagator just forwards the feedback to the parents, so the
+measured time is dominated by the traversal of the frontier in backward rather
+than by the feedback aggregation. The GraphPropagator runs additionally measure
+the cost of merging TraceGraphs, including reading the graph collected at the
+root. For each graph shape the time per node should stay roughly constant as
+the graph grows.
+
+Usage:
+    python tests/benchmarks/bench_backward.py
+"""
+
+import time
+from opto.trace.nodes import GRAPH, node, MessageNode
+from opto.trace.propagators import GraphPropagator
+from opto.trace.propagators.propagators import Propagator
+
+
+class PassThroughPropagator(Propagator):
+    def init_feedback(self, node, feedback):
+        return feedback
+
+    def _propagate(self, child):
+        return {parent: "" for parent in child.parents}
+
+
+def op(*parents, name="op"):
+    return MessageNode(
+        0,
+        inputs=list(parents),
+        description="[op] A synthetic operator.",
+        name=name,
+    )
+
+
+def chain(n):
+    """x -> y_1 -> y_2 -> ... -> y_n"""
+    x = node(0, name="x")
+    y = x
+    for _ in range(n):
+        y = op(y)
+    return x, y
+
+
+def fan_in(n):
+    """x_i -> y_i for i=1..n, and (y_1, ..., y_n) -> z"""
+    xs = [node(0, name="x") for _ in range(n)]
+    ys = [op(x) for x in xs]
+    return xs[0], op(*ys, name="sink")
+
+
+def fan_out(n):
+    """x -> m -> y_i for i=1..n, and (y_1, ..., y_n) -> z"""
+    x = node(0, name="x")
+    m = op(x)
+    ys = [op(m) for _ in range(n)]
+    return x, op(*ys, name="sink")
+
+
+def run(builder, n, propagator):
+    GRAPH.clear()
+    root, output = builder(n)
+    start = time.perf_counter()
+    output.backward("feedback", propagator=propagator)
+    if isinstance(propagator, GraphPropagator):
+        for feedback in root.feedback.values():
+            len(feedback[0])  # collect the nodes of the subgraph
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    runs = [
+        (PassThroughPropagator, [1_000, 10_000, 100_000]),
+        (GraphPropagator, [1_000, 10_000, 50_000]),
+    ]
+    for propagator, sizes in runs:
+        for builder in (chain, fan_in, fan_out):
+            print(f"{propagator.__name__} {builder.__name__}")
+            for n in sizes:
+                elapsed = run(builder, n, propagator())
+                print(f"  n={n:>7}: {elapsed:8.3f}s  ({1e6 * elapsed / n:6.2f} us/node)")
+    GRAPH.clear()
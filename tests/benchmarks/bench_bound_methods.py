@@ -0,0 +1,79 @@
+"""Benchmark creating many instances of a model class with bundled methods.
+
+Bundled methods are bound to an instance on first access (e.g., by calling
+them or by collecting the parameters of the instance). Reports the time and
+the memory allocated per instance of creating n instances of a model class
+with several bundled methods (one of them trainable) and accessing their
+methods, and the time per instance of collecting the parameters of the
+instances and of calling their methods once.
+
+Usage:
+    python tests/benchmarks/bench_bound_methods.py [n]
+"""
+
+import sys
+import time
+import tracemalloc
+from opto import trace
+from opto.trace.nodes import GRAPH
+
+
+@trace.model
+class Agent:
+    def __init__(self, i):
+        self.i = i
+
+    @trace.bundle()
+    def plan(self, x):
+        """Make a plan."""
+        return f"plan for {x}"
+
+    @trace.bundle()
+    def act(self, plan):
+        """Act according to the plan."""
+        return plan.upper()
+
+    @trace.bundle()
+    def reflect(self, result):
+        """Reflect on the result."""
+        return len(result)
+
+    @trace.bundle(trainable=True)
+    def policy(self, x):
+        """Choose an action."""
+        return x + 1
+
+    def forward(self, x):
+        return self.reflect(self.act(self.plan(x)))
+
+
+def create(n):
+    agents = [Agent(i) for i in range(n)]
+    for agent in agents:
+        agent.plan, agent.act, agent.reflect, agent.policy
+    return agents
+
+
+def timeit(f, agents):
+    start = time.perf_counter()
+    for agent in agents:
+        f(agent)
+    return (time.perf_counter() - start) / len(agents)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    GRAPH.clear()
+    create(10)  # bind the class-level FunModules once
+    tracemalloc.start()
+    start = time.perf_counter()
+    agents = create(n)
+    elapsed = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{'create + bind':>14}: {1e6 * elapsed / n:8.1f} us/instance, {memory / n / 1024:6.1f} KiB/instance")
+    elapsed = timeit(lambda agent: agent.parameters(), agents)
+    print(f"{'parameters':>14}: {1e6 * elapsed:8.1f} us/instance")
+    elapsed = timeit(lambda agent: (agent("x"), agent.policy(1)), agents)
+    print(f"{'first calls':>14}: {1e6 * elapsed:8.1f} us/instance")
+    GRAPH.clear()
@@ -0,0 +1,31 @@
+"""Benchmark the per-call overhead of a bundled operator.
+
+Reports the number of calls per second of `ops.add` on two nodes. The
+operator itself is cheap, so the number is dominated by the overhead of
+FunModule (binding the arguments, wrapping them as nodes, tracing the used
+nodes and creating the MessageNode).
+
+Usage:
+    python tests/benchmarks/bench_bundle_call.py
+"""
+
+import time
+from opto.trace import operators as ops
+from opto.trace.nodes import GRAPH, node
+
+
+def run(n_calls):
+    GRAPH.clear()
+    x = node(1)
+    y = node(2)
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        ops.add(x, y)
+    return n_calls / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    run(1_000)  # warm up
+    for n_calls in [10_000, 100_000]:
+        print(f"n={n_calls:>7}: {run(n_calls):10.0f} calls/s")
+    GRAPH.clear()
@@ -0,0 +1,56 @@
+"""Benchmark replaying a captured graph against tracing a module eagerly.
+
+The module applies a chain of bundled operators (some of them called through
+Node operators, which wrap their constant operands as nodes). Each call
+creates the same graph, either by running forward eagerly or by replaying the
+graph captured by trace.capture.
+
+Usage:
+    python tests/benchmarks/bench_capture.py
+"""
+
+import time
+from opto import trace
+from opto.trace.nodes import GRAPH
+
+
+@trace.bundle()
+def normalize(text, suffix=""):
+    """Normalize the text."""
+    return text.strip().lower() + suffix
+
+
+@trace.model
+class Pipeline:
+    def __init__(self, n_steps):
+        self.n_steps = n_steps
+        self.prompt = trace.node("Answer the question: ", trainable=True)
+
+    def forward(self, question):
+        x = self.prompt + question
+        for i in range(self.n_steps):
+            x = normalize(x, suffix=" ")
+            x = x + str(i)
+        return x
+
+
+def run(call, n_calls):
+    start = time.perf_counter()
+    for i in range(n_calls):
+        call(f"question {i}")
+    return (time.perf_counter() - start) / n_calls
+
+
+if __name__ == "__main__":
+    n_calls = 500
+    for n_steps in [1, 10, 50]:
+        GRAPH.clear()
+        pipeline = Pipeline(n_steps)
+        eager = run(pipeline, n_calls)
+        captured = trace.capture(pipeline)
+        replay = run(captured, n_calls)
+        print(
+            f"n_steps={n_steps:>3}: eager {1e6 * eager:8.1f} us/call, "
+            f"replay {1e6 * replay:8.1f} us/call ({eager / replay:.2f}x)"
+        )
+    GRAPH.clear()
@@ -0,0 +1,62 @@
+"""Benchmark extracting data from nested containers of nodes.
+
+to_data (used to call bundled functions) converts the nodes in tuples, lists,
+dicts, sets and NodeContainers to their data. Reports the time of to_data on a
+nested payload of about n elements (a list of documents with metadata), when
+the payload contains no node, when one document contains a node, and when every
+document contains nodes, and the time of a bundled call under inference_mode
+taking the payload without nodes.
+
+Usage:
+    python tests/benchmarks/bench_conversion.py [n]
+"""
+
+import sys
+import time
+from opto import trace
+from opto.trace.bundle import to_data
+from opto.trace.nodes import GRAPH
+
+
+def make_payload(n, node_every=None):
+    """A list of n // 10 documents, each with about 10 elements."""
+    documents = []
+    for i in range(n // 10):
+        score = trace.node(i / n) if node_every is not None and i % node_every == 0 else i / n
+        documents.append(
+            {"id": i, "text": f"document {i}", "score": score, "tags": ("a", "b", "c"), "meta": {"source": "web", "rank": i}}
+        )
+    return documents
+
+
+@trace.bundle()
+def count(documents):
+    """Count the documents."""
+    return len(documents)
+
+
+def timeit(f, n_runs=5):
+    best = float("inf")
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    GRAPH.clear()
+    cases = {
+        "no node": make_payload(n),
+        "one node": make_payload(n, node_every=n),
+        "node per document": make_payload(n, node_every=1),
+    }
+    for name, payload in cases.items():
+        elapsed = timeit(lambda: to_data(payload))
+        print(f"{'to_data (' + name + ')':>30}: {1e3 * elapsed:8.2f} ms")
+    payload = cases["no node"]
+    with trace.inference_mode():
+        elapsed = timeit(lambda: count(payload))
+    print(f"{'inference_mode call':>30}: {1e3 * elapsed:8.2f} ms")
+    GRAPH.clear()
@@ -0,0 +1,36 @@
+"""Benchmark the cost of tracking parameter dependencies when creating nodes.
+
+A node depending on P parameters is combined repeatedly with nodes depending
+on a different parameter, which is the pattern of an agent reading a few
+fresh parameters on top of a large shared context. The time to create a node
+should stay roughly flat as P grows.
+
+Usage:
+    python tests/benchmarks/bench_dependencies.py
+"""
+
+import time
+from opto.trace.nodes import GRAPH, ParameterNode, MessageNode
+
+
+def op(*parents):
+    return MessageNode(
+        0, inputs=list(parents), description="[op] A synthetic operator.", name="op"
+    )
+
+
+def run(n_parameters, n_nodes=10_000):
+    GRAPH.clear()
+    context = op(*[ParameterNode(i) for i in range(n_parameters)])
+    fresh = [ParameterNode(i) for i in range(n_nodes)]
+    start = time.perf_counter()
+    for p in fresh:
+        op(context, p)
+    return (time.perf_counter() - start) / n_nodes
+
+
+if __name__ == "__main__":
+    for n_parameters in [1, 10, 100, 1_000]:
+        elapsed = run(n_parameters)
+        print(f"P={n_parameters:>5}: {1e6 * elapsed:8.2f} us/node")
+    GRAPH.clear()
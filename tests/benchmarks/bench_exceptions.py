@@ -0,0 +1,53 @@
+"""Benchmark bundled calls which raise exceptions.
+
+In search loops, most candidate programs fail, and the ExceptionNodes of the
+failures are often discarded without rendering their error comments. Reports
+the time per failing call of a bundled function raising in a nested helper,
+when the exception is discarded and when the full feedback of the
+ExceptionNode (the error comment) is read.
+
+Usage:
+    python tests/benchmarks/bench_exceptions.py [n_calls]
+"""
+
+import sys
+import time
+from opto import trace
+from opto.trace.nodes import GRAPH
+
+
+def parse(x):
+    return int(x)
+
+
+def helper(x):
+    return parse(x) + 1
+
+
+@trace.bundle()
+def candidate(x):
+    """Apply the helper."""
+    return helper(x)
+
+
+def run(n_calls, read_feedback):
+    x = trace.node("not a number")
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        try:
+            candidate(x)
+        except trace.ExecutionError as e:
+            if read_feedback:
+                feedback = e.exception_node.create_feedback("full")
+                assert "helper" in feedback
+    return (time.perf_counter() - start) / n_calls
+
+
+if __name__ == "__main__":
+    n_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    GRAPH.clear()
+    for read_feedback in [False, True]:
+        elapsed = run(n_calls, read_feedback)
+        name = "feedback read" if read_feedback else "discarded"
+        print(f"{name:>14}: {1e6 * elapsed:8.1f} us/call")
+    GRAPH.clear()
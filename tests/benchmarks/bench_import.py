@@ -0,0 +1,55 @@
+"""Benchmark the time to import opto.trace and opto.optimizers.
+
+Runs `python -X importtime -c "import <module>"` in fresh interpreters and
+reports the best cumulative import time of a few modules over the runs, as
+parsed from the importtime output. opto.trace.operators defines about a hundred
+bundled operators, so its time measures the cost of decorating functions with
+bundle. The LLM backends (litellm, openai, autogen) and black are imported on
+first use, so they should not be listed as imported.
+
+Usage:
+    python tests/benchmarks/bench_import.py [module] [n_runs]
+"""
+
+import subprocess
+import sys
+
+REPORTED = [
+    "opto.trace.bundle",
+    "opto.trace.operators",
+    "opto.trace",
+    "opto.utils.llm",
+    "opto.optimizers.optoprime",
+    "opto.optimizers",
+]
+HEAVY = ["litellm", "openai", "autogen", "black", "graphviz"]
+
+
+def importtime(module):
+    """Return a dict from module names to their cumulative import time in us."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+if __name__ == "__main__":
+    module = sys.argv[1] if len(sys.argv) > 1 else "opto.optimizers"
+    n_runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    runs = [importtime(module) for _ in range(n_runs)]
+    for name in REPORTED + ([module] if module not in REPORTED else []):
+        times = [run[name] for run in runs if name in run]
+        if times:
+            print(f"{name:>26}: {min(times) / 1000:8.1f} ms")
+    imported = [name for name in HEAVY if name in runs[0]]
+    print(f"{'heavy modules imported':>26}: {', '.join(imported) or 'none'}")
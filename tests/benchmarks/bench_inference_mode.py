@@ -0,0 +1,49 @@
+"""Benchmark bundled functions in inference mode against undecorated code.
+
+Reports the time per call of a small function when it is called directly,
+when it is bundled and traced, when it is bundled under stop_tracing, and when
+it is bundled under inference_mode. The last row applies the operator `+` to
+two existing nodes under inference_mode. Bundled calls under inference_mode
+should cost close to a plain function call.
+
+Usage:
+    python tests/benchmarks/bench_inference_mode.py
+"""
+
+import time
+from opto import trace
+from opto.trace.nodes import GRAPH, node
+
+
+def add(x, y):
+    return x + y
+
+
+bundled_add = trace.bundle()(add)
+
+
+def timeit(f, n_calls):
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        f()
+    return (time.perf_counter() - start) / n_calls
+
+
+def run(n_calls=100_000):
+    x, y = node(1), node(2)
+    results = {}
+    results["plain function"] = timeit(lambda: add(1, 2), n_calls)
+    results["bundle (traced)"] = timeit(lambda: bundled_add(x, y), n_calls // 10)
+    with trace.stop_tracing():
+        results["bundle (stop_tracing)"] = timeit(lambda: bundled_add(x, y), n_calls // 10)
+    with trace.inference_mode():
+        results["bundle (inference_mode)"] = timeit(lambda: bundled_add(x, y), n_calls)
+        results["x + y (inference_mode)"] = timeit(lambda: x + y, n_calls)
+    return results
+
+
+if __name__ == "__main__":
+    GRAPH.clear()
+    for name, elapsed in run().items():
+        print(f"{name:>24}: {1e9 * elapsed:10.0f} ns/call")
+    GRAPH.clear()
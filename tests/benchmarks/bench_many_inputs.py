@@ -0,0 +1,37 @@
+"""Benchmark bundled functions with many node inputs.
+
+Reports the time per call of a bundled aggregation whose inputs are n nodes,
+passed as variable positional arguments, so that each node is an input of the
+returned MessageNode. The time per input should stay roughly constant as n
+grows.
+
+Usage:
+    python tests/benchmarks/bench_many_inputs.py
+"""
+
+import time
+from opto import trace
+from opto.trace.nodes import GRAPH
+
+
+@trace.bundle()
+def total(*xs):
+    """Return the sum of the inputs."""
+    return sum(xs)
+
+
+def timeit(f, n_calls):
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        f()
+    return (time.perf_counter() - start) / n_calls
+
+
+if __name__ == "__main__":
+    for n in [10, 100, 1000]:
+        GRAPH.clear()
+        xs = [trace.node(i) for i in range(n)]
+        n_calls = max(10, 10_000 // n)
+        elapsed = timeit(lambda: total(*xs), n_calls)
+        print(f"n={n:>5}: {1e3 * elapsed:8.3f} ms/call ({1e6 * elapsed / n:5.2f} us/input)")
+    GRAPH.clear()
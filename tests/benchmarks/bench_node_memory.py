@@ -0,0 +1,82 @@
+"""Benchmark the memory footprint of nodes.
+
+Reports the number of bytes allocated per node (as measured by tracemalloc)
+for root nodes, parameter nodes and message nodes, with the node classes of a
+baseline revision and with the current (slotted) ones. The data of the nodes
+are small integers, so the numbers are dominated by the node representation.
+
+The baseline is the revision before nodes were given __slots__, unless another
+git revision is given. Its opto/trace/nodes.py is loaded from git as a
+separate module, so it has its own graph.
+
+Usage:
+    python tests/benchmarks/bench_node_memory.py [BASELINE_REVISION]
+"""
+
+import gc
+import os
+import subprocess
+import sys
+import tracemalloc
+import types
+from opto.trace import nodes as slotted
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+NODES_PATH = "opto/trace/nodes.py"
+
+
+def git(*args):
+    return subprocess.run(["git", *args], cwd=ROOT, check=True, capture_output=True, text=True).stdout
+
+
+def baseline_revision():
+    # The first commit whose nodes.py defines the slots of AbstractNode
+    commits = git("log", "--format=%H", '-S__slots__ = ("_parents"', "--", NODES_PATH).split()
+    return commits[-1] + "^"
+
+
+def load_nodes(revision):
+    module = types.ModuleType("baseline_nodes")
+    sys.modules[module.__name__] = module
+    exec(compile(git("show", f"{revision}:{NODES_PATH}"), NODES_PATH, "exec"), module.__dict__)
+    return module
+
+
+def roots(nodes, n):
+    return [nodes.Node(1) for _ in range(n)]
+
+
+def parameters(nodes, n):
+    return [nodes.ParameterNode(1) for _ in range(n)]
+
+
+def messages(nodes, n):
+    x = nodes.Node(1)
+    y = nodes.Node(2)
+    return [
+        nodes.MessageNode(3, inputs=[x, y], description="[add] Add x and y.", name="add")
+        for _ in range(n)
+    ]
+
+
+def bytes_per_node(nodes, builder, n):
+    nodes.GRAPH.clear()
+    gc.collect()
+    tracemalloc.start()
+    created = builder(nodes, n)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del created
+    nodes.GRAPH.clear()
+    return size / n
+
+
+if __name__ == "__main__":
+    n = 100_000
+    revision = sys.argv[1] if len(sys.argv) > 1 else baseline_revision()
+    baseline = load_nodes(revision)
+    print(f"baseline: {git('rev-parse', '--short', revision).strip()}")
+    for builder in (roots, parameters, messages):
+        before = bytes_per_node(baseline, builder, n)
+        after = bytes_per_node(slotted, builder, n)
+        print(f"{builder.__name__:>10}: baseline {before:8.1f} bytes/node, slotted {after:8.1f} bytes/node ({before / after:.2f}x)")
@@ -0,0 +1,85 @@
+"""Benchmark collecting the parameters of a hierarchy of modules.
+
+The hierarchy is a team of n agents; each agent has a few trainable nodes, a
+trainable and a non-trainable bundled method, a nested module, and ordinary
+attributes, methods and a property. Reports the time of parameters() and
+parameters_dict() of the team, which optimizers and Module.save/load call.
+
+Usage:
+    python tests/benchmarks/bench_parameters.py [n]
+"""
+
+import sys
+import time
+from opto import trace
+from opto.trace.nodes import GRAPH
+
+
+@trace.model
+class Memory:
+    def __init__(self):
+        self.summary = trace.node("", trainable=True)
+        self.entries = list(range(100))
+
+
+@trace.model
+class Agent:
+    def __init__(self, i):
+        self.name = f"agent {i}"
+        self.system_prompt = trace.node("You are a helpful agent.", trainable=True)
+        self.examples = trace.node("", trainable=True)
+        self.memory = Memory()
+        self.history = []
+
+    @property
+    def n_turns(self):
+        return len(self.history)
+
+    @trace.bundle(trainable=True)
+    def decide(self, x):
+        """Decide the next action."""
+        return x
+
+    @trace.bundle()
+    def format(self, x):
+        """Format the message."""
+        return str(x)
+
+    def reset(self):
+        self.history = []
+
+    def forward(self, x):
+        return self.format(self.decide(x))
+
+
+@trace.model
+class Team:
+    def __init__(self, n):
+        self.agents = [Agent(i) for i in range(n)]
+        for i, agent in enumerate(self.agents):
+            setattr(self, f"agent_{i}", agent)
+
+    def forward(self, x):
+        return [agent(x) for agent in self.agents]
+
+
+def timeit(f, n_runs=5):
+    best = float("inf")
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    GRAPH.clear()
+    team = Team(n)
+    n_parameters = len(team.parameters())
+    print(f"{n} agents, {n_parameters} parameters")
+    elapsed = timeit(team.parameters)
+    print(f"{'parameters()':>18}: {1e3 * elapsed:8.2f} ms ({1e6 * elapsed / n_parameters:6.1f} us/parameter)")
+    elapsed = timeit(team.parameters_dict)
+    print(f"{'parameters_dict()':>18}: {1e3 * elapsed:8.2f} ms")
+    GRAPH.clear()
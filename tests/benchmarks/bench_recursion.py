@@ -0,0 +1,57 @@
+"""Benchmark bundled recursive functions with overwrite_python_recursion=True.
+
+With overwrite_python_recursion=True, the recursive calls inside a bundled
+function call the undecorated function, so a call of the bundled function
+creates a single node. Reports the time of computing fib(n) with the plain
+function and with bundled versions defined at the module level (the recursive
+call is a global lookup) and inside a function (the recursive call is a
+closure variable). The bundled versions should cost close to the plain one.
+
+Usage:
+    python tests/benchmarks/bench_recursion.py [n]
+"""
+
+import sys
+import time
+from opto import trace
+from opto.trace.nodes import GRAPH
+
+
+def fib(n):
+    return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+
+def plain_fib(n):
+    return n if n < 2 else plain_fib(n - 1) + plain_fib(n - 2)
+
+
+fib = trace.bundle(overwrite_python_recursion=True)(fib)
+
+
+def make_closure_fib():
+    @trace.bundle(overwrite_python_recursion=True)
+    def closure_fib(n):
+        return n if n < 2 else closure_fib(n - 1) + closure_fib(n - 2)
+
+    return closure_fib
+
+
+def timeit(f, n, n_runs=3):
+    best = float("inf")
+    for _ in range(n_runs):
+        start = time.perf_counter()
+        output = f(n)
+        best = min(best, time.perf_counter() - start)
+    return best, output
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    GRAPH.clear()
+    plain, expected = timeit(plain_fib, n)
+    print(f"{'plain':>16}: {1e3 * plain:8.2f} ms")
+    for name, f in [("bundle (global)", fib), ("bundle (closure)", make_closure_fib())]:
+        elapsed, output = timeit(f, n)
+        assert output.data == expected
+        print(f"{name:>16}: {1e3 * elapsed:8.2f} ms ({elapsed / plain:.2f}x)")
+    GRAPH.clear()
@@ -97,4 +97,75 @@ async def main4():
     assert a in x.parents
     assert len(x.parents) == 1
 
-asyncio.run(main4())
\ No newline at end of file
+asyncio.run(main4())
+
+@trace.bundle(_process_inputs=False)
+async def interleaved(x, delay):
+    # Yield to the other tasks between entering the operator and reading x.
+    await asyncio.sleep(delay)
+    x.data
+    await asyncio.sleep(delay)
+    return x.data + '!'
+
+async def main5():
+    # interleaved tasks attribute the used nodes to their own operator
+    a = trace.node('a')
+    b = trace.node('b')
+    c = trace.node('c')
+    x, y, z = await asyncio.gather(interleaved(a, 0.03), interleaved(b, 0.01), interleaved(c, 0.02))
+    assert x.parents[0] is a and len(x.parents) == 2 and x.info['external_dependencies'] == []
+    assert y.parents[0] is b and len(y.parents) == 2 and y.info['external_dependencies'] == []
+    assert z.parents[0] is c and len(z.parents) == 2 and z.info['external_dependencies'] == []
+    assert (x.data, y.data, z.data) == ('a!', 'b!', 'c!')
+    # each call keeps its own record in info
+    for n, v in zip((x, y, z), (a, b, c)):
+        assert n.info['output'] == n.data
+        assert n.info['inputs']['args'][0] is v
+    assert interleaved.info['output'] is None
+
+asyncio.run(main5())
+
+
+async def untraced(x):
+    with trace.stop_tracing():
+        await asyncio.sleep(0.02)
+        return x + '!'
+
+async def traced(x):
+    await asyncio.sleep(0.01)
+    y = x + '!'  # executed while the other task is within stop_tracing
+    await asyncio.sleep(0.02)
+    return y
+
+async def main6():
+    # stop_tracing only affects the task that enters it
+    a = trace.node('a')
+    b = trace.node('b')
+    x, y = await asyncio.gather(untraced(a), traced(b))
+    assert len(x.parents) == 0
+    assert len(y.parents) == 2 and y.parents[0] is b
+    assert trace.GRAPH.TRACE
+
+asyncio.run(main6())
+
+
+def rollout(x, n):
+    y = x
+    for _ in range(n):
+        y = interleaved_sync(y)
+    return y
+
+@trace.bundle(_process_inputs=False)
+def interleaved_sync(x):
+    time.sleep(0.001)  # release the GIL to interleave with the other threads
+    return x.data + '.'
+
+from concurrent.futures import ThreadPoolExecutor
+inputs = [trace.node(str(i)) for i in range(4)]
+with ThreadPoolExecutor(max_workers=4) as pool:
+    outputs = list(pool.map(rollout, inputs, [20] * 4))
+for x, y in zip(inputs, outputs):
+    assert y.data == x.data + '.' * 20
+    while y is not x:
+        assert len(y.parents) == 1 and y.info['external_dependencies'] == []
+        y = y.parents[0]
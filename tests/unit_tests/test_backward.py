@@ -85,6 +85,21 @@ for k, v in feedback.items():
     print(f"  {f_feedback.user_feedback}")
 
 
+# Diamond graph: the shared node is visited exactly once, after both children.
+GRAPH.clear()
+x = node(1, name="x", trainable=True)
+m = x + 1
+output = (m * 2) + (m * 3)
+output.backward("test feedback", propagator=GraphPropagator())
+assert len(m.feedback) == 0  # feedback is zeroed after being propagated
+assert len(x.feedback) == 1
+assert m._backwarded
+tg = list(x.feedback.values())[0][0]
+assert len(tg.graph) == 8  # x, m, m * 2, m * 3, output, and the constants 1, 2, 3
+assert len(set(id(n) for _, n in tg.graph)) == len(tg.graph)
+assert [level for level, _ in tg.graph] == sorted(level for level, _ in tg.graph)
+
+
 # def sum_of_integers():
 #     y = x.clone()
 #     z = ops.add(x, y)
@@ -1,6 +1,8 @@
+import sys
 import opto.trace as trace
 from opto.trace.bundle import TraceMissingInputsError
-from opto.trace.nodes import Node, node
+from opto.trace.nodes import ExceptionNode, Node, node
+from opto.trace.errors import ExecutionError
 from opto.trace.utils import for_all_methods, contain
 
 
@@ -425,4 +427,260 @@ def run(trainable=False):
 print("Running tests with trainable=False")
 run(trainable=False)
 print("Running tests with trainable=True")
-run(trainable=True)
\ No newline at end of file
+run(trainable=True)
+
+# Test that _ArgumentBinder binds arguments as inspect does
+import inspect
+from opto.trace.bundle import _ArgumentBinder
+
+def f1(a, b=2, *args, c, d=4, **kwargs): pass
+def f2(a, /, b, *, c=3): pass
+def f3(*args, **kwargs): pass
+def f4(a, /, **kwargs): pass
+
+calls = [
+    (f1, (1,), dict(c=3)),
+    (f1, (1, 2, 5, 6), dict(c=3, e=7)),
+    (f1, (), dict(a=1, c=3, d=5)),
+    (f2, (1, 2), {}),
+    (f2, (1,), dict(b=2, c=4)),
+    (f3, (1, 2), dict(x=1)),
+    (f4, (1,), dict(a=2)),  # a goes to **kwargs
+]
+for f, args, kwargs in calls:
+    arguments, defaulted = _ArgumentBinder(f).bind(args, kwargs)
+    ba = inspect.signature(f).bind(*args, **kwargs)
+    explicit = set(ba.arguments)
+    ba.apply_defaults()
+    assert list(arguments.items()) == list(ba.arguments.items())
+    assert set(defaulted) == set(ba.arguments) - explicit - {'args', 'kwargs'}
+
+for f, args, kwargs in [(f1, (1,), {}), (f2, (), dict(a=1, b=2)), (f3, (), dict(args=1, kwargs=2)), (f1, (1, 2), dict(b=3, c=3))]:
+    try:
+        _ArgumentBinder(f).bind(args, kwargs)
+        assert f is f3  # f3 accepts any keyword
+    except TypeError:
+        pass
+
+
+# Test that the function of a trainable operator is defined once per version of the code
+@trace.bundle(trainable=True)
+def add_one(x):
+    return x + 1
+
+assert add_one.fun is add_one.fun
+assert add_one(node(1)) == 2
+add_one.parameter._set("def add_one(x):\n    return x + 2")
+assert add_one(node(1)) == 3
+assert add_one.fun is add_one.fun
+
+add_one.parameter._set("def add_one(x):\n    return x +")
+for _ in range(2):  # the syntax error is reported on every call
+    try:
+        add_one(node(1))
+        assert False, "ExecutionError is expected"
+    except trace.ExecutionError as e:
+        assert e.exception_node.data.startswith("(SyntaxError)")
+        assert "SyntaxError" in e.exception_node.info["error_comment"]
+        assert e.exception_node.parents == [add_one.parameter]
+
+# The defined function sees the module globals changed after its definition
+SCALE = 2
+def make_scale():
+    @trace.bundle(trainable=True)
+    def scale(x):
+        return x * SCALE
+    return scale
+
+scale = make_scale()
+scale.parameter._set("def scale(x):\n    return x * SCALE + 1")
+assert scale(node(3)) == 7
+SCALE = 5
+assert scale(node(3)) == 16
+
+
+# Test inference_mode
+@trace.bundle()
+def multiply(x, y):
+    return x * y
+
+@trace.bundle()
+def fail(x):
+    raise ValueError(x)
+
+class Agent:
+    @trace.bundle()
+    def act(self, x):
+        return x + 1
+
+add_one.parameter._set("def add_one(x):\n    return x + 1")
+x = node(3)
+agent = Agent()
+n_nodes = len(trace.GRAPH)
+with trace.inference_mode():
+    assert multiply(x, 2) == 6 and type(multiply(x, 2)) is int
+    assert multiply(x, y=[1]) == [1, 1, 1]
+    assert x + 1 == 4 and type(x + 1) is int
+    assert node(5) == 5 and type(node(5)) is int
+    assert agent.act(x) == 4 and type(agent.act(x)) is int
+    assert add_one(x) == 4  # trainable function (defined above)
+    try:
+        fail(x)
+        assert False, "ValueError is expected"
+    except ValueError as e:
+        assert e.args == (3,)
+assert len(trace.GRAPH) == n_nodes  # no node is created
+assert isinstance(multiply(x, 2), Node)
+assert isinstance(agent.act(x), Node)  # the node of self is created when the method is traced
+assert agent.__TRACE_RESERVED_self_node._data is agent
+
+# Bundled methods of a fresh model in inference_mode
+@trace.model
+class TrainableAgent:
+    def __init__(self):
+        self.prompt = node("Answer: ", trainable=True)
+
+    @trace.bundle()
+    def act(self, x):
+        return x + 1
+
+agent = TrainableAgent()
+with trace.inference_mode():
+    assert agent.act(x) == 4 and type(agent.act(x)) is int
+    assert agent.act is agent.act  # the method is bound once per instance
+assert not hasattr(agent, "__TRACE_RESERVED_self_node")  # the raw object is not cached as the node of self
+output = agent.act(x)
+assert isinstance(output, Node) and output.data == 4
+assert agent.__TRACE_RESERVED_self_node._data is agent
+
+# Errors in the definition of trainable code are raised as they are in inference_mode
+@trace.bundle(trainable=True)
+def broken(x):
+    return x
+
+broken.parameter._set("def broken(x):\n    return x +")
+n_nodes = len(trace.GRAPH)
+with trace.inference_mode():
+    try:
+        broken(x)
+        assert False, "SyntaxError is expected"
+    except SyntaxError:
+        pass
+assert len(trace.GRAPH) == n_nodes  # no ExceptionNode is created
+try:
+    broken(x)
+    assert False, "ExecutionError is expected"
+except ExecutionError as e:
+    assert isinstance(e.exception_node, ExceptionNode)
+
+
+# Test overwrite_python_recursion for a function defined at the module level
+n_recursive_calls = 0
+
+@trace.bundle(overwrite_python_recursion=True)
+def factorial(n):
+    global n_recursive_calls
+    n_recursive_calls += 1
+    assert sys.gettrace() is tracer  # no tracer is installed by bundle
+    return 1 if n == 0 else n * factorial(n - 1)
+
+tracer = sys.gettrace()
+n_nodes = len(trace.GRAPH)
+output = factorial(5)
+assert output == 120 and len(output.parents) == 1
+assert len(trace.GRAPH) == n_nodes + 2  # the input and the output
+assert n_recursive_calls == 6  # the global variable is updated
+
+# The undecorated function is also called in functions nested in the recursive function
+@trace.bundle(overwrite_python_recursion=True)
+def fib(n):
+    return n if n < 2 else sum(fib(n - k) for k in (1, 2))
+
+output = fib(10)
+assert output == 55 and len(output.parents) == 1
+
+# A function redefined with the same name (e.g., in a notebook) does not change the recursion of the previous one
+@trace.bundle(overwrite_python_recursion=True)
+def count_down(n):
+    return 0 if n == 0 else 1 + count_down(n - 1)
+
+first_count_down = count_down
+assert first_count_down(3).data == 3
+
+@trace.bundle(overwrite_python_recursion=True)
+def count_down(n):
+    return 0 if n == 0 else 7 + count_down(n - 1)
+
+assert count_down(3).data == 21
+assert first_count_down(3).data == 3
+assert not [name for name in globals() if name.startswith("__TRACE_RESERVED")]  # the module globals are not changed
+
+# The recursive function sees the current module globals, also when its name is used as an attribute
+STEP = 1
+
+@trace.bundle(overwrite_python_recursion=True)
+def walk(n):
+    return 0 if n == 0 else STEP + walk(n - 1) + len(walk.__name__) * 0
+
+assert walk(3).data == 3
+STEP = 2
+assert walk(3).data == 6
+assert walk._unbundled[2].namespace["walk"] is walk._unbundled[1]  # the version is cached
+
+
+# Test that the error comment is constructed on first access
+from opto.trace.nodes import LazyInfo
+
+@trace.bundle(trainable=True)
+def parse_int(x):
+    return int(x)
+
+try:
+    parse_int("nan")
+    assert False, "ExecutionError is expected"
+except trace.ExecutionError as e:
+    exception_node = e.exception_node
+assert isinstance(exception_node._info["error_comment"], LazyInfo)
+parse_int.parameter._set("def parse_int(x):\n    return float(x)")  # the comment uses the code that raised the exception
+feedback = exception_node.create_feedback("full")
+assert "return int(x) <--- (ValueError)" in feedback
+assert feedback == exception_node.info["error_comment"]
+assert "ValueError" in exception_node.info["traceback"]
+assert not isinstance(exception_node._info["traceback"], LazyInfo)
+
+# The ExceptionNode of a failed call does not keep the locals of its frames alive
+import gc
+import weakref
+
+class Payload:
+    pass
+
+payloads = []
+
+@trace.bundle()
+def fail_with_payload(x):
+    payload = Payload()
+    payloads.append(weakref.ref(payload))
+    raise ValueError("failed")
+
+try:
+    fail_with_payload(1)
+    assert False, "ExecutionError is expected"
+except trace.ExecutionError as e:
+    exception_node = e.exception_node
+gc.collect()
+assert payloads[0]() is None
+assert "fail_with_payload" in exception_node.info["traceback"]
+assert 'raise ValueError("failed") <--- (ValueError) failed.' in exception_node.info["error_comment"]
+
+
+# Test that external dependencies are detected by identity, not by value
+x, y = node(1), node(1)
+
+@trace.bundle(allow_external_dependencies=True)
+def add_y(x):
+    return x + y.data
+
+output = add_y(x)
+assert output == 2
+assert len(output.info["external_dependencies"]) == 1 and output.info["external_dependencies"][0] is y
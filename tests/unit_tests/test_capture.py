@@ -0,0 +1,118 @@
+from opto import trace
+from opto.trace.capture import CapturedGraph
+from opto.trace.utils import contain
+
+
+def shape(n):
+    return (n.name.split(":")[0], n.data, [shape(p) for p in n.parents])
+
+
+@trace.model
+class Agent:
+    def __init__(self):
+        self.prefix = trace.node("Answer: ", trainable=True)
+
+    @trace.bundle(trainable=True)
+    def think(self, q):
+        return q.upper()
+
+    def forward(self, q):
+        y = self.think(q)
+        z = self.prefix + y
+        return z + "!"
+
+
+# The replayed graph is the same as the one created by running forward
+agent = Agent()
+captured = trace.capture(agent)
+output = captured("hi")
+assert output.data == "Answer: HI!"
+assert isinstance(captured._graphs[None], CapturedGraph)
+replayed = captured("yo")
+eager = agent(trace.node("yo"))
+assert replayed.data == eager.data == "Answer: YO!"
+assert shape(replayed) == shape(eager)
+assert contain(replayed.parameter_dependencies, agent.prefix)
+assert contain(replayed.parameter_dependencies, agent.think.parameter)
+
+# The constant "!" is recreated in each replay
+constants = [p for p in replayed.parents if p.data == "!"]
+assert len(constants) == 1 and not contain(output.parents, constants[0])
+
+# Feedback propagates through the replayed graph
+replayed.backward("good")
+assert len(agent.prefix.feedback) > 0
+agent.prefix.zero_feedback()
+
+# The replay uses the current code of trainable operators
+code = agent.think.parameter
+code._set(code.data.replace("q.upper()", "q.lower()"))
+assert captured("HEY").data == "Answer: hey!"
+
+
+# A graph is captured for each key of the guard
+@trace.model
+class Branch:
+    def forward(self, x):
+        if x.data > 0:
+            return x + 1
+        return x - 1
+
+
+branch = Branch()
+captured = trace.capture(branch, guard=lambda x: x.data > 0)
+assert captured(1).data == 2
+assert captured(-1).data == -2
+assert captured(5).data == 6
+assert captured(-5).data == -6
+assert set(captured._graphs) == {True, False}
+
+# Without a guard, a forward reading the data of its inputs is run eagerly
+captured = trace.capture(branch)
+assert captured(1).data == 2
+assert captured._graphs[None] is None
+assert captured(-1).data == -2
+
+
+@trace.model
+class Length:
+    @trace.bundle()
+    def double(self, n):
+        return 2 * n
+
+    def forward(self, x):
+        return self.double(len(x.data))
+
+
+captured = trace.capture(Length())
+assert captured("ab").data == 4
+assert captured("abcd").data == 8  # len(x.data) is not replayed as a constant
+
+
+# A replayed call raising an exception falls back to running forward eagerly
+@trace.bundle()
+def invert(x):
+    return 1 / x
+
+
+@trace.model
+class Inverse:
+    def forward(self, x):
+        return invert(x)
+
+
+captured = trace.capture(Inverse())
+assert captured(2).data == 0.5
+try:
+    captured(0)
+except trace.ExecutionError as e:
+    assert "ZeroDivisionError" in str(e.exception_node.data)
+else:
+    raise AssertionError("ExecutionError is not raised")
+assert captured(4).data == 0.25
+
+# Without tracing, forward is run directly
+with trace.stop_tracing():
+    assert captured(4).data == 0.25
+with trace.inference_mode():
+    assert captured(4) == 0.25
@@ -144,6 +144,20 @@ def test_case_model_nested_copy():
     assert len(y1.parents) == 3  # since it's trainable
     assert len(y2.parents) == 3
 
+def test_case_bound_versions_share_function():
+    m1 = Model()
+    m2 = Model()
+    # the instance versions share the function and its info with the class' version
+    assert m1.forward._fun is m2.forward._fun is Model.forward._fun
+    assert m1.forward.info is m2.forward.info is Model.forward.info
+    # but the trainable code is specific to each instance
+    m1.forward.parameter._set("def forward(self, x):\n    return x + 2")
+    assert m1.forward(1) == 3
+    assert m2.forward(1) == 2
+    assert Model.forward.parameter.data != m1.forward.parameter.data
+
+
 test_case_two_models()
+test_case_bound_versions_share_function()
 test_case_model_copy()
 test_case_model_nested_copy()
\ No newline at end of file
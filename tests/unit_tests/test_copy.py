@@ -27,4 +27,20 @@ try:
     copy.deepcopy(llm)
 except FileNotFoundError as e:
     print(f'Error: {e}')
-    print('Omit the test.')
\ No newline at end of file
+    print('Omit the test.')
+
+# Nodes use __slots__; deepcopy and pickle should preserve the data but not the graph
+import pickle
+from opto.trace.nodes import ParameterNode, MessageNode
+
+x = trace.node(1, trainable=True)
+y = MessageNode(2, inputs=[x], description="[add] Add one to x.")
+for z in (copy.deepcopy(y), pickle.loads(pickle.dumps(y))):
+    assert type(z) is MessageNode
+    assert z.data == 2 and z.description == y.description
+    assert len(z.parameter_dependencies) == 1
+    assert not hasattr(z, "__dict__")
+assert len(copy.deepcopy(y).parents) == 0
+z = pickle.loads(pickle.dumps(x))
+assert type(z) is ParameterNode and z.data == 1 and z.trainable
+assert z in z.parameter_dependencies
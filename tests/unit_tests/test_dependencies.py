@@ -124,3 +124,77 @@ tg.expand(x).visualize() # this shows the bottom level graph
 assert len(x.expandable_dependencies) == 1
 x = list(x.info['output'].expandable_dependencies)[0]
 tg.expand(x).visualize() # this shows the bottom level graph
+
+# %%
+### parameter dependencies are tracked as bitsets of parameter indices
+import copy
+import gc
+import pickle
+from opto.trace.nodes import PARAMETER_INDEX
+
+params = [node(float(i), trainable=True) for i in range(100)]
+z = params[0]
+for p in params[1:]:
+    z = z + p
+assert len(z.parameter_dependencies) == 100
+assert all(contain(z.parameter_dependencies, p) for p in params)
+
+# copies depend on the copies of the parameters
+w = copy.deepcopy(z)
+assert len(w.parameter_dependencies) == 100
+assert not any(contain(w.parameter_dependencies, p) for p in params)
+w = pickle.loads(pickle.dumps(node(1., trainable=True)))
+assert contain(w.parameter_dependencies, w)
+
+# indices of garbage-collected parameters are reused
+del params, p, z, w
+gc.collect()
+n_indices = len(PARAMETER_INDEX._refs)
+x = node(1., trainable=True)
+y = x + 1
+assert len(PARAMETER_INDEX._refs) == n_indices
+assert len(y.parameter_dependencies) == 1 and contain(y.parameter_dependencies, x)
+
+# parameters created concurrently get distinct indices
+import threading
+
+def create_parameters(out):
+    out.extend(node(float(i), trainable=True) for i in range(200))
+
+created = [[] for _ in range(8)]
+threads = [threading.Thread(target=create_parameters, args=(out,)) for out in created]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+created = [p for out in created for p in out]
+assert len({p._get_parameter_index() for p in created}) == len(created)
+
+
+# %%
+### hidden dependencies are cached per node
+x = node(1.)
+hidden_param = node(-15., trainable=True)
+
+@bundle(traceable_code=True)
+def inner_function(x):
+    return x**2 + hidden_param
+
+@bundle(traceable_code=True)
+def middle_function(x):
+    return inner_function(x) + 1
+
+@bundle(traceable_code=True)
+def outer_function(x):
+    return middle_function(x) + 2
+
+output = outer_function(x)
+assert output.hidden_dependencies == {hidden_param}
+assert output.hidden_dependencies is output.hidden_dependencies
+
+# the cache is computed again when the info dict is replaced, even if it records the same output
+info = output._info
+output._info = dict(info, inputs={"args": [1.], "kwargs": {}})  # the inputs are not nodes, so the output is not traceable
+assert output.hidden_dependencies == set()
+output._info = info
+assert output.hidden_dependencies == {hidden_param}
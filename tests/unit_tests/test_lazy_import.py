@@ -0,0 +1,23 @@
+import subprocess
+import sys
+
+# Importing Trace and the optimizers should not import the heavy optional dependencies.
+code = """
+import sys
+import opto.trace
+import opto.optimizers
+from opto.utils.llm import LLM
+heavy = [name for name in ["litellm", "openai", "autogen", "black", "graphviz"] if name in sys.modules]
+assert not heavy, heavy
+"""
+result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+assert result.returncode == 0, result.stderr
+assert result.stdout == "", result.stdout  # the LLM backend is not printed
+
+# The modules are imported on first use.
+from opto.utils.lazy_import import LazyModule
+
+json = LazyModule("json")
+assert json._module is None
+assert json.loads("[1]") == [1]
+assert json._module is sys.modules["json"]
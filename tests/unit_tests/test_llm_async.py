@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from opto.utils.llm import AbstractModel, CustomLLM, LiteLLM
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """An OpenAI-compatible chat completion endpoint which echoes the last message after a delay."""
+
+    delay = 0.05
+    lock = threading.Lock()
+    n_requests = 0
+    n_running = 0
+    max_running = 0
+
+    def do_POST(self):
+        cls = type(self)
+        with cls.lock:
+            cls.n_requests += 1
+            cls.n_running += 1
+            cls.max_running = max(cls.max_running, cls.n_running)
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(cls.delay)
+        body = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "echo: " + request["messages"][-1]["content"]},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with cls.lock:
+            cls.n_running -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+def reset_stub():
+    StubHandler.n_requests = StubHandler.n_running = StubHandler.max_running = 0
+
+
+def messages(i):
+    return [{"role": "user", "content": f"question {i}"}]
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+server.daemon_threads = True
+threading.Thread(target=server.serve_forever, daemon=True).start()
+base_url = f"http://127.0.0.1:{server.server_port}/v1"
+
+try:
+    # CustomLLM sends concurrent requests through AsyncOpenAI.
+    os.environ["TRACE_CUSTOMLLM_URL"] = base_url
+    os.environ["TRACE_CUSTOMLLM_API_KEY"] = "sk-stub"
+    llm = CustomLLM(model="stub-model", cache=False)
+    response = llm(messages=messages(0))
+    assert response.choices[0].message.content == "echo: question 0"
+
+    async def run(llm, n):
+        return await asyncio.gather(*[llm.acall(messages=messages(i)) for i in range(n)])
+
+    reset_stub()
+    responses = asyncio.run(run(llm, 20))
+    assert [r.choices[0].message.content for r in responses] == [f"echo: question {i}" for i in range(20)]
+    assert StubHandler.n_requests == 20
+    assert StubHandler.max_running > 1  # the requests are not sent one by one
+
+    # A new event loop uses a new client.
+    responses = asyncio.run(run(llm, 2))
+    assert responses[1].choices[0].message.content == "echo: question 1"
+
+    response = asyncio.run(llm.acreate(messages=messages(3)))
+    assert response.choices[0].message.content == "echo: question 3"
+
+    # The responses of async calls are cached.
+    llm = CustomLLM(model="stub-model", cache=True, cache_sampled=True)
+    reset_stub()
+    asyncio.run(run(llm, 3))
+    asyncio.run(run(llm, 3))
+    assert llm(messages=messages(2)).choices[0].message.content == "echo: question 2"
+    assert StubHandler.n_requests == 3
+
+    # LiteLLM uses litellm.acompletion.
+    llm = LiteLLM(model="openai/stub-model", cache=False)
+    reset_stub()
+    response = asyncio.run(llm.acall(messages=messages(4), api_base=base_url, api_key="sk-stub"))
+    assert response.choices[0].message.content == "echo: question 4"
+    assert StubHandler.n_requests == 1
+finally:
+    os.environ.pop("TRACE_CUSTOMLLM_URL")
+    os.environ.pop("TRACE_CUSTOMLLM_API_KEY")
+    server.shutdown()
+    server.server_close()
+
+# Models without an async client are called in threads.
+calls = []
+
+
+def slow_model(*args, **kwargs):
+    calls.append(threading.get_ident())
+    time.sleep(0.05)
+    return {"messages": kwargs["messages"]}
+
+
+llm = AbstractModel(lambda: slow_model)
+assert llm.async_model is None
+
+
+async def run_sync_model(n):
+    return await asyncio.gather(*[llm.acall(messages=messages(i)) for i in range(n)])
+
+
+responses = asyncio.run(run_sync_model(4))
+assert [r["messages"] for r in responses] == [messages(i) for i in range(4)]
+assert threading.get_ident() not in calls
@@ -0,0 +1,164 @@
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+
+from opto.utils.llm import AbstractModel
+from opto.utils.llm_cache import LRUCache, SQLiteCache, TieredCache, cache_key, is_cacheable
+
+
+class CountingModel:
+    """A fake backend which returns the number of calls made so far."""
+
+    def __init__(self):
+        self.n_calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.n_calls += 1
+        return {"response": self.n_calls}
+
+
+messages = [{"role": "user", "content": "Hello world."}]
+
+# The same requests are sent to the backend once.
+backend = CountingModel()
+llm = AbstractModel(lambda: backend, cache=True)
+assert llm(messages=messages, temperature=0) == {"response": 1}
+assert llm(messages=messages, temperature=0) == {"response": 1}
+assert llm(messages=messages, temperature=0, max_tokens=10) == {"response": 2}
+assert llm(messages=[{"role": "user", "content": "Hi."}], temperature=0) == {"response": 3}
+assert backend.n_calls == 3
+
+# Without a cache, every request is sent.
+backend = CountingModel()
+llm = AbstractModel(lambda: backend)
+llm(messages=messages)
+llm(messages=messages)
+assert backend.n_calls == 2
+
+# Sampled requests are cached only if a seed is given, or if cache_sampled is True.
+backend = CountingModel()
+llm = AbstractModel(lambda: backend, cache=True)
+llm(messages=messages, temperature=0.7)
+llm(messages=messages, temperature=0.7)
+assert backend.n_calls == 2
+llm(messages=messages, temperature=0.7, seed=0)
+llm(messages=messages, temperature=0.7, seed=0)
+assert backend.n_calls == 3
+llm(messages=messages, temperature=0)
+llm(messages=messages, temperature=0)
+assert backend.n_calls == 4
+llm(messages=messages)  # the default temperature of the provider is used
+llm(messages=messages)
+assert backend.n_calls == 6
+assert not is_cacheable({"messages": messages})
+assert not is_cacheable({"n": 3})
+assert not is_cacheable({"stream": True, "seed": 0})
+assert is_cacheable({"temperature": 1.0}, cache_sampled=True)
+
+# The keys depend on the model, the messages and the sampling parameters, but not on the order of the arguments.
+assert cache_key("gpt-4o", (), {"messages": messages, "max_tokens": 10}) == cache_key(
+    "gpt-4o", (), {"max_tokens": 10, "messages": messages}
+)
+assert cache_key("gpt-4o", (), {"messages": messages}) != cache_key("gpt-4o-mini", (), {"messages": messages})
+
+# The same model name served by different backends or servers has different keys.
+assert cache_key("gpt-4o", (), {"messages": messages}, "LiteLLM") != cache_key("gpt-4o", (), {"messages": messages}, "CustomLLM")
+assert cache_key("gpt-4o", (), {"messages": messages}, "CustomLLM", "http://a:4000") != cache_key(
+    "gpt-4o", (), {"messages": messages}, "CustomLLM", "http://b:4000"
+)
+
+
+class Served(AbstractModel):
+    def __init__(self, backend, base_url):
+        self.model_name = "served-model"
+        self.base_url = base_url
+        super().__init__(lambda: backend, cache=shared_cache)
+
+
+shared_cache = LRUCache()
+first, second = CountingModel(), CountingModel()
+assert Served(first, "http://a:4000")(messages=messages, temperature=0) == {"response": 1}
+assert Served(second, "http://b:4000")(messages=messages, temperature=0) == {"response": 1}
+assert first.n_calls == second.n_calls == 1
+
+# Requests which are not JSON serializable are not cached, since repr() may contain memory addresses.
+assert cache_key("gpt-4o", (), {"messages": messages, "client": object()}) is None
+backend = CountingModel()
+llm = AbstractModel(lambda: backend, cache=True)
+llm(messages=messages, temperature=0, metadata=object())
+llm(messages=messages, temperature=0, metadata=object())
+assert backend.n_calls == 2
+
+# The LRU cache removes the least recently used responses and the expired ones.
+cache = LRUCache(maxsize=2)
+cache.set("a", 1)
+cache.set("b", 2)
+assert cache.get("a") == 1
+cache.set("c", 3)
+assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+assert len(cache) == 2
+cache = pickle.loads(pickle.dumps(cache))
+assert cache.get("a") == 1
+
+cache = LRUCache(ttl=0.05)
+cache.set("a", 1)
+assert cache.get("a") == 1
+time.sleep(0.1)
+assert cache.get("a") is None
+
+
+write_responses = """
+import sys
+from opto.utils.llm_cache import SQLiteCache
+cache = SQLiteCache(sys.argv[1])
+start = int(sys.argv[2])
+for i in range(start, start + 50):
+    cache.set(str(i), {"response": i})
+"""
+
+with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join(directory, "cache", "responses.db")
+
+    # The on-disk cache persists across instances.
+    backend = CountingModel()
+    llm = AbstractModel(lambda: backend, cache=path)
+    assert llm(messages=messages, temperature=0) == {"response": 1}
+    backend = CountingModel()
+    llm = AbstractModel(lambda: backend, cache=path)
+    assert llm(messages=messages, temperature=0) == {"response": 1}
+    assert backend.n_calls == 0
+
+    # A response found on disk is copied to memory.
+    memory = LRUCache()
+    cache = TieredCache(memory, SQLiteCache(path))
+    key = cache_key(None, (), {"messages": messages, "temperature": 0}, "opto.utils.llm.AbstractModel")
+    assert cache.get(key) == {"response": 1}
+    assert memory.get(key) == {"response": 1}
+
+    # The least recently used responses are removed.
+    cache = SQLiteCache(os.path.join(directory, "bounded.db"), max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    time.sleep(0.01)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    assert len(cache) == 2
+
+    cache = SQLiteCache(os.path.join(directory, "expiring.db"), ttl=0.05)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+    # Concurrent processes can write to the same cache.
+    path = os.path.join(directory, "shared.db")
+    cache = SQLiteCache(path)
+    processes = [subprocess.Popen([sys.executable, "-c", write_responses, path, str(50 * i)]) for i in range(4)]
+    assert all(p.wait() == 0 for p in processes)
+    assert len(cache) == 200
+    assert cache.get("123") == {"response": 123}
@@ -0,0 +1,101 @@
+import os
+from types import SimpleNamespace
+
+from opto.optimizers import OptoPrime, OptoPrimeMulti
+from opto.trace import node
+from opto.utils.llm import AbstractModel, CustomLLM, LiteLLM
+
+
+class NoJSONModel(AbstractModel):
+    """A fake backend which rejects the JSON mode and the sampling of several responses."""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.requests = []
+        super().__init__(lambda: self.complete)
+
+    def complete(self, messages, **kwargs):
+        self.requests.append(kwargs)
+        if "response_format" in kwargs:
+            raise ValueError("response_format is not supported.")
+        if kwargs.get("n", 1) > 1:
+            raise ValueError("n > 1 is not supported.")
+        message = SimpleNamespace(content='{"reasoning": "", "suggestion": {}}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+# The capabilities are unknown until they are probed or remembered.
+llm = NoJSONModel("no-json-model")
+assert llm.supports("json_mode") is None
+assert llm.supports("async") is False
+try:
+    llm.supports("telepathy")
+    raise AssertionError("The capability is not checked.")
+except ValueError:
+    pass
+
+# The optimizer remembers that the JSON mode is rejected, so the next steps do not try it.
+optimizer = OptoPrime([node(1, trainable=True)], llm=llm)
+optimizer.call_llm("system", "user")
+assert len(llm.requests) == 2
+assert llm.supports("json_mode") is False
+optimizer.call_llm("system", "user")
+assert len(llm.requests) == 3 and "response_format" not in llm.requests[-1]
+
+# The capabilities are shared by the models of the same backend with the same name.
+llm = NoJSONModel("no-json-model")
+optimizer = OptoPrime([node(1, trainable=True)], llm=llm)
+optimizer.call_llm("system", "user")
+assert len(llm.requests) == 1
+assert NoJSONModel("other-model").supports("json_mode") is None
+assert type("OtherBackend", (NoJSONModel,), {})("no-json-model").supports("json_mode") is None
+
+# The same model served by different servers does not share the capabilities.
+os.environ["TRACE_CUSTOMLLM_URL"] = "http://127.0.0.1:4000/v1"
+local = CustomLLM(model="served-model")
+local.set_supports("json_mode", False)
+assert CustomLLM(model="served-model").supports("json_mode") is False
+os.environ["TRACE_CUSTOMLLM_URL"] = "http://127.0.0.1:4001/v1"
+assert CustomLLM(model="served-model").supports("json_mode") is None
+os.environ.pop("TRACE_CUSTOMLLM_URL")
+
+# Several responses are sampled one by one if n > 1 is not supported.
+llm.set_supports("n", False)
+optimizer = OptoPrimeMulti([node(1, trainable=True)], llm=llm)
+responses = optimizer.call_llm("system", "user", num_responses=3, temperature=1.0)
+assert len(responses) == 3
+assert len(llm.requests) == 4 and all("n" not in kwargs for kwargs in llm.requests[1:])
+
+# Other errors are raised, and the JSON mode is not disabled.
+class FailingModel(NoJSONModel):
+    def complete(self, messages, **kwargs):
+        self.requests.append(kwargs)
+        raise ValueError("Invalid API key.")
+
+
+llm = FailingModel("failing-model")
+optimizer = OptoPrime([node(1, trainable=True)], llm=llm)
+try:
+    optimizer._call_llm_json([{"role": "user", "content": "user"}])
+    raise AssertionError("The error is not raised.")
+except ValueError:
+    pass
+assert len(llm.requests) == 1 and llm.supports("json_mode") is None
+
+
+# LLMs which are not AbstractModels are supported.
+def plain_llm(messages, **kwargs):
+    message = SimpleNamespace(content='{"reasoning": "", "suggestion": {}}')
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+optimizer = OptoPrime([node(1, trainable=True)], llm=plain_llm)
+assert optimizer.call_llm("system", "user") == '{"reasoning": "", "suggestion": {}}'
+optimizer = OptoPrimeMulti([node(1, trainable=True)], llm=plain_llm)
+assert len(optimizer.call_llm("system", "user", num_responses=2)) == 1
+
+# LiteLLM probes the capabilities of the models that it knows.
+llm = LiteLLM(model="gpt-4o")
+assert llm.supports("json_mode") and llm.supports("n") and llm.supports("streaming")
+assert llm.supports("structured_outputs") and llm.supports("async")
+assert LiteLLM(model="ollama/llama2").supports("n") is False
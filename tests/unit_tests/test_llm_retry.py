@@ -0,0 +1,224 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from opto.optimizers import TextGrad
+from opto.trace import node
+from opto.utils.llm import AbstractModel, CustomLLM, LiteLLM
+from opto.utils.llm_retry import RetryPolicy, is_retryable, retry_after
+from opto.utils.llm_scheduler import LLMScheduler
+
+
+class FaultyHandler(BaseHTTPRequestHandler):
+    """An OpenAI-compatible chat completion endpoint which injects the faults listed in `faults`.
+
+    Each request takes the next fault: an HTTP status code to return an error, a number of seconds to
+    delay the response, or None to respond immediately.
+    """
+
+    faults = []
+    n_requests = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        cls = type(self)
+        with cls.lock:
+            cls.n_requests += 1
+            fault = cls.faults.pop(0) if cls.faults else None
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if isinstance(fault, int):
+            body = json.dumps({"error": {"message": "injected fault", "type": "server_error", "code": fault}})
+            self.send_response(fault)
+            self.send_header("Retry-After", "0")
+        else:
+            if fault is not None:
+                time.sleep(fault)
+            body = json.dumps({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+            })
+            self.send_response(200)
+        body = body.encode()
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def inject(*faults):
+    FaultyHandler.faults = list(faults)
+    FaultyHandler.n_requests = 0
+
+
+messages = [{"role": "user", "content": "Hello world."}]
+server = ThreadingHTTPServer(("127.0.0.1", 0), FaultyHandler)
+server.daemon_threads = True
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+try:
+    os.environ["TRACE_CUSTOMLLM_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ["TRACE_CUSTOMLLM_API_KEY"] = "sk-stub"
+
+    # Rate limits and server errors are retried.
+    retry = RetryPolicy(max_retries=3, backoff=0.01)
+    llm = CustomLLM(model="stub-model", cache=False, retry=retry)
+    inject(429, 503)
+    assert llm(messages=messages).choices[0].message.content == "ok"
+    assert FaultyHandler.n_requests == 3
+    metrics = retry.metrics()
+    assert metrics["retries"] == 2 and metrics["failures"] == 0
+    assert metrics["retries_by_error"] == {"RateLimitError": 1, "InternalServerError": 1}
+
+    # Invalid requests are not retried.
+    inject(400)
+    try:
+        llm(messages=messages)
+        raise AssertionError("The error is not raised.")
+    except Exception as e:
+        assert not is_retryable(e)
+        assert retry_after(e) == 0
+    assert FaultyHandler.n_requests == 1
+
+    # A request is retried at most max_retries times.
+    inject(500, 500, 500, 500, 500)
+    try:
+        llm(messages=messages)
+        raise AssertionError("The error is not raised.")
+    except Exception as e:
+        assert is_retryable(e)
+    assert FaultyHandler.n_requests == 4
+    assert retry.metrics()["failures"] == 2
+
+    # A slow attempt is abandoned after the timeout and retried.
+    retry = RetryPolicy(backoff=0.01, timeout=0.3)
+    llm = CustomLLM(model="stub-model", cache=False, retry=retry)
+    inject(2.0)
+    start = time.monotonic()
+    assert llm(messages=messages).choices[0].message.content == "ok"
+    assert time.monotonic() - start < 1.5
+    assert retry.metrics()["timeouts"] == 1
+
+    inject(2.0)
+    start = time.monotonic()
+    assert asyncio.run(llm.acall(messages=messages)).choices[0].message.content == "ok"
+    assert time.monotonic() - start < 1.5
+    assert retry.metrics()["timeouts"] == 2
+
+    # A request slower than the recent ones is hedged.
+    retry = RetryPolicy(hedge_percentile=90, min_samples=10)
+    llm = CustomLLM(model="stub-model", cache=False, retry=retry)
+    inject()
+    for _ in range(10):
+        llm(messages=messages)
+    inject(2.0)
+    start = time.monotonic()
+    assert llm(messages=messages).choices[0].message.content == "ok"
+    assert time.monotonic() - start < 1.5
+    metrics = retry.metrics()
+    assert metrics["hedges"] == 1 and metrics["hedge_wins"] == 1
+
+    inject(2.0)
+    start = time.monotonic()
+    assert asyncio.run(llm.acall(messages=messages)).choices[0].message.content == "ok"
+    assert time.monotonic() - start < 1.5
+    assert retry.metrics()["hedge_wins"] == 2
+finally:
+    os.environ.pop("TRACE_CUSTOMLLM_URL")
+    os.environ.pop("TRACE_CUSTOMLLM_API_KEY")
+    server.shutdown()
+    server.server_close()
+
+
+# The errors are classified without importing the clients.
+class RateLimitError(Exception):
+    pass
+
+
+assert is_retryable(RateLimitError())
+assert is_retryable(TimeoutError())
+assert is_retryable(ConnectionResetError())
+assert not is_retryable(ValueError())
+
+# The retries stop at the deadline of the request.
+n_calls = 0
+
+
+def flaky_model(*args, **kwargs):
+    global n_calls
+    n_calls += 1
+    raise ConnectionError("injected fault")
+
+
+retry = RetryPolicy(max_retries=100, backoff=0.1, max_backoff=0.1, deadline=0.5)
+llm = AbstractModel(lambda: flaky_model, retry=retry)
+start = time.monotonic()
+try:
+    llm(messages=messages)
+    raise AssertionError("The error is not raised.")
+except ConnectionError:
+    pass
+assert time.monotonic() - start < 1.0
+assert 1 < n_calls < 100
+
+# Without a retry policy, errors are raised at once.
+n_calls = 0
+llm = AbstractModel(lambda: flaky_model)
+try:
+    llm(messages=messages)
+except ConnectionError:
+    pass
+assert n_calls == 1
+
+# An abandoned attempt gives its slot of the scheduler back, so the retry is not blocked by it.
+hang = threading.Event()
+n_calls = 0
+
+
+def hanging_model(*args, **kwargs):
+    global n_calls
+    n_calls += 1
+    if n_calls == 1:
+        hang.wait()  # the first request hangs
+    return {"response": n_calls}
+
+
+scheduler = LLMScheduler(max_in_flight=1)
+llm = AbstractModel(lambda: hanging_model, scheduler=scheduler, retry=RetryPolicy(backoff=0.01, timeout=0.3))
+assert llm(messages=messages) == {"response": 2}
+assert scheduler.metrics()["in_flight"] == 0
+hang.set()  # the abandoned attempt finishes, and its slot is not released twice
+time.sleep(0.1)
+assert scheduler.metrics()["in_flight"] == 0
+
+# Retries are opt-in for the backends.
+assert AbstractModel(lambda: flaky_model).retry is None
+assert CustomLLM(model="stub-model").retry is None
+assert LiteLLM(model="stub-model").retry is None
+
+# TextGrad calls the model, so it works with backends without `create` and uses their retry policy.
+n_calls = 0
+
+
+def recovering_model(*args, **kwargs):
+    global n_calls
+    n_calls += 1
+    if n_calls == 1:
+        raise ConnectionError("injected fault")
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="improved"))])
+
+
+llm = AbstractModel(lambda: recovering_model, retry=RetryPolicy(backoff=0.01))
+assert not hasattr(llm, "create")
+optimizer = TextGrad([node("prompt", trainable=True)], llm=llm)
+assert optimizer.call_llm("system prompt", "user prompt") == "improved"
+assert n_calls == 2
@@ -0,0 +1,127 @@
+import asyncio
+import pickle
+import threading
+import time
+
+from opto.optimizers.optimizer import Optimizer
+from opto.trace import node
+from opto.utils.llm import AbstractModel
+from opto.utils.llm_scheduler import (
+    HIGH_PRIORITY,
+    LOW_PRIORITY,
+    LLM_PRIORITY,
+    LLMScheduler,
+    estimate_tokens,
+    llm_priority,
+    used_tokens,
+)
+
+# Waiting calls are started by priority, and then by arrival.
+scheduler = LLMScheduler(max_in_flight=1)
+slot = scheduler.acquire()
+started = []
+
+
+def call(name, priority):
+    s = scheduler.acquire(priority=priority)
+    started.append(name)
+    scheduler.release(s)
+
+
+threads = []
+for name, priority in [("low 1", LOW_PRIORITY), ("low 2", LOW_PRIORITY), ("high", HIGH_PRIORITY)]:
+    threads.append(threading.Thread(target=call, args=(name, priority)))
+    threads[-1].start()
+    time.sleep(0.05)
+metrics = scheduler.metrics()
+assert metrics["in_flight"] == 1 and metrics["queue_depth"] == 3
+assert metrics["lanes"][LOW_PRIORITY]["queue_depth"] == 2
+scheduler.release(slot)
+for t in threads:
+    t.join()
+assert started == ["high", "low 1", "low 2"]
+metrics = scheduler.metrics()
+assert metrics["in_flight"] == 0 and metrics["queue_depth"] == 0
+assert metrics["lanes"][LOW_PRIORITY]["started"] == 2
+assert metrics["lanes"][LOW_PRIORITY]["max_wait"] >= 0.1
+
+# The rate of requests is limited, after a burst of one minute's budget.
+scheduler = LLMScheduler(requests_per_minute=120)
+for _ in range(120):
+    scheduler.release(scheduler.acquire())
+start = time.monotonic()
+scheduler.release(scheduler.acquire())
+assert 0.3 < time.monotonic() - start < 2
+
+# The tokens of a call are estimated, and corrected with the usage of the response.
+messages = [{"role": "user", "content": "a" * 400}]
+assert estimate_tokens({"messages": messages, "max_tokens": 50}) == 150
+assert used_tokens({"usage": {"total_tokens": 30}}) == 30
+assert used_tokens("text") is None
+scheduler = LLMScheduler(tokens_per_minute=6000)
+scheduler.release(scheduler.acquire(tokens=6000), tokens=3000)
+start = time.monotonic()
+scheduler.release(scheduler.acquire(tokens=2000))
+assert time.monotonic() - start < 0.2
+scheduler = pickle.loads(pickle.dumps(scheduler))
+assert scheduler.metrics()["in_flight"] == 0
+
+# Models wait for the scheduler, in sync and async calls.
+running, max_running = 0, 0
+
+
+async def async_model(*args, **kwargs):
+    global running, max_running
+    running += 1
+    max_running = max(max_running, running)
+    await asyncio.sleep(0.02)
+    running -= 1
+    return {"choices": [], "usage": {"total_tokens": 10}}
+
+
+scheduler = LLMScheduler(max_in_flight=2, tokens_per_minute=100_000)
+llm = AbstractModel(lambda: lambda **kwargs: {"usage": {"total_tokens": 10}},
+                    async_factory=lambda: async_model, scheduler=scheduler)
+
+
+async def run(n):
+    return await asyncio.gather(*[llm.acall(messages=messages) for _ in range(n)])
+
+
+asyncio.run(run(10))
+assert max_running == 2
+llm(messages=messages)
+assert scheduler.metrics()["lanes"][LLM_PRIORITY.get()]["started"] == 11
+assert scheduler.tokens.level > 100_000 - 11 * 10 - 1  # the usage replaces the estimates
+
+
+# A cancelled call leaves the queue.
+async def cancel():
+    slot = await scheduler.aacquire()
+    slot2 = await scheduler.aacquire()
+    task = asyncio.ensure_future(scheduler.aacquire())
+    await asyncio.sleep(0.01)
+    assert scheduler.metrics()["queue_depth"] == 1
+    task.cancel()
+    await asyncio.sleep(0.01)
+    assert scheduler.metrics()["queue_depth"] == 0
+    scheduler.release(slot)
+    scheduler.release(slot2)
+
+
+asyncio.run(cancel())
+assert scheduler.metrics()["in_flight"] == 0
+
+
+# The calls of the optimizers have a high priority.
+class DummyOptimizer(Optimizer):
+    def _step(self):
+        self.priority = LLM_PRIORITY.get()
+        return {}
+
+
+optimizer = DummyOptimizer([node(1, trainable=True)])
+with llm_priority(LOW_PRIORITY):
+    optimizer.step()
+    assert LLM_PRIORITY.get() == LOW_PRIORITY
+assert optimizer.priority == HIGH_PRIORITY
@@ -1,5 +1,6 @@
 from opto.trace.modules import Module, model
 from opto.trace.nodes import node
+from opto.trace.containers import ParameterContainer
 from opto.trace.bundle import bundle
 import os
 import pickle
@@ -153,3 +154,51 @@ child = ChildClass()
 result = child.forward(1)
 assert result._data == 2
 
+
+# Test that parameters exposed by properties are collected, as inspect.getmembers does
+@model
+class ModelWithProperty:
+    def __init__(self):
+        self.prompt = node("prompt", trainable=True)
+        self._hidden = node("hidden", trainable=True)
+
+    @property
+    def hidden(self):
+        return self._hidden
+
+    @property
+    def missing(self):
+        raise AttributeError("properties raising AttributeError are skipped")
+
+    def method(self):
+        raise AssertionError("methods should not be evaluated")
+
+    @bundle(trainable=True)
+    def act(self, x):
+        return x
+
+    def forward(self, x):
+        return self.act(x)
+
+m = ModelWithProperty()
+assert list(m.parameters_dict().keys()) == ["_hidden", "act", "hidden", "prompt"]
+assert m.parameters_dict()["hidden"] is m._hidden
+m.other_prompt = node("other prompt", trainable=True)  # parameters added later are found
+assert len(m.parameters()) == 5
+del m.other_prompt
+assert len(m.parameters()) == 4
+ModelWithProperty.shared = node("shared", trainable=True)  # also class attributes assigned after a call
+assert "shared" in m.parameters_dict()
+del ModelWithProperty.shared
+
+
+# Test that the parameters of containers with __slots__ are collected
+class SlottedContainer(ParameterContainer):
+    __slots__ = ("prompt", "unset")
+
+    def __init__(self):
+        self.prompt = node("slotted", trainable=True)
+
+slotted = SlottedContainer()
+assert not hasattr(slotted, "__dict__")
+assert slotted.parameters_dict() == {"prompt": slotted.prompt}
@@ -159,3 +159,42 @@ x = node(np.array([1, 2, 3]))
 for i, v in enumerate(x):
    assert isinstance(v, type(x))
    assert v.data == x.data[i]
+
+# Graph session: the graph created within the session can be garbage-collected
+import gc
+import weakref
+from opto import trace
+from opto.trace.nodes import GRAPH
+
+x = node(1, name="x_session", trainable=True)
+refs = []
+for i in range(3):
+    with trace.graph_session():
+        y = x + 1
+        z = y * 2
+        assert contain(x.children, y)
+    assert len(x.children) == 0  # edges to the session graph are removed
+    assert z.parents[0] is y and y.parents[0] is x  # the graph within the session is intact
+    refs.append(weakref.ref(y))
+del y, z
+gc.collect()
+assert all(r() is None for r in refs)
+assert GRAPH.get(x.name) is x
+collected = node(1, name="collected")
+collected_name = collected.name
+n_nodes = len(GRAPH)
+del collected
+gc.collect()
+assert len(GRAPH) == n_nodes  # collected nodes are still counted as registered
+try:
+    GRAPH.get(collected_name)
+    assert False, "KeyError is expected"
+except KeyError as e:
+    assert "garbage-collected" in str(e)
+try:
+    GRAPH.get("never_registered:0")
+    assert False, "KeyError is expected"
+except KeyError as e:
+    assert "no node named" in str(e)
+names = [node(i, name="unique").name for i in range(3)]
+assert len(set(names)) == 3
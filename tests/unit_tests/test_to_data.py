@@ -39,4 +39,30 @@ def test_node_over_container_over_container_over_node():
 test_node_over_container_over_container_over_node()
 simple_test_unnested()
 simple_test_node_over_container()
-simple_test_container_over_node()
\ No newline at end of file
+simple_test_container_over_node()
+
+def test_structure_sharing():
+    # containers without nodes are returned as they are
+    documents = [{"id": i, "tags": ("a", "b"), "meta": {"rank": i}} for i in range(3)]
+    assert to_data(documents) is documents
+    # only the containers with nodes are rebuilt
+    documents.append({"id": 3, "score": node(0.5)})
+    output = to_data(documents)
+    assert output is not documents and output[3] is not documents[3]
+    assert output[3] == {"id": 3, "score": 0.5}
+    assert all(output[i] is documents[i] for i in range(3))
+    assert to_data((node(1), [2, node(3)], {node(4)})) == (1, [2, 3], {4})
+
+
+test_structure_sharing()
+
+def test_kind_cache_is_bounded():
+    # the kinds of the types which are not builtin are cached in a bounded cache
+    from opto.trace.broadcast import _kind_of
+    for i in range(2000):
+        cls = type(f"Payload{i}", (), {})
+        assert to_data([cls(), node(i)])[1] == i
+    assert _kind_of.cache_info().currsize <= _kind_of.cache_info().maxsize
+
+
+test_kind_cache_is_bounded()